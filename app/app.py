@@ -7,10 +7,11 @@ import sys
 import threading
 from importlib import reload
 
-from flask import Flask, jsonify
+from flask import Flask
 
 from conf.globalcfg import GlobalCfg
 from entity.jsonresp import JsonResponse
+from util.json_util import dumps_json
 
 # 路径加载 [后续用作lib加载，便于部署]
 reload(sys)
@@ -75,8 +76,8 @@ class IAOSFlask(Flask):
             """常用基础数据缓存"""
             from quotation.cache.cache import RemoteBasicDataCache, LocalBasicDataCache
             RemoteBasicDataCache.refresh(is_request=False)
-            # 保证RemoteBasicDataCache.refresh执行结束，再进行LocalBasicDataCache.refresh
-            LocalBasicDataCache.refresh()
+            # 订阅缓存更新通知 新版本快照在后台加载
+            LocalBasicDataCache.subscribe()
 
         t = threading.Thread(target=init)
         t.start()
@@ -93,12 +94,13 @@ class IAOSFlask(Flask):
         自定义响应内容 :
         视图函数可以直接返回: DataFrame,str,list、dict、tuple、None
         如果是DataFrame可以先转为dict
+        JsonResponse 以 orjson 编码[numpy 数组直接序列化]
         """
         if rv is None or isinstance(rv, (str, list, dict, tuple)):
             rv = JsonResponse.success(rv)
         # 如果是 DataFrame，转为 JsonResponse
         if isinstance(rv, JsonResponse):
-            rv = jsonify(rv.to_dict())
+            rv = self.response_class(dumps_json(rv.to_dict()), mimetype='application/json')
         return super().make_response(rv)
 
 
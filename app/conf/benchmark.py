@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+'''
+基准指数 {指数代码: 名称}
+因子有效性校验、大盘择时共用，放在无依赖的模块中 [web服务、定时任务只读取常量时不引入数据库、绘图等依赖]
+'''
+BENCHMARK_MAP = {'000001.SH': '上证综指', '399001.SZ': '深证成指',
+                 '000300.SH': '沪深300', '399006.SZ': '创业板指',
+                 '000016.SH': '上证50', '000905.SH': '中证500',
+                 '399005.SZ': '中小板指', '000010.SH': '上证180'}
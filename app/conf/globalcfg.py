@@ -15,6 +15,9 @@ class GlobalCfg(object):
     db_flag = 'db.info'
     redis_flag = 'redis.info'
     log_files_flag = 'log.files'
+    store_flag = 'store.info'
+    thread_flag = 'thread.info'
+    cache_flag = 'cache.info'
     cfg_path = 'cfg.ini'
 
     def __init__(self) -> object:
@@ -29,6 +32,12 @@ class GlobalCfg(object):
         self.__redis_info = dict()
         # 日志配置信息
         self.__log_files = dict()
+        # 本地行情数据存储配置信息
+        self.__store_info = dict()
+        # 线程池配置信息
+        self.__thread_info = dict()
+        # 基础数据缓存配置信息
+        self.__cache_info = dict()
 
     def __new__(cls, *args, **kwargs):
         if cls.instance is None:
@@ -77,6 +86,27 @@ class GlobalCfg(object):
             self.__log_files = ConfigHelper.get_cfg_info(self.cfg_path, GlobalCfg.log_files_flag)
         return self.__log_files
 
+    # noinspection PyRedundantParentheses
+    def get_store_info(self) -> dict:
+        if (0 == len(self.__store_info)):
+            self.initcfg()
+            self.__store_info = ConfigHelper.get_cfg_info(self.cfg_path, GlobalCfg.store_flag)
+        return self.__store_info
+
+    # noinspection PyRedundantParentheses
+    def get_thread_info(self) -> dict:
+        if (0 == len(self.__thread_info)):
+            self.initcfg()
+            self.__thread_info = ConfigHelper.get_cfg_info(self.cfg_path, GlobalCfg.thread_flag)
+        return self.__thread_info
+
+    # noinspection PyRedundantParentheses
+    def get_cache_info(self) -> dict:
+        if (0 == len(self.__cache_info)):
+            self.initcfg()
+            self.__cache_info = ConfigHelper.get_cfg_info(self.cfg_path, GlobalCfg.cache_flag)
+        return self.__cache_info
+
     # noinspection PyRedundantParentheses,SpellCheckingInspection
     def initcfg(self):
         self.cfg_path = __file__
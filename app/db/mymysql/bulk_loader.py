@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import logging
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from pymysql.converters import escape_string
+
+from conf.globalcfg import GlobalCfg
+from db.mymysql.mysql_db_pool import MyConnectionPool
+
+'''
+mysql 批量写入：DataFrame 直接落库，不再逐行转 tuple 后 executemany
+-- upsert：列向量化转为 SQL 字面量，拼成多行 INSERT ... ON DUPLICATE KEY UPDATE，按字节预算分批[bulk_batch_bytes]
+-- load_data：分块写为制表符分隔的临时文件，LOAD DATA LOCAL INFILE ... REPLACE 导入
+   [需连接开启 local_infile 且服务端 local_infile=ON，db.info bulk_mode = load_data]
+-- replace_partitions：按分区列(如 trade_date、asset) 删除将要写入的分区后写入，代替整表 delete
+-- 一次写入的全部语句在同一个连接、同一个事务内执行，失败整体回滚
+
+usage:
+    loader = MySqlBulkLoader()
+    loader.upsert('sample_stk_price', df)
+    loader.replace_partitions('sample_stk_price', df, partition_cols=['trade_date', 'asset'])
+    loader.delete_partitions('sample_stk_price', 'trade_date', ['20230103', '20230201'])
+'''
+log = logging.getLogger("app")
+log_err = logging.getLogger("log_err")
+
+
+def column_strings(s: pd.Series, null: str, fmt) -> np.ndarray:
+    """列向量化转字符串；缺失值、inf 为 null，字符串列经 fmt 转义"""
+    if pd.api.types.is_bool_dtype(s):
+        out = s.map({True: '1', False: '0'}).astype(object)
+    elif pd.api.types.is_numeric_dtype(s):
+        out = s.astype(str).astype(object)
+        out[s.isna() | np.isinf(s.to_numpy(dtype=np.float64, na_value=np.nan))] = null
+    else:
+        out = s.map(lambda v: null if v is None or v != v else fmt(str(v)))
+    return out.to_numpy(dtype=object)
+
+
+def join_columns(df: DataFrame, sep: str, null: str, fmt) -> np.ndarray:
+    rows = None
+    for col in df.columns:
+        strings = column_strings(df[col], null, fmt)
+        rows = strings if rows is None else rows + sep + strings
+    return np.array([], dtype=object) if rows is None else rows
+
+
+def sql_literals(df: DataFrame) -> np.ndarray:
+    """每行转为 SQL 值字面量 '(v1,v2,...)'；缺失值、inf 为 NULL，字符串转义"""
+    return '(' + join_columns(df, ',', 'NULL', lambda v: "'%s'" % escape_string(v)) + ')'
+
+
+def upsert_batches(table: str, df: DataFrame, update_columns: list = None, max_bytes: int = 4 * 1024 * 1024):
+    """
+    多行 INSERT ... ON DUPLICATE KEY UPDATE 语句，每条不超过 max_bytes [单行超长时单独成句]
+    update_columns: 主键冲突时更新的列，默认全部列
+    """
+    columns = list(df.columns)
+    update_columns = columns if update_columns is None else update_columns
+    head = "insert into %s (%s) values " % (table, ','.join('`%s`' % c for c in columns))
+    tail = " on duplicate key update %s" % ','.join('`%s`=values(`%s`)' % (c, c) for c in update_columns)
+    budget = max_bytes - len(head) - len(tail)
+    batch, size = [], 0
+    for row in sql_literals(df):
+        row_bytes = len(row.encode('utf-8')) + 1
+        if batch and size + row_bytes > budget:
+            yield head + ','.join(batch) + tail
+            batch, size = [], 0
+        batch.append(row)
+        size += row_bytes
+    if batch:
+        yield head + ','.join(batch) + tail
+
+
+def infile_lines(df: DataFrame) -> np.ndarray:
+    """每行转为 LOAD DATA 默认格式：制表符分隔、\\N 为 NULL，字符串中的反斜杠、制表符、换行转义"""
+    return join_columns(df, '\t', '\\N',
+                        lambda v: v.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n'))
+
+
+def write_infile(df: DataFrame, path: str, chunksize: int = 100000):
+    """分块写入 LOAD DATA 临时文件"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for i in range(0, len(df.index), chunksize):
+            f.write('\n'.join(infile_lines(df.iloc[i:i + chunksize])) + '\n')
+
+
+# noinspection PyBroadException
+class MySqlBulkLoader(object):
+    instance = None
+    pool = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls.instance is None:
+            cls.instance = object.__new__(cls)
+        return cls.instance
+
+    def __init__(self):
+        if self.pool is not None:
+            return
+        db_info = GlobalCfg().get_db_info()
+        self.mode = db_info.get("bulk_mode", "upsert")
+        self.max_bytes = int(db_info.get("bulk_batch_bytes", 4 * 1024 * 1024))
+        self.pool = MyConnectionPool()
+
+    def run(self, statements) -> int:
+        """
+        同一个连接、同一个事务内依次执行
+        statements: (sql, param) 可迭代对象，param 为列表时 executemany
+        return: 影响行数，失败回滚返回 0
+        """
+        cursor, conn = self.pool.getconn()
+        count = 0
+        try:
+            for sql, param in statements:
+                if isinstance(param, list):
+                    count += cursor.executemany(sql, param) or 0
+                else:
+                    count += cursor.execute(sql, param) or 0
+            conn.commit()
+            return count
+        except Exception as e:
+            log_err.error("MySqlBulkLoader exception. %s" % e)
+            conn.rollback()
+            return 0
+        finally:
+            cursor.close()
+            conn.close()
+
+    def upsert(self, table: str, df: DataFrame, update_columns: list = None) -> int:
+        """批量写入，主键冲突时更新"""
+        if df is None or df.empty:
+            return 0
+        count = self.run(self._write_statements(table, df, update_columns))
+        log.info("MySqlBulkLoader %s %s rows written by %s." % (table, len(df.index), self.mode))
+        return count
+
+    def delete_partitions(self, table: str, column: str, values: list, batch_size: int = 1000) -> int:
+        """按分区列删除 where column in (...) [分批]"""
+        if len(values) == 0:
+            return 0
+        return self.run(self._delete_statements(table, column, values, batch_size))
+
+    def replace_partitions(self, table: str, df: DataFrame, partition_cols: list, update_columns: list = None) -> int:
+        """删除 df 涉及的分区后写入 [删除与写入同一事务]"""
+        if df is None or df.empty:
+            return 0
+        parts = df[partition_cols].drop_duplicates()
+
+        def statements():
+            where = ' and '.join('`%s`=%%s' % c for c in partition_cols)
+            yield "delete from %s where %s" % (table, where), [tuple(r) for r in parts.itertuples(index=False)]
+            yield from self._write_statements(table, df, update_columns)
+
+        count = self.run(statements())
+        log.info("MySqlBulkLoader %s replaced %s partitions, %s rows." % (table, len(parts.index), len(df.index)))
+        return count
+
+    def _delete_statements(self, table: str, column: str, values: list, batch_size: int):
+        for i in range(0, len(values), batch_size):
+            batch = list(values[i:i + batch_size])
+            yield "delete from %s where `%s` in (%s)" % (table, column, ','.join(['%s'] * len(batch))), tuple(batch)
+
+    def _write_statements(self, table: str, df: DataFrame, update_columns: list = None):
+        if self.mode == 'load_data':
+            yield from self._load_data_statements(table, df)
+        else:
+            for sql in upsert_batches(table, df, update_columns, self.max_bytes):
+                yield sql, None
+
+    def _load_data_statements(self, table: str, df: DataFrame):
+        """临时文件 + LOAD DATA LOCAL INFILE ... REPLACE；语句执行完后删除临时文件"""
+        fd, path = tempfile.mkstemp(suffix='.tsv')
+        os.close(fd)
+        try:
+            write_infile(df, path)
+            sql = r"load data local infile '%s' replace into table %s character set utf8 (%s)" % (
+                escape_string(path), table, ','.join('`%s`' % c for c in df.columns))
+            yield sql, None
+        finally:
+            os.remove(path)
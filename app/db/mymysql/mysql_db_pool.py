@@ -48,6 +48,8 @@ class MyConnectionPool(Singleton):
                     db=self.db_info["db"],
                     use_unicode=True,
                     charset=self.db_info["charset"],
+                    # 批量写入使用 LOAD DATA LOCAL INFILE 时开启 [db/mymysql/bulk_loader.py]
+                    local_infile=self.db_info.get("bulk_mode", "upsert") == "load_data",
                 )
             except Exception as e:
                 log_err.error("create mysql ConnectionPool failed.%s" % e)
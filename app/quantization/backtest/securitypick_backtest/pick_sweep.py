@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import importlib
+import itertools
+import logging
+import os
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from pandas import DataFrame
+
+"""
+量化选股 参数扫描
+-- 回测数据只取一次：各换仓日的 base_stock_infos 快照、全部股票及基准在各换仓日的收盘价，
+   之后任意多组 (因子权重, top_num, shift_period) 只在内存中计算，不再访问网络
+-- PickSweepData 落为临时 pickle 文件，子进程初始化时各加载一次
+-- 参数按 (top_num, shift_period) 分组，每个换仓日一次求出组内全部权重的股票池
+   [选股模型的 sweep_stock_pools，如 GrowthStockPick01 基于 ScoreEngine.sweep]
+-- 每组参数的评判指标 同 SecurityPickBackTest：
+   累积收益、年化复合收益、年化超额收益、跑赢基准周期占比、正收益周期占比
+-- 结果按年化超额收益倒序
+
+usage:
+    params = sweep_params({'roe': [20, 34, 50], 'basic_eps_yoy': [20, 33, 50], 'pe_ttm': [20, 33, 50]},
+                          top_nums=[5, 10], shift_periods=[3, 6])
+    with PickSweepPool(data, 'quantization.securitypick.growth.growthstockpick01', 'GrowthStockPick01') as pool:
+        results = pool.run(params)
+"""
+log = logging.getLogger("log_quantization")
+log_err = logging.getLogger("log_err")
+
+SWEEP_COLUMNS = ['shift_period', 'top_num', 'weights', 'periods', 'total_return', 'annual_return',
+                 'benchmark_return', 'excess_return', 'win_prob', 'profit_prob']
+# 子进程内只读数据 {'data': PickSweepData, 'strategy': 选股模型实例}
+_sweep = {}
+
+
+class PickSweepData(object):
+    """
+    snapshots:  {换仓日: base_stock_infos}
+    closes:     {交易日: Series(ts_code -> 后复权收盘价)}
+    benchmark:  {交易日: 基准收盘价}
+    periods:    {shift_period: [(换仓日, 下一换仓日)]}
+    """
+
+    def __init__(self, snapshots: dict, closes: dict, benchmark: dict, periods: dict):
+        self.snapshots = snapshots
+        self.closes = closes
+        self.benchmark = benchmark
+        self.periods = periods
+
+
+def sweep_params(weights_grid: dict, top_nums: list = (5,), shift_periods: list = (6,), n_random: int = None,
+                 seed: int = None) -> list:
+    """
+    参数组合 [{'weights':{}, 'top_num':n, 'shift_period':m}]
+    weights_grid: {因子: [候选权重]}，网格为全部组合；n_random 不为空时从网格中随机抽取 n_random 组
+    """
+    factors = list(weights_grid.keys())
+    grid = list(itertools.product(list(top_nums), list(shift_periods),
+                                  itertools.product(*[weights_grid[f] for f in factors])))
+    if n_random is not None and n_random < len(grid):
+        rng = np.random.default_rng(seed)
+        grid = [grid[i] for i in sorted(rng.choice(len(grid), n_random, replace=False))]
+    return [{'weights': dict(zip(factors, weights)), 'top_num': top_num, 'shift_period': shift_period}
+            for top_num, shift_period, weights in grid]
+
+
+def cal_period_return(data: PickSweepData, target_data: DataFrame, start_date, end_date) -> float:
+    """换仓周期内 流通市值加权的组合收益率 [两日均有收盘价的股票]"""
+    close1 = data.closes[start_date]
+    close2 = data.closes[end_date]
+    codes = target_data['ts_code']
+    valid = codes.isin(close1.index) & codes.isin(close2.index)
+    codes = codes[valid].to_numpy()
+    if len(codes) == 0:
+        return np.nan
+    circ_mv = target_data['circ_mv'][valid].to_numpy(dtype=float)
+    period_profit = close2.loc[codes].to_numpy(dtype=float) / close1.loc[codes].to_numpy(dtype=float) - 1
+    return float((period_profit * circ_mv).sum() / circ_mv.sum())
+
+
+def cal_pick_effect(period_return: np.ndarray, benchmark_return: np.ndarray, years: float) -> dict:
+    """由各换仓周期的组合、基准收益率 计算评判指标"""
+    period_return = np.nan_to_num(period_return)
+    total_return = np.prod(1 + period_return) - 1
+    benchmark_total = np.prod(1 + benchmark_return) - 1
+    annual_return = (1 + total_return) ** (1 / years) - 1 if years > 0 else np.nan
+    benchmark_annual = (1 + benchmark_total) ** (1 / years) - 1 if years > 0 else np.nan
+    return {'periods': len(period_return),
+            'total_return': total_return,
+            'annual_return': annual_return,
+            'benchmark_return': benchmark_total,
+            'excess_return': annual_return - benchmark_annual,
+            'win_prob': float(np.mean(period_return > benchmark_return)) if len(period_return) else np.nan,
+            'profit_prob': float(np.mean(period_return > 0)) if len(period_return) else np.nan}
+
+
+def pick_stock_pools(strategy, stocksinfos: DataFrame, weights_list: list, top_num: int) -> list:
+    """
+    同一换仓日 多组权重的股票池
+    选股模型提供 sweep_stock_pools 时一次求出[筛选、排名只算一次]，否则逐组 init_data 后选股
+    """
+    if hasattr(strategy, 'sweep_stock_pools'):
+        return strategy.sweep_stock_pools(stocksinfos, weights_list, top_num=top_num)
+    pools = []
+    for weights in weights_list:
+        strategy.init_data(stocksinfos=stocksinfos, weights=weights)
+        pools.append(strategy.get_target_stock_pool(top_num=top_num))
+    return pools
+
+
+def eval_group(data: PickSweepData, strategy, group: list) -> list:
+    """
+    同一 (top_num, shift_period) 的多组参数回测
+    每个换仓周期一次选出全部权重组合的股票池
+    """
+    top_num, shift_period = group[0]['top_num'], group[0]['shift_period']
+    periods = data.periods[shift_period]
+    weights_list = [params['weights'] for params in group]
+    period_return = np.full((len(group), len(periods)), np.nan)
+    benchmark_return = np.zeros(len(periods))
+    for i, (start_date, end_date) in enumerate(periods):
+        benchmark_return[i] = data.benchmark[end_date] / data.benchmark[start_date] - 1
+        pools = pick_stock_pools(strategy, data.snapshots[start_date], weights_list, top_num)
+        for j, target_data in enumerate(pools):
+            if target_data is not None and len(target_data.index) > 0:
+                period_return[j, i] = cal_period_return(data, target_data, start_date, end_date)
+    years = 0
+    if len(periods) > 0:
+        first_date = datetime.strptime(periods[0][0], '%Y%m%d')
+        years = (datetime.strptime(periods[-1][1], '%Y%m%d') - first_date).days / 365
+    results = []
+    for j, params in enumerate(group):
+        effect = cal_pick_effect(period_return[j], benchmark_return, years)
+        effect.update(shift_period=shift_period, top_num=top_num, weights=params['weights'])
+        results.append(effect)
+    return results
+
+
+def eval_params(data: PickSweepData, strategy, params: dict) -> dict:
+    """单组参数回测"""
+    return eval_group(data, strategy, [params])[0]
+
+
+def group_params(params: list, batch_size: int) -> list:
+    """参数按 (top_num, shift_period) 分组，每组最多 batch_size 组参数"""
+    groups = {}
+    for p in params:
+        groups.setdefault((p['top_num'], p['shift_period']), []).append(p)
+    return [group[i:i + batch_size] for group in groups.values() for i in range(0, len(group), batch_size)]
+
+
+def rank_results(results: list) -> DataFrame:
+    """评判指标表 按年化超额收益倒序"""
+    results = DataFrame(results, columns=SWEEP_COLUMNS)
+    return results.sort_values(by=['excess_return', 'total_return'], ascending=False,
+                               na_position='last').reset_index(drop=True)
+
+
+def _init_worker(data_file, strategy_mod, strategy_cls):
+    with open(data_file, 'rb') as f:
+        _sweep['data'] = pickle.load(f)
+    _sweep['strategy'] = getattr(importlib.import_module(strategy_mod), strategy_cls)()
+
+
+def _eval_group(group: list) -> list:
+    try:
+        return eval_group(_sweep['data'], _sweep['strategy'], group)
+    except Exception as e:
+        log_err.error("pick sweep params %s failed! %s" % (group, e))
+        return []
+
+
+class PickSweepPool(object):
+    """
+    多进程并行参数扫描
+    data:          PickSweepData
+    strategy_mod:  选股模型模块 如 quantization.securitypick.growth.growthstockpick01
+    strategy_cls:  选股模型类   如 GrowthStockPick01
+    processes:     进程数，默认CPU核数
+    params_batch:  每个任务的参数组数 [同一 (top_num, shift_period) 的参数合为一个任务]
+    """
+
+    def __init__(self, data: PickSweepData, strategy_mod: str, strategy_cls: str, processes: int = None,
+                 params_batch: int = 20):
+        self.data = data
+        self.strategy_mod = strategy_mod
+        self.strategy_cls = strategy_cls
+        self.processes = processes or os.cpu_count()
+        self.params_batch = params_batch
+        self.tmp_dir = None
+
+    def __enter__(self):
+        self.tmp_dir = tempfile.TemporaryDirectory(prefix='pick_sweep_')
+        with open(os.path.join(self.tmp_dir.name, 'data.pkl'), 'wb') as f:
+            pickle.dump(self.data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.tmp_dir.cleanup()
+        self.tmp_dir = None
+
+    def run(self, params: list) -> DataFrame:
+        """return: 评判指标表 按年化超额收益倒序"""
+        batches = group_params(params, self.params_batch)
+        results = []
+        with ProcessPoolExecutor(max_workers=min(self.processes, max(len(batches), 1)), initializer=_init_worker,
+                                 initargs=(os.path.join(self.tmp_dir.name, 'data.pkl'), self.strategy_mod,
+                                           self.strategy_cls)) as executor:
+            for batch_result in executor.map(_eval_group, batches):
+                results.extend(batch_result)
+        log.info("PickSweepPool evaluated %s params with %s processes" % (len(results), self.processes))
+        return rank_results(results)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import logging
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from util.cal_util import cal_rolling_feature
+
+"""
+量化选股 逐日盯市组合模拟
+
+simulate：交易日 × 股票 后复权收盘价矩阵 + 各换仓日目标权重，逐日计算组合净值
+    -- 收盘价缺失(停牌)沿用前值，换仓日无价格的股票不买入，其余目标权重归一
+    -- 换仓日按收盘价调仓：换手率 = Σ|新权重 - 漂移后旧权重| / 2，
+       交易成本 = cost_rate × Σ|权重变化| × 调仓前净值，从净值中扣除
+    -- 两次换仓之间持股数不变，净值 = 收盘价矩阵 @ 持股数，每个持仓区间一次矩阵乘法
+    -- 首个换仓日之前为现金，净值不变
+holdings_matrix：{换仓日: Series(ts_code -> 权重)} 对齐为 (换仓次数, 股票数) 权重矩阵
+simulate_holdings：DataFrame 入参的封装，返回逐日 nav、daily_return、turnover、cost
+cal_sim_feature：在逐日收益上计算 cal_rolling_feature 全部指标 及 年化换手率、总交易成本
+
+usage:
+    sim = simulate_holdings(close, holdings, cost_rate=0.0015)
+    feature_df, record_dict = cal_sim_feature(sim)
+"""
+log = logging.getLogger("log_quantization")
+log_err = logging.getLogger("log_err")
+
+
+def ffill(close: np.ndarray) -> np.ndarray:
+    """按列沿用前值 [首个有效值之前仍为 nan]"""
+    valid = ~np.isnan(close)
+    idx = np.where(valid, np.arange(close.shape[0])[:, None], 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    filled = close[idx, np.arange(close.shape[1])]
+    # 首个有效值之前的位置 idx 为0 且第0行本身无效
+    filled[(idx == 0) & ~valid[:1]] = np.nan
+    return filled
+
+
+def simulate(close: np.ndarray, rebalance_idx: list, target_weights: np.ndarray, cost_rate: float = 0.0,
+             initial: float = 1.0) -> dict:
+    """
+    close:          (T,N) 后复权收盘价，缺失为 nan
+    rebalance_idx:  换仓日在 T 中的位置 升序
+    target_weights: (R,N) 各换仓日目标权重[非负]
+    return: {'nav','daily_return','turnover','cost'} 均为 (T,)
+    """
+    close = ffill(np.asarray(close, dtype=np.float64))
+    periods = close.shape[0]
+    nav = np.full(periods, float(initial))
+    turnover = np.zeros(periods)
+    cost = np.zeros(periods)
+    shares = None
+    held = None
+    bounds = list(rebalance_idx) + [periods]
+    for k, t in enumerate(rebalance_idx):
+        # 调仓前净值 及 漂移后的旧权重
+        if shares is None:
+            value = nav[t - 1] if t > 0 else float(initial)
+            old_weights = np.zeros(close.shape[1])
+        else:
+            value = close[t, held] @ shares
+            old_weights = np.zeros(close.shape[1])
+            old_weights[held] = close[t, held] * shares / value
+        new_weights = np.where(np.isnan(close[t]), 0.0, np.nan_to_num(target_weights[k]))
+        total = new_weights.sum()
+        new_weights = new_weights / total if total > 0 else new_weights
+        traded = np.abs(new_weights - old_weights).sum()
+        turnover[t] = traded / 2
+        cost[t] = cost_rate * traded * value
+        value -= cost[t]
+        held = np.flatnonzero(new_weights > 0)
+        if len(held) == 0:
+            shares = None
+            nav[t:bounds[k + 1]] = value
+            continue
+        shares = new_weights[held] * value / close[t, held]
+        nav[t:bounds[k + 1]] = close[t:bounds[k + 1], held] @ shares
+    daily_return = np.zeros(periods)
+    daily_return[1:] = nav[1:] / nav[:-1] - 1
+    return {'nav': nav, 'daily_return': daily_return, 'turnover': turnover, 'cost': cost}
+
+
+def holdings_matrix(dates, codes, holdings: dict) -> (list, np.ndarray):
+    """
+    {换仓日: Series(ts_code -> 权重)} -> (换仓位置, (R,N) 权重矩阵)
+    换仓日非交易日时 取其后首个交易日；面板外的股票丢弃
+    """
+    dates = np.asarray(dates)
+    code_index = pd.Index(codes)
+    rebalance_idx = []
+    weights = np.zeros((len(holdings), len(code_index)))
+    for k, date in enumerate(sorted(holdings.keys())):
+        rebalance_idx.append(int(np.searchsorted(dates, date, side='left')))
+        pos = code_index.get_indexer(holdings[date].index)
+        ok = pos >= 0
+        weights[k, pos[ok]] = holdings[date].to_numpy(dtype=np.float64)[ok]
+    # 超出面板的换仓日丢弃
+    keep = [k for k, t in enumerate(rebalance_idx) if t < len(dates)]
+    return [rebalance_idx[k] for k in keep], weights[keep]
+
+
+def simulate_holdings(close: DataFrame, holdings: dict, cost_rate: float = 0.0, initial: float = 1.0) -> DataFrame:
+    """
+    close:    交易日 × ts_code 后复权收盘价 [index 升序]
+    holdings: {换仓日: Series(ts_code -> 权重)}
+    return:   index 交易日，columns nav、daily_return、turnover、cost
+    """
+    rebalance_idx, weights = holdings_matrix(close.index, close.columns, holdings)
+    res = simulate(close.to_numpy(dtype=np.float64), rebalance_idx, weights, cost_rate=cost_rate, initial=initial)
+    return DataFrame(res, index=close.index)
+
+
+def cal_sim_feature(sim: DataFrame, rf=0.02):
+    """逐日模拟结果的评判指标：cal_rolling_feature 全部指标 + 年化换手率、总交易成本"""
+    feature_df, record_dict = cal_rolling_feature(sim['daily_return'].copy(), rf=rf)
+    years = len(sim.index) / 252
+    record_dict["年化换手率"] = round(float(sim['turnover'].sum() / years), 3) if years > 0 else None
+    record_dict["总交易成本"] = round(float(sim['cost'].sum()), 3)
+    return feature_df, record_dict
@@ -2,13 +2,19 @@
 __author__ = 'carl'
 
 import importlib
+import logging
 import os
 from datetime import datetime
 
+import pandas as pd
 from dateutil.relativedelta import relativedelta
+from pandas import DataFrame, Series
 
+from quantization.backtest.securitypick_backtest.pick_sweep import PickSweepData, PickSweepPool, sweep_params
+from quantization.backtest.securitypick_backtest.portfolio_sim import cal_sim_feature, simulate_holdings
 from quotation.captures.tsdata_capturer import TuShareDataCapturer
 from quotation.cleaning.data_clean import BaseDataClean
+from quotation.store.market_store import LocalMarketDataStore
 from util.quant_util import get_price, get_period_fl_trade_date
 
 """
@@ -20,7 +26,12 @@ from util.quant_util import get_price, get_period_fl_trade_date
 年化超额收益
 跑赢基准周期占比
 正收益周期占比
+
+simulate_daily：逐日盯市组合模拟 净值、换手率、交易成本，及 cal_rolling_feature 全部指标 [portfolio_sim]
+sweep：回测数据只获取一次，多进程扫描多组 因子权重/top_num/shift_period [pick_sweep]
 """
+log = logging.getLogger("log_quantization")
+log_err = logging.getLogger("log_err")
 
 
 # noinspection DuplicatedCode
@@ -79,21 +90,31 @@ class SecurityPickBackTest(object):
         self.init_data_func = getattr(self.strategy_instance, self.init_data_func_name)
         self.get_target_stocks_func = getattr(self.strategy_instance, self.get_target_stocks_func_name)
 
-    def cal_all_period_return(self):
-        """计算所有换仓周期中的收益"""
+    def period_dates(self, shift_period=None) -> list:
+        """所有换仓周期的 [(首个交易日, 最后交易日)]"""
+        shift_period = int(shift_period or self.shift_period)
         now_m = datetime.today().month
         now_y = datetime.today().year
         now_date = datetime(now_y, now_m, 1)
         start_date = datetime(now_y - self.sample_periods, 1, 1)
+        periods = []
         while start_date < now_date:
-            end_date = start_date + relativedelta(months=+self.shift_period)
+            end_date = start_date + relativedelta(months=+shift_period)
             if end_date >= now_date:
                 end_date = now_date
             start_date_str = str(start_date.year) + str(start_date.month).zfill(2) + str(start_date.day).zfill(2)
             end_date_str = str(end_date.year) + str(end_date.month).zfill(2) + str(end_date.day).zfill(2)
             trade_start_date, trade_end_date = get_period_fl_trade_date(start_date=start_date_str,
                                                                         end_date=end_date_str)
-            print(start_date_str, "---", end_date_str)
+            if trade_start_date is not None:
+                periods.append((trade_start_date, trade_end_date))
+            start_date = end_date
+        return periods
+
+    def cal_all_period_return(self):
+        """计算所有换仓周期中的收益"""
+        for trade_start_date, trade_end_date in self.period_dates():
+            print(trade_start_date, "---", trade_end_date)
             # 根据流通市值加权的持仓周期收益率
             weighted_p_return = self.cal_shift_period_return(trade_start_date=trade_start_date,
                                                              trade_end_date=trade_end_date)
@@ -102,7 +123,106 @@ class SecurityPickBackTest(object):
             print("weighted_p_return:  ", weighted_p_return)
             print("benchmark_p_return: ", benchmark_p_return)
             print("----------------------------------------")
-            start_date = end_date
+
+    def load_sweep_data(self, shift_periods: list) -> PickSweepData:
+        """
+        参数扫描所需数据 只获取一次：
+        各换仓周期首日的 base_stock_infos、全部股票及基准在各换仓周期首末日的收盘价
+        """
+        periods = {shift_period: self.period_dates(shift_period) for shift_period in shift_periods}
+        start_dates = sorted({start for dates in periods.values() for start, _ in dates})
+        trade_dates = sorted({d for dates in periods.values() for pair in dates for d in pair})
+        snapshots = dict(BaseDataClean.iter_certainday_base_stock_infos(start_dates))
+        ts_codes = sorted(set().union(*[set(data['ts_code']) for data in snapshots.values()]))
+        closes = {}
+        benchmark = {}
+        failed = []
+        for trade_date in trade_dates:
+            price = get_price(ts_code_list=ts_codes, trade_date=trade_date, asset='E')
+            index_price = get_price(ts_code_list=[self.benchmark], trade_date=trade_date, asset='I')
+            # 重试耗尽返回 None
+            if price is None or index_price is None or index_price.empty:
+                failed.append(trade_date)
+                continue
+            closes[trade_date] = price['close']
+            benchmark[trade_date] = float(index_price['close'].iloc[0])
+        if len(failed) > 0:
+            log_err.error("SecurityPickBackTest sweep price failed on %s, periods on these dates dropped." % failed)
+            periods = {shift_period: [pair for pair in dates if pair[0] in closes and pair[1] in closes]
+                       for shift_period, dates in periods.items()}
+            if all(len(dates) == 0 for dates in periods.values()):
+                raise ValueError("no sweep period left, price failed on %s" % failed)
+        log.info("SecurityPickBackTest sweep data loaded: %s snapshots, %s trade dates"
+                 % (len(snapshots), len(trade_dates)))
+        return PickSweepData(snapshots, closes, benchmark, periods)
+
+    def sweep(self, weights_grid: dict = None, top_nums: list = (5,), shift_periods: list = None,
+              n_random: int = None, seed: int = None, processes: int = None) -> DataFrame:
+        """
+        参数扫描：网格/随机搜索 因子权重、top_num、shift_period，多进程并行回测
+        weights_grid: {因子: [候选权重]}，默认为 stk_pick_strategy_weights_args
+        return: 各组参数的评判指标 按年化超额收益倒序
+        """
+        if weights_grid is None:
+            weights_grid = {k: [v] for k, v in self.stk_pick_strategy_weights_args.items()}
+        shift_periods = list(shift_periods or [self.shift_period])
+        if self.strategy_mod is None:
+            self.init_stk_pick_strategy()
+        params = sweep_params(weights_grid, top_nums, shift_periods, n_random=n_random, seed=seed)
+        data = self.load_sweep_data(shift_periods)
+        with PickSweepPool(data, self.strategy_mod.__name__, self.stk_pick_strategy_cls_name,
+                           processes=processes) as pool:
+            return pool.run(params)
+
+    def period_holdings(self, trade_date) -> Series:
+        """换仓日选股 流通市值加权的目标权重 Series(ts_code -> 权重)"""
+        base_stocksinfos = BaseDataClean.get_certainday_base_stock_infos(trade_date=trade_date)
+        self.init_data_func(stocksinfos=base_stocksinfos, weights=self.stk_pick_strategy_weights_args)
+        target_filter_data = self.get_target_stocks_func()
+        if target_filter_data is None or len(target_filter_data.index) == 0:
+            return Series(dtype=float)
+        circ_mv = target_filter_data.set_index('ts_code')['circ_mv'].astype(float)
+        return circ_mv / circ_mv.sum()
+
+    def load_daily_close(self, start_date, end_date, ts_codes: list) -> DataFrame:
+        """本地行情存储中 交易日 × ts_code 的后复权收盘价 [不访问网络，需先落地 daily、adj_factor]"""
+        store = LocalMarketDataStore()
+        daily = store.load_range('daily', start_date, end_date, ts_codes)
+        adj_factors = store.load_range('adj_factor', start_date, end_date, ts_codes)
+        if daily.empty or adj_factors.empty:
+            return DataFrame()
+        closes = pd.merge(left=daily[['ts_code', 'trade_date', 'close']],
+                          right=adj_factors[['ts_code', 'trade_date', 'adj_factor']], on=['ts_code', 'trade_date'])
+        closes['close'] = closes['close'] * closes['adj_factor']
+        closes = closes.drop_duplicates(subset=['trade_date', 'ts_code'], keep='last')
+        return closes.pivot(index='trade_date', columns='ts_code', values='close').sort_index()
+
+    def simulate_daily(self, cost_rate: float = 0.0015, rf=0.02):
+        """
+        逐日盯市回测：各换仓日选股并按流通市值加权调仓，逐日计算净值、换手率、扣除交易成本后的收益
+        cost_rate: 单边交易成本率[佣金+印花税+滑点]
+        return: (逐日模拟结果, feature_df, record_dict)
+        无换仓周期、本地未落地 daily/adj_factor 时抛出 ValueError
+        """
+        if self.strategy_mod is None:
+            self.init_stk_pick_strategy()
+        periods = self.period_dates()
+        if len(periods) == 0:
+            log_err.error("SecurityPickBackTest simulate_daily: no trade dates in sample periods!")
+            raise ValueError("no trade dates in the last %s years, check the trade calendar." % self.sample_periods)
+        holdings = {start_date: self.period_holdings(start_date) for start_date, _ in periods}
+        ts_codes = sorted(set().union(*[set(h.index) for h in holdings.values()]))
+        start_date, end_date = periods[0][0], periods[-1][1]
+        close = self.load_daily_close(start_date, end_date, ts_codes)
+        if close.empty:
+            log_err.error("SecurityPickBackTest simulate_daily: local daily/adj_factor not ingested for %s——%s!"
+                          % (start_date, end_date))
+            raise ValueError("local daily/adj_factor not ingested for %s——%s, ingest them into the local "
+                             "market store first." % (start_date, end_date))
+        sim = simulate_holdings(close, holdings, cost_rate=cost_rate)
+        feature_df, record_dict = cal_sim_feature(sim, rf=rf)
+        log.info("SecurityPickBackTest daily simulation: %s" % record_dict)
+        return sim, feature_df, record_dict
 
     def cal_benchmark_shift_period_return(self, startdate, enddate):
         """
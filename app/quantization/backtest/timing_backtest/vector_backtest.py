@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import logging
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from quantization.backtest.securitypick_backtest.portfolio_sim import ffill
+from quantization.factors.technical.indicators import ma, ohlc_panel
+from quotation.store.market_store import LocalMarketDataStore
+
+"""
+择时策略 向量化回测：交易日 × 股票 价格矩阵、信号矩阵上的数组运算，每只股票独立账户
+-- 目标持仓 target：(T,N)，第 t 日收盘后决定的持仓单位数[1 持有 0 空仓]，nan 为保持前一日决定
+-- 成交同 backtrader 默认撮合：t 日决定的市价单在 t+1 日开盘价成交，最后一日的决定不成交；
+   开盘价缺失(停牌)的日子不成交，顺延至下一个有开盘价的交易日
+-- 每单位 size 股，手续费 = commission × 成交股数 × 成交价[同 setcommission(commission)]
+-- 资产 = 现金 + 持股数 × 收盘价[缺失沿用前值]；不做资金不足检查
+-- 交易次数/盈亏次数同 backtrader TradeAnalyzer：持仓从0开始到回到0为一笔交易，含手续费的盈亏 >= 0 为盈利
+-- 最大回撤同 backtrader DrawDown，百分比
+ma_cross_target：MAStrategy 的均线规则，收盘价上穿 maperiod 日均线持有，下穿空仓，
+    MAStrategy 另有 EMA(25)、MACDHisto 指标，backtrader 在第 34 根 k 线起才调用 next，
+    min_period=MA_STRATEGY_MIN_PERIOD 与之对齐
+
+usage:
+    vb = VectorBacktest(cash=100000.0, commission=0.001, size=500)
+    results = vb.run_ma_cross(vb.load_panel(ts_codes, '20200101', '20221231'), maperiods=range(5, 61))
+"""
+log = logging.getLogger("log_quantization")
+log_err = logging.getLogger("log_err")
+
+# MACDHisto(12, 26, 9) 的最小周期
+MA_STRATEGY_MIN_PERIOD = 34
+RESULT_COLUMNS = ['final_value', 'total_return', 'trades', 'won', 'lost', 'max_drawdown']
+
+
+def bar_count(close: np.ndarray) -> np.ndarray:
+    """每只股票截至 t 日的有效k线数"""
+    return np.cumsum(~np.isnan(close), axis=0)
+
+
+def ma_cross_target(close: np.ndarray, period: int, min_period: int = 0) -> np.ndarray:
+    """收盘价高于均线持有1单位，低于均线空仓，相等保持；有效k线数不足 max(period, min_period) 时不决定"""
+    avg = ma(close, period)
+    target = np.where(close > avg, 1.0, np.where(close < avg, 0.0, np.nan))
+    target[bar_count(close) < max(period, min_period)] = np.nan
+    return target
+
+
+def fill_units(open_: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """t 日开盘成交后的持仓单位数 (T,N)"""
+    units = np.full(target.shape, np.nan)
+    # t-1 日的决定 在 t 日开盘成交，未有决定前为空仓
+    decided = ffill(target)
+    units[1:] = np.nan_to_num(decided[:-1])
+    units[0] = 0.0
+    # 无开盘价不成交，沿用前一日持仓
+    units[1:][np.isnan(open_[1:])] = np.nan
+    return ffill(units)
+
+
+def backtest(open_: np.ndarray, close: np.ndarray, target: np.ndarray, size: int = 100,
+             commission: float = 0.001, cash: float = 100000.0) -> dict:
+    """
+    open_、close: (T,N) 开盘、收盘价，缺失为 nan
+    target:       (T,N) 目标持仓单位数
+    return: {'shares','value','fee','cash_flow'} 均为 (T,N)
+    """
+    open_ = np.asarray(open_, dtype=np.float64)
+    close = ffill(np.asarray(close, dtype=np.float64))
+    shares = fill_units(open_, np.asarray(target, dtype=np.float64)) * size
+    traded = np.diff(shares, axis=0, prepend=0.0)
+    price = np.nan_to_num(open_)
+    fee = commission * np.abs(traded) * price
+    cash_flow = -(traded * price) - fee
+    value = cash + np.cumsum(cash_flow, axis=0) + shares * np.nan_to_num(close)
+    return {'shares': shares, 'value': value, 'fee': fee, 'cash_flow': cash_flow}
+
+
+def trade_pnl(shares: np.ndarray, cash_flow: np.ndarray) -> np.ndarray:
+    """
+    已平仓交易的含手续费盈亏：平仓日为该笔交易的盈亏，其余为 nan
+    一笔交易 = 持仓从0变为非0 到 回到0，盈亏 = 期间现金流之和
+    """
+    periods = shares.shape[0]
+    held = shares != 0
+    prev_held = np.vstack([np.zeros((1, shares.shape[1]), dtype=bool), held[:-1]])
+    opened = held & ~prev_held
+    closed = ~held & prev_held
+    flow = np.cumsum(cash_flow, axis=0)
+    # 开仓日前一日的累计现金流
+    before = np.vstack([np.zeros((1, shares.shape[1])), flow[:-1]])
+    open_idx = np.where(opened, np.arange(periods)[:, None], 0)
+    np.maximum.accumulate(open_idx, axis=0, out=open_idx)
+    pnl = flow - before[open_idx, np.arange(shares.shape[1])]
+    return np.where(closed, pnl, np.nan)
+
+
+def max_drawdown(value: np.ndarray) -> np.ndarray:
+    """按列最大回撤 百分比"""
+    peak = np.maximum.accumulate(value, axis=0)
+    return ((peak - value) / peak * 100).max(axis=0)
+
+
+def backtest_stats(res: dict, cash: float = 100000.0) -> dict:
+    """每只股票的 期末资产、收益率、交易次数、盈利/亏损次数、最大回撤 均为 (N,)"""
+    pnl = trade_pnl(res['shares'], res['cash_flow'])
+    final_value = res['value'][-1]
+    return {'final_value': final_value,
+            'total_return': final_value / cash - 1,
+            'trades': (~np.isnan(pnl)).sum(axis=0),
+            'won': (pnl >= 0).sum(axis=0),
+            'lost': (pnl < 0).sum(axis=0),
+            'max_drawdown': max_drawdown(res['value'])}
+
+
+def price_panel(prices: DataFrame) -> (pd.Index, pd.Index, np.ndarray, np.ndarray):
+    """daily 行记录 -> (交易日, ts_code, 开盘价矩阵, 收盘价矩阵) [indicators.ohlc_panel]"""
+    panel = ohlc_panel(prices)
+    close = panel['close']
+    return close.index, close.columns, panel['open'].to_numpy(dtype=np.float64), close.to_numpy(dtype=np.float64)
+
+
+class VectorBacktest(object):
+    """
+    cash、commission、size：每只股票的初始资金、手续费率、每单位股数
+    """
+
+    def __init__(self, cash: float = 100000.0, commission: float = 0.001, size: int = 500):
+        self.cash = cash
+        self.commission = commission
+        self.size = size
+
+    def load_panel(self, ts_codes: list, start_date: str, end_date: str):
+        """本地行情存储读取价格矩阵 [不访问网络]"""
+        prices = LocalMarketDataStore().load_range('daily', start_date, end_date, ts_codes)
+        if prices.empty:
+            return None
+        return price_panel(prices)
+
+    def run(self, open_: np.ndarray, close: np.ndarray, target: np.ndarray) -> dict:
+        res = backtest(open_, close, target, size=self.size, commission=self.commission, cash=self.cash)
+        return backtest_stats(res, cash=self.cash)
+
+    def run_ma_cross(self, panel, maperiods, min_period: int = MA_STRATEGY_MIN_PERIOD) -> DataFrame:
+        """
+        panel: price_panel 的返回
+        return: 每只股票、每个均线周期一行 按收益率倒序[列同 BacktraderBatchRunner]
+        """
+        if panel is None:
+            return DataFrame(columns=['ts_code', 'maperiod'] + RESULT_COLUMNS)
+        _, codes, open_, close = panel
+        results = []
+        for period in maperiods:
+            stats = self.run(open_, close, ma_cross_target(close, period, min_period=min_period))
+            stats['ts_code'] = codes
+            stats['maperiod'] = period
+            results.append(DataFrame(stats))
+        log.info("VectorBacktest ma cross: %s stocks, %s periods" % (len(codes), len(results)))
+        results = pd.concat(results, ignore_index=True)[['ts_code', 'maperiod'] + RESULT_COLUMNS]
+        return results.sort_values(by='total_return', ascending=False, ignore_index=True)
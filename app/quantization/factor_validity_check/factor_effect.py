@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib.pyplot as plt
+import numpy as np
+from pandas import DataFrame, Series
+
+from quantization.factor_validity_check.price_panel import cal_ports_return
+
+"""
+因子评判指标计算 及 多进程并行校验
+
+cal_factor_effect：由 分组月收益(port_1~port_5,benchmark × 月) 计算评判指标，纯函数
+draw_factor_return：绘制分组累积收益，picture_path 不为空时无界面渲染并保存为 png
+FactorEffectPool：多进程并行计算多个因子的分组收益、评判指标[及图片]
+    价格面板(close、cmv)、因子面板 以 .npy 落在临时目录，子进程以 mmap 只读方式打开，
+    多个进程共享同一份页缓存，不做序列化拷贝；子进程只返回指标结果，由主进程统一批量入库
+
+usage:
+    with FactorEffectPool(panel, factor_matrix, factors, processes=16) as pool:
+        results = pool.run()
+"""
+log = logging.getLogger("log_quantization")
+log_err = logging.getLogger("log_err")
+
+PORT_COLUMNS = ['port_1', 'port_2', 'port_3', 'port_4', 'port_5']
+# 子进程内只读面板 {'close':ndarray,'cmv':ndarray,'factors':ndarray,'benchmark':list}
+_panel = {}
+
+
+def cal_factor_effect(monthly: DataFrame) -> dict:
+    """
+    计算因子评判指标
+    monthly: 行 port_1~port_5、benchmark，列 各月
+    return: {'total_return':Series,'annual_return':Series,'excess_return':Series,'ic':float,
+             'win_prob':float,'loss_prob':float,'excess':[赢家超额,输家超额],
+             'win_total_return','win_annual_return','loss_total_return','loss_annual_return'}
+    """
+    # 复利的本息计算公式是：F=P（1+i)^n P=本金，i=利率，n=期限
+    total_return = (monthly + 1).T.cumprod().iloc[-1, :] - 1
+    annual_return = (total_return + 1) ** (1. / (monthly.columns.size / 12)) - 1
+    # 各个组合超额收益 【因子annual_return - 基准annual_return】
+    excess_return = annual_return - annual_return.iloc[-1]
+    # 年化收益与因子的相关性IC
+    ic = annual_return.iloc[0:5].corr(Series([1, 2, 3, 4, 5], index=annual_return.iloc[0:5].index))
+    # 因子小，收益小，port_1是输家组合，port_5是赢家组合；否则 port_1是赢家组合，port_5是输家组合
+    if total_return.iloc[0] < total_return.iloc[-2]:
+        win, loss = -2, 0
+    else:
+        win, loss = 0, -2
+    loss_excess = monthly.iloc[loss, :] - monthly.iloc[-1, :]
+    win_excess = monthly.iloc[win, :] - monthly.iloc[-1, :]
+    return {'total_return': total_return, 'annual_return': annual_return, 'excess_return': excess_return,
+            'ic': ic,
+            'win_prob': win_excess[win_excess > 0].count() / float(len(win_excess)),
+            'loss_prob': loss_excess[loss_excess < 0].count() / float(len(loss_excess)),
+            'excess': [excess_return.iloc[win], excess_return.iloc[loss]],
+            'win_total_return': total_return.iloc[win], 'win_annual_return': annual_return.iloc[win],
+            'loss_total_return': total_return.iloc[loss], 'loss_annual_return': annual_return.iloc[loss]}
+
+
+def draw_factor_return(fac: str, monthly: DataFrame, picture_path: str = None):
+    """
+    绘制各分组及基准累积收益
+    picture_path: 为空时 plt.show()；否则保存为 picture_path/fac.png
+    """
+    plt.rcParams['font.sans-serif'] = ['Microsoft YaHei']  # 用来正常显示中文标签
+    plt.rcParams['axes.unicode_minus'] = False  # 用来正常显示负号
+    plt.xticks(size=12, rotation=50)  # 设置字体大小和字体倾斜度
+    fig = plt.figure()
+    fig.suptitle('Figure: return for %s' % fac)
+    cum_return = (monthly.T + 1).cumprod()
+    for i, label in enumerate(['port1', 'port2', 'port3', 'port4', 'port5', 'benchmark']):
+        plt.plot(np.array(cum_return.iloc[:, i]), label=label)
+    plt.xlabel('return of factor %s' % fac)
+    plt.legend(loc=0)
+    if picture_path is None:
+        plt.show()
+    else:
+        fig.savefig(os.path.join(picture_path, '%s.png' % fac))
+        plt.close(fig)
+
+
+def ports_profit_frame(ports_return: np.ndarray, benchmark_return: list) -> (dict, DataFrame):
+    """(groups,T-1) 分组收益 -> ({'port_1':[...],...,'benchmark':[...]}, monthly)"""
+    port_profit = {"port_" + str(j + 1): ports_return[j].tolist() for j in range(ports_return.shape[0])}
+    port_profit["benchmark"] = benchmark_return
+    return port_profit, DataFrame(port_profit).T
+
+
+def monthly_records(fac: str, benchmark: str, dates: list, port_profit: dict) -> list:
+    """
+    分组月收益 -> factor_monthly_return 行记录
+    dates: 各月收益的起始样本交易日，与 port_profit 各列表一一对应；nan 记为 None
+    """
+    columns = PORT_COLUMNS + ['benchmark']
+    return [tuple([fac, benchmark, dates[i]] +
+                  [None if np.isnan(port_profit[c][i]) else float(port_profit[c][i]) for c in columns])
+            for i in range(len(port_profit['benchmark']))]
+
+
+def monthly_frames(records: DataFrame) -> dict:
+    """
+    factor_monthly_return 行记录 -> {factor: monthly} [monthly 行 port_1~port_5、benchmark，列 按交易日升序]
+    records: factor_id trade_date port_1~port_5 benchmark_return
+    """
+    frames = {}
+    records = records.rename(columns={'benchmark_return': 'benchmark'}).sort_values(by='trade_date')
+    for fac, data in records.groupby('factor_id', sort=False):
+        monthly = data.set_index('trade_date')[PORT_COLUMNS + ['benchmark']].astype(np.float64).T
+        monthly.columns.name = None
+        frames[fac] = monthly
+    return frames
+
+
+def _init_worker(panel_path, benchmark_return, picture_path):
+    _panel['close'] = np.load(os.path.join(panel_path, 'close.npy'), mmap_mode='r')
+    _panel['cmv'] = np.load(os.path.join(panel_path, 'cmv.npy'), mmap_mode='r')
+    _panel['factors'] = np.load(os.path.join(panel_path, 'factors.npy'), mmap_mode='r')
+    _panel['benchmark'] = benchmark_return
+    _panel['picture_path'] = picture_path
+    if picture_path is not None:
+        plt.switch_backend('Agg')
+
+
+def _eval_factors(batch: list) -> list:
+    """子进程：计算一批因子 [(factor_index, factor)] 的分组收益、评判指标"""
+    factor_panel = _panel['factors'][[i for i, _ in batch]]
+    ports_return = cal_ports_return(factor_panel, _panel['close'], _panel['cmv'])
+    results = []
+    for k, (_, fac) in enumerate(batch):
+        port_profit, monthly = ports_profit_frame(ports_return[k], _panel['benchmark'])
+        try:
+            effect = cal_factor_effect(monthly)
+            if _panel['picture_path'] is not None:
+                draw_factor_return(fac, monthly, _panel['picture_path'])
+        except Exception as e:
+            log_err.error("factor %s effect calculate failed! %s" % (fac, e))
+            effect = None
+        results.append((fac, port_profit, effect))
+    return results
+
+
+class FactorEffectPool(object):
+    """
+    多进程并行因子校验
+    panel:         PricePanel [close、cmv 已就绪]
+    factor_matrix: (F,T,N) 因子面板，与 factors 顺序一致
+    processes:     进程数，默认CPU核数
+    factor_batch:  每个任务一次矩阵运算的因子个数
+    picture_path:  不为空时子进程无界面绘图并保存
+    """
+
+    def __init__(self, panel, factor_matrix: np.ndarray, factors: list, processes: int = None,
+                 factor_batch: int = 2, picture_path: str = None):
+        self.panel = panel
+        self.factor_matrix = factor_matrix
+        self.factors = factors
+        self.processes = processes or os.cpu_count()
+        self.factor_batch = factor_batch
+        self.picture_path = picture_path
+        self.tmp_dir = None
+
+    def __enter__(self):
+        self.tmp_dir = tempfile.TemporaryDirectory(prefix='factor_panel_')
+        np.save(os.path.join(self.tmp_dir.name, 'close.npy'), self.panel.close)
+        np.save(os.path.join(self.tmp_dir.name, 'cmv.npy'), self.panel.cmv)
+        np.save(os.path.join(self.tmp_dir.name, 'factors.npy'), self.factor_matrix)
+        if self.picture_path is not None:
+            os.makedirs(self.picture_path, exist_ok=True)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.tmp_dir.cleanup()
+        self.tmp_dir = None
+
+    def run(self) -> list:
+        """return: [(factor, port_profit, effect)] 与 factors 顺序一致，计算失败的 effect 为 None"""
+        indexed = list(enumerate(self.factors))
+        batches = [indexed[i:i + self.factor_batch] for i in range(0, len(indexed), self.factor_batch)]
+        benchmark_return = self.panel.benchmark_return().tolist()
+        with ProcessPoolExecutor(max_workers=min(self.processes, max(len(batches), 1)), initializer=_init_worker,
+                                 initargs=(self.tmp_dir.name, benchmark_return, self.picture_path)) as executor:
+            results = []
+            for batch_result in executor.map(_eval_factors, batches):
+                results.extend(batch_result)
+        log.info("FactorEffectPool checked %s factors with %s processes" % (len(results), self.processes))
+        return results
@@ -1,28 +1,34 @@
 # -*- coding: utf-8 -*-
 __author__ = 'carl'
 
+import logging
 import warnings
 from datetime import datetime
 
-import matplotlib.pyplot as plt
-import numpy as np
 import pandas as pd
 from dateutil.relativedelta import relativedelta
-from pandas import DataFrame, Series
+from pandas import DataFrame
 
+from conf.benchmark import BENCHMARK_MAP
+from db.mymysql.bulk_loader import MySqlBulkLoader
 from db.mymysql.mysql_helper import MySqLHelper
 from db.myredis.redis_cli import RedisClient
 from entity.singleton import Singleton
+from quantization.factor_validity_check.factor_effect import cal_factor_effect, draw_factor_return, \
+    FactorEffectPool, PORT_COLUMNS, monthly_records, monthly_frames
+from quantization.factor_validity_check.price_panel import PricePanel, cal_ports_return
 from quotation.captures.tsdata_capturer import TuShareDataCapturer
 from quotation.cleaning.data_clean import BaseDataClean
 from util.quant_util import get_price, get_period_fl_trade_date
 
 warnings.filterwarnings("ignore")
+log = logging.getLogger("log_quantization")
+log_err = logging.getLogger("log_err")
 
 """
 因子有效性校验：
 目前该模块支持 BaseDataClean.get_certainday_base_stock_infos 返回字段的校验;
-继承复写重写 get_factor_data 即可;
+继承复写重写 load_factor_data 即可;
 默认取上证指数 000001.SH 为对比 基准;
 
 针对每个候选因子:
@@ -59,6 +65,15 @@ change log：
 2023.04.20:
 由于多次从数据源拉取数据极不稳定，且数据量不大 且有重复数据 所以
 因子基础数据放在本地内存 样本股票收盘价格放在数据库
+价格面板:
+样本股票收盘价格从 sample_stk_price 一次加载为 交易日×股票 稠密矩阵(PricePanel)，
+全部因子、全部月份的分组及流通市值加权收益由矩阵运算一次算出，不再逐组逐月查询数据库
+并行校验:
+get_validity_all_factors(parallel=True) 多进程共享只读面板并行计算各因子评判指标，
+factor_validity_info 最后一次批量写入；picture_path 不为空时无界面绘图保存，否则不绘图
+增量更新:
+update_validity_all_factors() 只拉取新增月份样本价格、只计算新增月份分组收益，
+分组月收益落在 factor_monthly_return 随窗口滚动，评判指标由窗口内月收益重新计算
 
 """
 
@@ -71,10 +86,7 @@ class FactorValidityCheck(Singleton):
         self.db = MySqLHelper()
         self.tsdatacapture: TuShareDataCapturer = TuShareDataCapturer()
         self.benchmark = benchmark
-        self.benchmark_map = {'000001.SH': '上证综指', '399001.SZ': '深证成指',
-                              '000300.SH': '沪深300', '399006.SZ': '创业板指',
-                              '000016.SH': '上证50', '000905.SH': '中证500',
-                              '399005.SZ': '中小板指', '000010.SH': '上证180'}
+        self.benchmark_map = dict(BENCHMARK_MAP)
         if self.benchmark not in self.benchmark_map.keys():
             self.benchmark = list(self.benchmark_map.keys())[0]
         # 基准收益[只计算一次]
@@ -90,6 +102,12 @@ class FactorValidityCheck(Singleton):
         #     ...
         # }
         self.factor_basics_data = None
+        # 交易日×股票 价格、流通市值面板
+        self.price_panel = None
+        # 因子分组月收益 {factor:{'port_1':[...],...,'port_5':[...],'benchmark':[...]}}
+        self.factors_port_profit = {}
+        # 一次矩阵运算的因子个数 [控制内存]
+        self.factor_batch = 8
         # factors ic
         self.factors_ics = DataFrame()
         # factor ic最小相关阀值
@@ -111,6 +129,8 @@ class FactorValidityCheck(Singleton):
         self.win_prob = {}
         # 输家组合跑输概率
         self.loss_prob = {}
+        # 赢家、输家组合 总收益及年化收益
+        self.win_loss_return = {}
         # effect_test["ic"]记录因子相关性，>0.5或<-0.5合格
         # effect_test["excess"]记录 赢家组合超额收益，输家组合超额收益
         # effect_test["prob"]记录 赢家组合跑赢概率和输家组合跑输概率;【>0.5,>0.4】合格(因实际情况，跑输概率暂时不考虑)
@@ -125,15 +145,37 @@ class FactorValidityCheck(Singleton):
         1- factor_data放内存
         2- 样本股票收盘价格放在数据库
         """
+        sample_dates = self.sample_dates(self.window_start_date())
         if refresh:
-            sql = r'delete from sample_stk_price'
-            self.db.delete(sql)
+            # 只删除不再是样本交易日的分区，样本交易日的分区在落库时整体替换
+            keep = set(sample_dates)
+            stale = [d for d in self.saved_sample_dates() if d not in keep]
+            MySqlBulkLoader().delete_partitions('sample_stk_price', 'trade_date', stale)
         self.factor_basics_data = {}
+        self.price_panel = None
+        self.factors_port_profit = {}
+        for trade_start_date in sample_dates:
+            # 初始化因子行情数据
+            basics_data = self.load_factor_data(trade_start_date)
+            self.factor_basics_data[trade_start_date] = basics_data
+            self.sample_trade_dates.append(trade_start_date)
+            if refresh:
+                # 样本股票收盘价格放在数据库
+                self.save_sample_price(list(basics_data['ts_code']), trade_start_date)
+
+    def window_start_date(self):
+        """样本窗口起始日 sample_periods 年前的1月1日"""
+        return datetime(datetime.today().year - self.sample_periods, 1, 1)
+
+    def sample_dates(self, start_date: datetime) -> list:
+        """
+        start_date 至今 每月首个交易日
+        """
+        dates = []
         now_m = datetime.today().month
         now_y = datetime.today().year
         now_d = datetime.today().day
         now_date = datetime(now_y, now_m, now_d)
-        start_date = datetime(now_y - self.sample_periods, 1, 1)
         while start_date + relativedelta(days=+1) <= now_date:
             end_date = start_date + relativedelta(months=+1)
             if end_date >= now_date:
@@ -144,103 +186,191 @@ class FactorValidityCheck(Singleton):
                                                                         end_date=end_date_str)
             if trade_start_date is None:
                 break
-            # 初始化因子行情数据
-            basics_data = self.load_factor_data(trade_start_date)
-            self.factor_basics_data[trade_start_date] = basics_data
-            self.sample_trade_dates.append(trade_start_date)
-            if refresh:
-                # 样本股票收盘价格放在数据库
-                ts_codes = list(basics_data['ts_code'])
-                # 'ts_code', 'close' 'trade_date' 'asset'
-                close1 = get_price(ts_code_list=ts_codes, trade_date=trade_start_date)
-                close2 = get_price(ts_code_list=[self.benchmark], trade_date=trade_start_date, asset='I')
-                for close_data in close1, close2:
-                    keys = close_data.keys()
-                    values = [tuple(val) for val in close_data.values.tolist()]
-                    key_sql = ','.join(keys)
-                    value_sql = ','.join(['%s'] * close_data.shape[1])
-                    # 插入语句
-                    insert_data_str = """ insert into %s (%s) values (%s)""" % ('sample_stk_price', key_sql, value_sql)
-                    self.db.insertmany(sql=insert_data_str, param=values)
+            dates.append(trade_start_date)
             start_date = end_date
+        return dates
 
-    def get_validity_all_factors(self, refresh=False):
+    def save_sample_price(self, ts_codes: list, trade_date: str, last_dates: dict = None):
+        """
+        样本股票、基准收盘价格落库
+        last_dates: {asset:最后样本交易日} 不晚于最后样本交易日的标的不再落库[增量更新]
+        """
+        last_dates = last_dates or {}
+        closes = []
+        if trade_date > last_dates.get('E', ''):
+            # 'ts_code', 'close' 'trade_date' 'asset'
+            closes.append(get_price(ts_code_list=ts_codes, trade_date=trade_date))
+        if trade_date > last_dates.get('I', ''):
+            closes.append(get_price(ts_code_list=[self.benchmark], trade_date=trade_date, asset='I'))
+        if len(closes) == 0:
+            return
+        # 按 交易日、标的类型 分区整体替换
+        MySqlBulkLoader().replace_partitions('sample_stk_price', pd.concat(closes, ignore_index=True),
+                                             partition_cols=['trade_date', 'asset'])
+
+    def saved_sample_dates(self) -> list:
+        """sample_stk_price 中已有的样本交易日"""
+        res = self.db.selectall(sql=r'select distinct trade_date from sample_stk_price')
+        return [item[0] for item in res] if res else []
+
+    def last_sample_dates(self) -> dict:
+        """sample_stk_price 中各标的类型最后样本交易日 {asset:trade_date}"""
+        sql = r'select asset,max(trade_date) from sample_stk_price group by asset'
+        res = self.db.selectall(sql=sql)
+        return {item[0]: item[1] for item in res} if res else {}
+
+    def save_monthly_return(self, factors: list):
+        """
+        因子分组月收益落库 factor_monthly_return[按 因子、基准、起始样本交易日 覆盖]
+        """
+        dates = self.sample_trade_dates[:-1]
+        values = []
+        for fac in factors:
+            if fac in self.factors_port_profit:
+                values.extend(monthly_records(fac, self.benchmark, dates, self.factors_port_profit[fac]))
+        if len(values) == 0 or len(dates) == 0:
+            return
+        fac_sql = ','.join(['%s'] * len(factors))
+        date_sql = ','.join(['%s'] * len(dates))
+        sql1 = r"""delete from factor_monthly_return where benchmark=%s and factor_id in ({}) 
+               and trade_date in ({})""".format(fac_sql, date_sql)
+        self.db.delete(sql1, tuple([self.benchmark] + list(factors) + list(dates)))
+        sql2 = r"""insert into factor_monthly_return
+               (factor_id,benchmark,trade_date,port_1,port_2,port_3,port_4,port_5,benchmark_return) 
+               values(%s,%s,%s,%s,%s,%s,%s,%s,%s)"""
+        self.db.insertmany(sql2, values)
+
+    def load_monthly_return(self, factors: list, start_date: str) -> dict:
+        """
+        读取 start_date 起的因子分组月收益 {factor: monthly}
+        """
+        fac_sql = ','.join(['%s'] * len(factors))
+        sql = r"""select factor_id,trade_date,port_1,port_2,port_3,port_4,port_5,benchmark_return 
+               from factor_monthly_return where benchmark=%s and trade_date>=%s and factor_id in ({})""".format(
+            fac_sql)
+        res = self.db.selectall(sql=sql, param=tuple([self.benchmark, start_date] + list(factors)))
+        columns = ['factor_id', 'trade_date'] + PORT_COLUMNS + ['benchmark_return']
+        return monthly_frames(DataFrame([list(i) for i in res or []], columns=columns))
+
+    def update_validity_all_factors(self):
+        """
+        增量更新因子有效性
+        1- 只拉取最后样本交易日之后新增月份的样本价格
+        2- 只计算新增月份的分组月收益，追加到 factor_monthly_return，窗口外的月份滚动删除
+        3- 由窗口内月收益重新计算评判指标[IC、跑赢/跑输概率、年化收益等]并落库
+        尚无样本数据时 全量计算
+        """
+        last_dates = self.last_sample_dates()
+        if 'E' not in last_dates:
+            self.get_validity_all_factors(refresh=True)
+            return
+        last_date = last_dates['E']
+        window_start = self.window_start_date().strftime('%Y%m%d')
+        last = datetime.strptime(last_date, '%Y%m%d')
+        new_dates = self.sample_dates(datetime(last.year, last.month, 1) + relativedelta(months=+1))
+        self.factor_basics_data = {}
+        self.price_panel = None
+        self.factors_port_profit = {}
+        if len(new_dates) > 0:
+            # 最后样本交易日为新增首月收益的起始日
+            self.sample_trade_dates = [last_date] + new_dates
+            for trade_date in self.sample_trade_dates:
+                basics_data = self.load_factor_data(trade_date)
+                self.factor_basics_data[trade_date] = basics_data
+                self.save_sample_price(list(basics_data['ts_code']), trade_date, last_dates)
+            self.cal_all_factors_ports_return(self.factors)
+            self.save_monthly_return(self.factors)
+            # 滚动窗口
+            self.db.delete(r'delete from sample_stk_price where trade_date<%s', window_start)
+            self.db.delete(r'delete from factor_monthly_return where benchmark=%s and trade_date<%s',
+                           (self.benchmark, window_start))
+        log.info("update factor validity from %s, new sample dates: %s" % (last_date, new_dates))
+        monthly_returns = self.load_monthly_return(self.factors, window_start)
+        checked = []
+        for fac in self.factors:
+            if fac not in monthly_returns:
+                log_err.error("factor %s has no monthly return, run get_validity_all_factors first!" % fac)
+                continue
+            self.collect_factor_effect(fac, cal_factor_effect(monthly_returns[fac]))
+            checked.append(fac)
+        self.effect_test_df = (DataFrame(self.effect_test))
+        self.effective_factors = self.effect_test_df.copy(deep=True)
+        self.save_fac_valid_info(checked)
+
+    def get_validity_all_factors(self, refresh=False, parallel=False, processes=None, picture_path=None):
         """
         获取 符合 检验有效性的量化标准 的因子
+        parallel:     多进程并行校验
+        processes:    并行进程数，默认CPU核数
+        picture_path: 并行时 不为空则无界面绘图并保存至该目录，为空不绘图
         """
         # 初始化和落地所需数据
         self.init_data(refresh=refresh)
         if not self.effect_test_df:
-            self.check_all_factor_validity()
+            if parallel:
+                self.check_all_factor_validity_parallel(processes=processes, picture_path=picture_path)
+            else:
+                self.check_all_factor_validity()
 
     def check_factor_validity(self, fac):
         """检验有效性的量化标准"""
         # 获取特定因子指定周期内月收益
         self.gather_monthly_return(fac)
         # 计算特定因子评判指标
-        self.effect_test[fac] = {}
-        monthly = self.monthly_return[[fac]]
-        # 计算因子平均年化收益
         # to see https://zhuanlan.zhihu.com/p/390849319
-        # 复利的本息计算公式是：F=P（1+i)^n P=本金，i=利率，n=期限
-        # 总收益率
-        fac_total_return = (monthly + 1).T.cumprod().iloc[-1, :] - 1
-        self.total_return[fac] = fac_total_return
-        # 各个组合平均年化收益
-        # fac_annual_return = (self.total_return[fac] + 1) ** (1. / (len(monthly) / 12)) - 1
-        fac_annual_return = (self.total_return[fac] + 1) ** (1. / (monthly.columns.size / 12)) - 1
-        self.annual_return[fac] = fac_annual_return
-        # 各个组合超额收益 【因子annual_return - 基准annual_return】
-        fac_excess_return = self.annual_return[fac] - self.annual_return[fac][-1]
-        self.excess_return[fac] = fac_excess_return
-        # 判断因子有效性
-        # 1.年化收益与因子的相关性IC
-        fac_ic = self.annual_return[fac][0:5].corr(
-            Series([1, 2, 3, 4, 5], index=self.annual_return[fac][0:5].index))
-        self.effect_test[fac]["ic"] = fac_ic
-
-        # 2.高收益组合跑赢概率  port_1因子<port_5因子
-        # 因子小，收益小，port_1是输家组合，port_5是赢家组合
-        if self.total_return[fac][0] < self.total_return[fac][-2]:
-            loss_excess = monthly.iloc[0, :] - monthly.iloc[-1, :]
-            self.loss_prob[fac] = loss_excess[loss_excess < 0].count() / float(len(loss_excess))
-            win_excess = monthly.iloc[-2, :] - monthly.iloc[-1, :]
-            self.win_prob[fac] = win_excess[win_excess > 0].count() / float(len(win_excess))
-            # 赢家组合跑赢概率和输家组合跑输概率
-            self.effect_test[fac]["prob"] = [self.win_prob[fac], self.loss_prob[fac]]
-            # 超额收益
-            self.effect_test[fac]["excess"] = [self.excess_return[fac][-2], self.excess_return[fac][0]]
-            l_annual_return = fac_annual_return["port_1"]
-            w_annual_return = fac_annual_return["port_5"]
-            l_total_return = fac_total_return["port_1"]
-            w_total_return = fac_total_return["port_5"]
-        # 因子小，收益大，port_1是赢家组合，port_5是输家组合
-        else:
-            # port_5-benchmark
-            loss_excess = monthly.iloc[-2, :] - monthly.iloc[-1, :]
-            self.loss_prob[fac] = loss_excess[loss_excess < 0].count() / float(len(loss_excess))
-            win_excess = monthly.iloc[0, :] - monthly.iloc[-1, :]
-            self.win_prob[fac] = win_excess[win_excess > 0].count() / float(len(win_excess))
-            # 赢家组合跑赢概率和输家组合跑输概率
-            self.effect_test[fac]["prob"] = [self.win_prob[fac], self.loss_prob[fac]]
-            # 超额收益
-            self.effect_test[fac]["excess"] = [self.excess_return[fac][0], self.excess_return[fac][-2]]
-            l_annual_return = fac_annual_return["port_5"]
-            w_annual_return = fac_annual_return["port_1"]
-            l_total_return = fac_total_return["port_5"]
-            w_total_return = fac_total_return["port_1"]
+        self.collect_factor_effect(fac, cal_factor_effect(self.monthly_return[[fac]]))
         self.effect_test_df = (DataFrame(self.effect_test))
         self.effective_factors = self.effect_test_df.copy(deep=True)
-
-        self.save_fac_valid_info(fac, fac_annual_return, fac_ic, fac_total_return, l_annual_return, l_total_return,
-                                 w_annual_return, w_total_return)
+        self.save_fac_valid_info([fac])
         self.draw_return_picture(fac)
 
+    def collect_factor_effect(self, fac, effect):
+        """记录因子评判指标"""
+        self.total_return[fac] = effect['total_return']
+        self.annual_return[fac] = effect['annual_return']
+        self.excess_return[fac] = effect['excess_return']
+        self.win_prob[fac] = effect['win_prob']
+        self.loss_prob[fac] = effect['loss_prob']
+        self.win_loss_return[fac] = effect
+        self.effect_test[fac] = {}
+        self.effect_test[fac]["ic"] = effect['ic']
+        # 赢家组合跑赢概率和输家组合跑输概率
+        self.effect_test[fac]["prob"] = [effect['win_prob'], effect['loss_prob']]
+        # 超额收益
+        self.effect_test[fac]["excess"] = effect['excess']
+
     def check_all_factor_validity(self):
         """检验有效性的量化标准"""
+        self.cal_all_factors_ports_return(self.factors)
+        self.save_monthly_return(self.factors)
         for fac in self.factors:
             self.check_factor_validity(fac=fac)
 
+    def check_all_factor_validity_parallel(self, processes=None, picture_path=None):
+        """
+        多进程并行检验有效性的量化标准
+        价格面板、因子面板 各进程只读共享，分组收益、评判指标[及图片]在子进程计算，
+        结果在主进程汇总后 一次批量写入 factor_validity_info
+        """
+        if self.price_panel is None:
+            self.init_price_panel()
+        factor_matrix = self.price_panel.align(self.factor_basics_data, self.factors)
+        with FactorEffectPool(self.price_panel, factor_matrix, self.factors, processes=processes,
+                              picture_path=picture_path) as pool:
+            results = pool.run()
+        del factor_matrix
+        checked = []
+        for fac, port_profit, effect in results:
+            self.factors_port_profit[fac] = port_profit
+            if effect is None:
+                continue
+            self.collect_factor_effect(fac, effect)
+            checked.append(fac)
+        self.save_monthly_return(self.factors)
+        self.effect_test_df = (DataFrame(self.effect_test))
+        self.effective_factors = self.effect_test_df.copy(deep=True)
+        self.save_fac_valid_info(checked)
+
     def gather_monthly_return(self, factor):
         """
         集合 monthly_return
@@ -264,47 +394,42 @@ class FactorValidityCheck(Singleton):
         """
         计算某一个因子在各个分组的月收益率
         """
-        port_profit = {}
-        for i in range(len(self.sample_trade_dates)):
-            if i + 1 >= len(self.sample_trade_dates):
-                break
-            start_date = self.sample_trade_dates[i]
-            end_date = self.sample_trade_dates[i + 1]
-            basics_data = self.get_factor_data(factor, start_date)
-            self.part_data_cal_mon_profit(basics_data, end_date, factor, port_profit, start_date)
-            # 计算基准月收益[只计算一次]
-            if self.benchmark_port_profit is None:
-                benchmark_m_return = self.cal_benchmark_monthly_return(start_date, end_date)
-                if not port_profit.keys().__contains__("benchmark"):
-                    prof_list = []
-                    prof_list.append(benchmark_m_return)
-                    port_profit["benchmark"] = prof_list
-                else:
-                    port_profit["benchmark"].append(benchmark_m_return)
-        return port_profit
-
-    def part_data_cal_mon_profit(self, basics_data, end_date, factor, port_profit, start_date):
-        """分组 并计算 分组月收益"""
-        score = basics_data[['ts_code', factor]].sort_values(by=factor)
-        # 流通市值
-        cmv = basics_data[['ts_code', 'CMV']]
-        cmv.index = cmv['ts_code']
-        port1 = list(score['ts_code'])[: len(score.index) // 5]
-        port2 = list(score['ts_code'])[len(score.index) // 5: 2 * len(score.index) // 5]
-        port3 = list(score['ts_code'])[2 * len(score.index) // 5: -2 * len(score.index) // 5]
-        port4 = list(score['ts_code'])[-2 * len(score.index) // 5: -len(score.index) // 5]
-        port5 = list(score['ts_code'])[-len(score.index) // 5:]
-        ports = [port1, port2, port3, port4, port5]
-        port_index = 0
-        for port in ports:
-            port_index += 1
-            weighted_m_return = self.cal_port_monthly_return(port, start_date, end_date, cmv)
-            if not port_profit.keys().__contains__("port_" + str(port_index)):
-                prof_list = []
-                prof_list.append(weighted_m_return)
-                port_profit["port_" + str(port_index)] = prof_list
-            else:
-                port_profit["port_" + str(port_index)].append(weighted_m_return)
+        if factor not in self.factors_port_profit:
+            self.cal_all_factors_ports_return([factor])
+        return self.factors_port_profit[factor]
+
+    def init_price_panel(self):
+        """
+        从 sample_stk_price 一次加载全部样本交易日收盘价，构建 交易日×股票 价格面板、流通市值面板
+        面板股票为 有价格的股票 ∪ 有因子数据的股票[无价格的股票仍参与因子分组]
+        """
+        value_sql = ','.join(['%s'] * len(self.sample_trade_dates))
+        sql = r"""select ts_code,trade_date,close,asset from sample_stk_price where trade_date in ({})""".format(
+            value_sql)
+        data = self.db.selectall(sql=sql, param=tuple(self.sample_trade_dates))
+        prices = DataFrame([list(i) for i in data], columns=['ts_code', 'trade_date', 'close', 'asset'])
+        codes = set(prices.loc[prices['asset'] == 'E', 'ts_code'])
+        for basics_data in self.factor_basics_data.values():
+            codes.update(basics_data['ts_code'])
+        self.price_panel = PricePanel.from_frame(prices, dates=self.sample_trade_dates, codes=sorted(codes),
+                                                 benchmark=self.benchmark)
+        self.price_panel.cmv = self.price_panel.align(self.factor_basics_data, ['CMV'])[0]
+
+    def cal_all_factors_ports_return(self, factors):
+        """
+        基于价格面板一次计算多个因子全部月份的分组月收益率
+        """
+        if self.price_panel is None:
+            self.init_price_panel()
+        benchmark_return = self.price_panel.benchmark_return().tolist()
+        for i in range(0, len(factors), self.factor_batch):
+            batch = factors[i:i + self.factor_batch]
+            factor_panel = self.price_panel.align(self.factor_basics_data, batch)
+            ports_return = cal_ports_return(factor_panel, self.price_panel.close, self.price_panel.cmv)
+            for k, fac in enumerate(batch):
+                port_profit = {"port_" + str(j + 1): ports_return[k, j].tolist() for j in range(ports_return.shape[1])}
+                port_profit["benchmark"] = benchmark_return
+                self.factors_port_profit[fac] = port_profit
 
     def load_factor_data(self, trade_date):
         """
@@ -313,128 +438,62 @@ class FactorValidityCheck(Singleton):
         """
         need_cols = self.factors.copy()
         need_cols.insert(0, 'ts_code')
-        basics_data: DataFrame = BaseDataClean.get_certainday_base_stock_infos(trade_date=trade_date)[need_cols]
+        basics_data: DataFrame = BaseDataClean.get_certainday_base_stock_infos(trade_date=trade_date,
+                                                                               columns=need_cols)
         basics_data['CMV'] = basics_data['circ_mv']
         return basics_data
 
-    def get_factor_data(self, factor, trade_date):
-        """
-        获取含有因子数据的行情
-        """
-        basics_data: DataFrame = self.factor_basics_data[trade_date][[
-            'ts_code', 'CMV', factor]]
-        basics_data.dropna(axis=0, how='any', subset=[factor], inplace=True)
-        return basics_data
-
-    # @retry(max_retry=3, time_interval=9)
-    def cal_port_monthly_return(self, port, startdate, enddate, CMV):
+    def save_fac_valid_info(self, facs: list):
         """
-        计算分组内流通市值加权的月收益率
+        批量保存因子有效性信息
         """
-        port_codes = []
-        value_sql = ','.join(['%s'] * len(port))
-        sql = r"""select ts_code,close from sample_stk_price where trade_date=%s and ts_code in ({}) and asset=%s""".format(
-            value_sql)
-        port_codes.append(startdate)
-        for p in port:
-            port_codes.append(p)
-        port_codes.append('E')
-        params1 = tuple(port_codes)
-        port_codes[0] = enddate
-        params2 = tuple(port_codes)
-        data1 = self.db.selectall(sql=sql, param=params1)
-        data2 = self.db.selectall(sql=sql, param=params2)
-
-        columns = ['ts_code', 'close']
-        close1 = pd.DataFrame([list(i) for i in data1], columns=columns)
-        close1.index = close1['ts_code']
-        close2 = pd.DataFrame([list(i) for i in data2], columns=columns)
-        close2.index = close2['ts_code']
-        c1_list = close1['ts_code'].to_list()
-        c2_list = close2['ts_code'].to_list()
-        valid_codes = list(set(c1_list).intersection(set(c2_list)))
-        close1 = close1['close'].loc[valid_codes]
-        close2 = close2['close'].loc[valid_codes]
-        # 组合月收益率集合
-        month_profit = close2 / close1 - 1
-        circ_mv = CMV['CMV'].loc[valid_codes]
-        # 月收益率加权流通市值
-        weighted_month_profit = month_profit * circ_mv
-        # 根据流通市值加权的月收益率
-        weighted_m_return = weighted_month_profit.sum() / circ_mv.sum()
-        return weighted_m_return
-
-    def cal_benchmark_monthly_return(self, startdate, enddate):
-        """
-        计算分组内基准的月收益率
-        """
-        sql = r"""select ts_code,close from sample_stk_price where trade_date=%s and ts_code =%s and asset=%s"""
-        params1 = (startdate, self.benchmark, 'I')
-        params2 = (enddate, self.benchmark, 'I')
-        data1 = self.db.selectall(sql=sql, param=params1)
-        data2 = self.db.selectall(sql=sql, param=params2)
-        columns = ['ts_code', 'close']
-        close1 = pd.DataFrame([list(i) for i in data1], columns=columns)
-        close2 = pd.DataFrame([list(i) for i in data2], columns=columns)
-        close1.index = close1['ts_code']
-        close2.index = close2['ts_code']
-        valid_codes = close1['ts_code'].to_list()
-        close1 = close1['close'].loc[valid_codes]
-        close2 = close2['close'].loc[valid_codes]
-        benchmark_return = (close2 / close1 - 1).sum()
-        return benchmark_return
-
-    def save_fac_valid_info(self, fac, fac_annual_return, fac_ic, fac_total_return, l_annual_return, l_total_return,
-                            w_annual_return, w_total_return):
-        """
-        保存因子有效性信息
-        """
-        sql1 = r'select * from candidate_factors where factor_id=%s'
-        args = fac
-        res = self.db.selectone(sql=sql1, param=args)
-        factor_id = res[1]
-        factor_name = res[2]
-        factor_type_id = res[3]
-        factor_type = res[4]
+        if len(facs) == 0:
+            return
+        value_sql = ','.join(['%s'] * len(facs))
+        sql1 = r'select * from candidate_factors where factor_id in ({})'.format(value_sql)
+        res = self.db.selectall(sql=sql1, param=tuple(facs))
+        candidates = {item[1]: item for item in res}
         benchmark = self.benchmark
         benchmark_name = self.benchmark_map[self.benchmark]
-        benchmark_total_return = fac_total_return["benchmark"]
-        benchmark_annual_return = fac_annual_return["benchmark"]
-        win_total_return = w_total_return
-        win_annual_return = w_annual_return
-        # effect_test["excess"]记录 赢家组合超额收益，输家组合超额收益
-        # effect_test["prob"]记录 赢家组合跑赢概率和输家组合跑输概率;【>0.5,>0.4】合格(因实际情况，跑输概率暂时不考虑)
-        win_excess_return = self.effect_test[fac]["excess"][0]
-        loss_total_return = l_total_return
-        loss_annual_return = l_annual_return
-        loss_excess_return = self.effect_test[fac]["excess"][1]
-        win_prob = self.win_prob[fac]
-        loss_prob = self.loss_prob[fac]
-        factor_ic = fac_ic
-        # 1-有效 0-无效
-        is_valid = 1
-        if abs(fac_ic) < self.min_corr:
-            is_valid = 0
         sample_periods = self.sample_periods
         memo = ''
-        sql2 = r'select * from factor_validity_info where factor_id=%s'
-        args = fac
-        res = self.db.selectone(sql=sql2, param=args)
-        if res is not None:
-            sql3 = r'delete from factor_validity_info WHERE factor_id=%s'
-            args = fac
-            self.db.delete(sql3, args)
-        sql4 = r"""insert into factor_validity_info
+        values = []
+        for fac in facs:
+            if fac not in candidates:
+                continue
+            factor_id = candidates[fac][1]
+            factor_name = candidates[fac][2]
+            factor_type_id = candidates[fac][3]
+            factor_type = candidates[fac][4]
+            effect = self.win_loss_return[fac]
+            benchmark_total_return = self.total_return[fac]["benchmark"]
+            benchmark_annual_return = self.annual_return[fac]["benchmark"]
+            # effect_test["excess"]记录 赢家组合超额收益，输家组合超额收益
+            # effect_test["prob"]记录 赢家组合跑赢概率和输家组合跑输概率;【>0.5,>0.4】合格(因实际情况，跑输概率暂时不考虑)
+            win_excess_return = self.effect_test[fac]["excess"][0]
+            loss_excess_return = self.effect_test[fac]["excess"][1]
+            factor_ic = self.effect_test[fac]["ic"]
+            # 1-有效 0-无效
+            is_valid = 1
+            if abs(factor_ic) < self.min_corr:
+                is_valid = 0
+            values.append((factor_id, factor_name, factor_type_id, factor_type, benchmark,
+                           benchmark_name, benchmark_total_return, benchmark_annual_return,
+                           effect['win_total_return'], effect['win_annual_return'], win_excess_return,
+                           effect['loss_total_return'], effect['loss_annual_return'],
+                           loss_excess_return, self.win_prob[fac], self.loss_prob[fac], factor_ic,
+                           is_valid, sample_periods, memo))
+        if len(values) == 0:
+            return
+        sql2 = r'delete from factor_validity_info WHERE factor_id in ({})'.format(','.join(['%s'] * len(values)))
+        self.db.delete(sql2, tuple(v[0] for v in values))
+        sql3 = r"""insert into factor_validity_info
                (factor_id,factor_name,factor_type_id,factor_type,benchmark,
                benchmark_name,benchmark_total_return,benchmark_annual_return,win_total_return,
                win_annual_return,win_excess_return,loss_total_return,loss_annual_return,
                loss_excess_return,win_prob,loss_prob,factor_ic,is_valid,sample_periods,memo) 
                values(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"""
-        self.db.insertone(sql4, (factor_id, factor_name, factor_type_id, factor_type, benchmark,
-                                       benchmark_name, benchmark_total_return, benchmark_annual_return,
-                                       win_total_return, win_annual_return, win_excess_return, loss_total_return,
-                                       loss_annual_return, loss_excess_return, win_prob, loss_prob, factor_ic,
-                                       is_valid, sample_periods, memo))
+        self.db.insertmany(sql3, values)
 
     def default_factors(self):
         """默认因子集"""
@@ -451,25 +510,7 @@ class FactorValidityCheck(Singleton):
         res = self.db.selectall(sql=sql)
         self.factors = [item[1] for item in res]
 
-    def draw_return_picture(self, fac):
+    def draw_return_picture(self, fac, picture_path=None):
+        """picture_path 不为空时保存图片，不弹出窗口"""
         df = self.monthly_return[[fac]]
-        plt.rcParams['font.sans-serif'] = ['Microsoft YaHei']  # 用来正常显示中文标签
-        plt.rcParams['axes.unicode_minus'] = False  # 用来正常显示负号
-        plt.xticks(size=12, rotation=50)  # 设置字体大小和字体倾斜度
-        fig = plt.figure()
-        fig.suptitle('Figure: return for %s' % fac)
-        # (df.T + 1).cumprod().iloc[:, 0].plot(label='port1')
-        plt.plot(np.array((df.T + 1).cumprod().iloc[:, 0]), label='port1')
-        plt.plot(np.array((df.T + 1).cumprod().iloc[:, 1]), label='port2')
-        # (df.T + 1).cumprod().iloc[:, 1].plot(label='port2')
-        # (df.T + 1).cumprod().iloc[:, 2].plot(label='port3')
-        plt.plot(np.array((df.T + 1).cumprod().iloc[:, 2]), label='port3')
-        plt.plot(np.array((df.T + 1).cumprod().iloc[:, 3]), label='port4')
-        # (df.T + 1).cumprod().iloc[:, 3].plot(label='port4')
-        # (df.T + 1).cumprod().iloc[:, 4].plot(label='port5')
-        # (df.T + 1).cumprod().iloc[:, 5].plot(label='benchmark')
-        plt.plot(np.array((df.T + 1).cumprod().iloc[:, 4]), label='port5')
-        plt.plot(np.array((df.T + 1).cumprod().iloc[:, 5]), label='benchmark')
-        plt.xlabel('return of factor %s' % fac)
-        plt.legend(loc=0)
-        plt.show()
+        draw_factor_return(fac, df, picture_path)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+"""
+因子有效性校验 列式面板计算引擎
+
+PricePanel：样本交易日 × 股票 的稠密矩阵
+    close:           (T,N) float64 后复权收盘价，缺失为nan
+    cmv:             (T,N) float64 流通市值，缺失为nan
+    benchmark_close: (T,)  float64 基准收盘价
+cal_ports_return：全部因子、全部月份一次计算
+    按因子值升序排序，按位置均分为 groups 组[与原 port1~port5 切片规则一致]，
+    计算每组 t->t+1 流通市值加权收益
+"""
+
+
+class PricePanel(object):
+
+    def __init__(self, dates, codes, close, cmv=None, benchmark_close=None):
+        self.dates = np.asarray(dates)
+        self.codes = np.asarray(codes)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.cmv = cmv
+        self.benchmark_close = benchmark_close
+        self.code_index = pd.Index(self.codes)
+
+    @classmethod
+    def from_frame(cls, prices: DataFrame, dates: list = None, codes: list = None, benchmark: str = None):
+        """
+        prices: ts_code trade_date close asset [sample_stk_price 行记录]
+        dates:  面板交易日，默认 prices 中全部交易日
+        codes:  面板股票，默认 prices 中全部股票
+        """
+        prices = prices.drop_duplicates(subset=['trade_date', 'ts_code', 'asset'], keep='last')
+        stk = prices[prices['asset'] == 'E']
+        close = stk.pivot(index='trade_date', columns='ts_code', values='close')
+        dates = sorted(prices['trade_date'].unique()) if dates is None else dates
+        codes = close.columns if codes is None else codes
+        close = close.reindex(index=dates, columns=codes)
+        benchmark_close = None
+        if benchmark is not None:
+            bench = prices[(prices['asset'] == 'I') & (prices['ts_code'] == benchmark)]
+            benchmark_close = bench.set_index('trade_date')['close'].reindex(dates).to_numpy(dtype=np.float64)
+        return cls(dates=close.index.to_numpy(), codes=close.columns.to_numpy(),
+                   close=close.to_numpy(dtype=np.float64), benchmark_close=benchmark_close)
+
+    def align(self, frames: dict, columns: list) -> np.ndarray:
+        """
+        将 {trade_date: DataFrame(ts_code, columns...)} 对齐为 (len(columns),T,N) 矩阵
+        面板外的股票丢弃，缺失为nan
+        """
+        matrix = np.full((len(columns), len(self.dates), len(self.codes)), np.nan)
+        for i, date in enumerate(self.dates):
+            data = frames.get(date)
+            if data is None or data.empty:
+                continue
+            pos = self.code_index.get_indexer(data['ts_code'])
+            ok = pos >= 0
+            matrix[:, i, pos[ok]] = data[columns].to_numpy(dtype=np.float64)[ok].T
+        return matrix
+
+    def benchmark_return(self) -> np.ndarray:
+        """基准 t->t+1 收益 (T-1,) 缺失记为0"""
+        if self.benchmark_close is None:
+            return np.zeros(len(self.dates) - 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ret = self.benchmark_close[1:] / self.benchmark_close[:-1] - 1
+        return np.nan_to_num(ret, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def cal_ports_return(factors: np.ndarray, close: np.ndarray, cmv: np.ndarray, groups: int = 5) -> np.ndarray:
+    """
+    因子分组流通市值加权收益
+    factors: (K,T,N) 因子值，nan表示无因子数据[不参与分组]
+    close:   (T,N)   收盘价
+    cmv:     (T,N)   流通市值
+    return:  (K,groups,T-1) 第t期按因子升序分组，组内 t->t+1 流通市值加权收益；组内无有效股票为nan
+    """
+    factors = np.asarray(factors, dtype=np.float64)
+    valid = ~np.isnan(factors)
+    n = valid.sum(axis=2, keepdims=True)
+    # nan 排在最后；稳定排序 相同因子值按股票顺序
+    order = np.argsort(factors, axis=2, kind='stable')
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.broadcast_to(np.arange(factors.shape[2]), order.shape), axis=2)
+    # 第k组为排序位置 [floor(k*n/groups), floor((k+1)*n/groups)) 的股票
+    port = (groups * (rank + 1) + n - 1) // np.maximum(n, 1) - 1
+    port = np.where(valid, np.minimum(port, groups - 1), -1)[:, :-1, :]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ret = close[1:] / close[:-1] - 1
+        ok = np.isfinite(ret)
+        weight = np.nan_to_num(cmv[:-1], nan=0.0)
+        weighted_ret = np.where(ok, ret * weight, 0.0)
+        weight = np.where(ok, weight, 0.0)
+        ports_return = np.empty((factors.shape[0], groups, close.shape[0] - 1))
+        for k in range(groups):
+            mask = port == k
+            ports_return[:, k, :] = (np.where(mask, weighted_ret, 0.0).sum(axis=2) /
+                                     np.where(mask, weight, 0.0).sum(axis=2))
+    return ports_return
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import logging
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from quotation.store.market_store import LocalMarketDataStore
+
+"""
+技术指标：交易日 × 股票 矩阵上一次向量化计算全市场指标
+-- MA:   N日收盘价简单平均
+-- EMA:  指数平均 EMA = 2/(N+1) × C + (N-1)/(N+1) × 前值，以首个值为初值[同通达信]
+-- MACD: DIF = EMA(C,短) - EMA(C,长)，DEA = EMA(DIF,M)，MACD = 2 × (DIF - DEA)
+-- RSI:  SMA(MAX(C-YC,0),N,1) / SMA(ABS(C-YC),N,1) × 100，SMA(X,N,M) = M/N × X + (N-M)/N × 前值
+-- BOLL: MID = MA(C,N)，UP/LOW = MID ± K × 标准差[总体标准差，同 TA-Lib]
+-- KDJ:  RSV = (C - N日最低) / (N日最高 - N日最低) × 100，K = SMA(RSV,M1,1)，D = SMA(K,M2,1)，初值50，J = 3K - 2D
+-- AR:   N日(H-O)之和 / N日(O-L)之和 × 100
+-- BR:   N日(H-YC)之和 / N日(YC-L)之和 × 100，YC 为前收盘价
+滑动求和/平均用 cumsum 差分，滑动最高/最低用 sliding_window_view，递推指标按交易日循环、全部股票一次计算
+停牌日(收盘价缺失)按前收盘价补成一字k线参与计算，输出为 nan；上市前为 nan
+增量更新：compute 后保留最近若干根k线及递推状态，update 追加一根k线只计算新的一行，结果与全量重算一致
+
+usage:
+    ti = TechnicalIndicators()
+    panel = ti.compute(**load_ohlc_panel(ts_codes, '20220101', '20221231'))
+    panel['MA20']                       # 交易日 × ts_code
+    row = ti.update('20230103', bar)    # bar: index ts_code，columns open/high/low/close；返回 ts_code × 指标名
+"""
+log = logging.getLogger("log_quantization")
+log_err = logging.getLogger("log_err")
+
+OHLC = ['open', 'high', 'low', 'close']
+
+
+def rolling_sum(x: np.ndarray, n: int) -> np.ndarray:
+    """按列 n 日滑动求和，窗口内有缺失值为 nan"""
+    valid = ~np.isnan(x)
+    sums = np.cumsum(np.where(valid, x, 0.0), axis=0)
+    counts = np.cumsum(valid, axis=0)
+    sums[n:] = sums[n:] - sums[:-n]
+    counts[n:] = counts[n:] - counts[:-n]
+    return np.where(counts == n, sums, np.nan)
+
+
+def ma(x: np.ndarray, n: int) -> np.ndarray:
+    return rolling_sum(x, n) / n
+
+
+def rolling_std(x: np.ndarray, n: int) -> np.ndarray:
+    """n 日总体标准差"""
+    mean = ma(x, n)
+    var = ma(x * x, n) - mean * mean
+    return np.sqrt(np.maximum(var, 0.0))
+
+
+def _rolling(x: np.ndarray, n: int, func) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    if x.shape[0] >= n:
+        out[n - 1:] = func(np.lib.stride_tricks.sliding_window_view(x, n, axis=0), axis=-1)
+    return out
+
+
+def rolling_max(x: np.ndarray, n: int) -> np.ndarray:
+    return _rolling(x, n, np.max)
+
+
+def rolling_min(x: np.ndarray, n: int) -> np.ndarray:
+    return _rolling(x, n, np.min)
+
+
+def ewm(x: np.ndarray, alpha: float, prev: np.ndarray = None, init: float = None) -> (np.ndarray, np.ndarray):
+    """
+    按列递推 Y = alpha × X + (1-alpha) × 前值
+    prev: 上一行的递推值[增量计算时传入]；无前值时以 init 为前值，init 为空则以首个值为初值
+    X 缺失时沿用前值
+    return: (结果矩阵, 最后一行递推值)
+    """
+    out = np.empty(x.shape)
+    prev = np.full(x.shape[1:], np.nan) if prev is None else prev
+    for t in range(x.shape[0]):
+        start = x[t] if init is None else alpha * x[t] + (1 - alpha) * init
+        cur = np.where(np.isnan(prev), start, alpha * x[t] + (1 - alpha) * prev)
+        prev = np.where(np.isnan(x[t]), prev, cur)
+        out[t] = prev
+    return out, prev
+
+
+def fill_suspended(ohlc: dict, prev_close: np.ndarray) -> dict:
+    """停牌日按前收盘价补成一字k线；prev_close 为第一行之前的收盘价"""
+    close = pd.DataFrame(np.vstack([prev_close, ohlc['close']])).ffill().to_numpy()[1:]
+    return {k: np.where(np.isnan(ohlc[k]), close, ohlc[k]) for k in OHLC}
+
+
+def ohlc_panel(prices: DataFrame) -> dict:
+    """daily 行记录 -> {'open','high','low','close': 交易日 × ts_code}"""
+    prices = prices.drop_duplicates(subset=['ts_code', 'trade_date'], keep='last')
+    close = prices.pivot(index='trade_date', columns='ts_code', values='close').sort_index()
+    panel = {k: prices.pivot(index='trade_date', columns='ts_code', values=k).reindex(index=close.index,
+                                                                                      columns=close.columns)
+             for k in ['open', 'high', 'low']}
+    panel['close'] = close
+    return panel
+
+
+def load_ohlc_panel(ts_codes: list, start_date: str, end_date: str) -> dict:
+    """本地行情存储读取 OHLC 矩阵 [不访问网络]"""
+    prices = LocalMarketDataStore().load_range('daily', start_date, end_date, ts_codes)
+    if prices.empty:
+        return {k: DataFrame() for k in OHLC}
+    return ohlc_panel(prices)
+
+
+class TechnicalIndicators(object):
+    """
+    ma_periods:  MA 周期
+    macd:        (短, 长, M)，同时输出 EMA短、EMA长
+    rsi_periods: RSI 周期
+    boll:        (N, K)
+    kdj:         (N, M1, M2)
+    arbr:        AR/BR 周期
+    """
+
+    def __init__(self, ma_periods=(5, 10, 20, 60), macd=(12, 26, 9), rsi_periods=(6, 12, 24), boll=(20, 2),
+                 kdj=(9, 3, 3), arbr=26):
+        self.ma_periods = list(ma_periods)
+        self.macd = macd
+        self.rsi_periods = list(rsi_periods)
+        self.boll = boll
+        self.kdj = kdj
+        self.arbr = arbr
+        # 滑动窗口最长周期 + 前收盘价
+        self.tail_len = max(self.ma_periods + [boll[0], kdj[0], arbr]) + 1
+        self.dates = None
+        self.codes = None
+        self.tail = None
+        self.states = {}
+
+    def names(self) -> list:
+        short, long, _ = self.macd
+        return (['MA%s' % n for n in self.ma_periods] + ['EMA%s' % short, 'EMA%s' % long, 'DIF', 'DEA', 'MACD'] +
+                ['RSI%s' % n for n in self.rsi_periods] + ['BOLL_MID', 'BOLL_UP', 'BOLL_LOW', 'K', 'D', 'J', 'AR', 'BR'])
+
+    def compute(self, open, high, low, close) -> dict:
+        """
+        全量计算，参数为 交易日 × ts_code 的 DataFrame [index 升序，四个矩阵同形]
+        return: {指标名: 交易日 × ts_code}
+        """
+        self.dates = close.index
+        self.codes = close.columns
+        self.tail = None
+        self.states = {}
+        ohlc = {k: v.to_numpy(dtype=np.float64) for k, v in zip(OHLC, [open, high, low, close])}
+        res = self._compute_block(ohlc)
+        log.info("TechnicalIndicators compute: %s dates, %s stocks" % (len(self.dates), len(self.codes)))
+        return {name: DataFrame(values, index=self.dates, columns=self.codes) for name, values in res.items()}
+
+    def update(self, trade_date, bar: DataFrame) -> DataFrame:
+        """
+        追加一根k线 增量计算
+        bar: index ts_code，columns open/high/low/close；缺少的股票视为停牌，compute 之外的新股票忽略
+        return: ts_code × 指标名
+        """
+        if self.tail is None:
+            raise ValueError("TechnicalIndicators.update must be called after compute.")
+        bar = bar.reindex(self.codes)
+        ohlc = {k: bar[k].to_numpy(dtype=np.float64)[None, :] for k in OHLC}
+        res = self._compute_block(ohlc)
+        self.dates = self.dates.append(pd.Index([trade_date]))
+        return DataFrame({name: values[0] for name, values in res.items()}, index=self.codes)[self.names()]
+
+    def _compute_block(self, ohlc: dict) -> dict:
+        """在已有状态之后 计算一段连续k线的全部指标，并更新状态"""
+        rows = ohlc['close'].shape[0]
+        suspended = np.isnan(ohlc['close'])
+        prev_close = np.full(ohlc['close'].shape[1], np.nan) if self.tail is None else self.tail['close'][-1]
+        ohlc = fill_suspended(ohlc, prev_close)
+        # 之前保留的k线 + 本段k线，滑动窗口指标在其上计算后取本段
+        win = ohlc if self.tail is None else {k: np.vstack([self.tail[k], ohlc[k]]) for k in OHLC}
+        m = win['close'].shape[0] - rows
+        pre_close = np.vstack([np.full((1, win['close'].shape[1]), np.nan), win['close'][:-1]])
+        close = ohlc['close']
+        yc = pre_close[m:]
+        res = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for n in self.ma_periods:
+                res['MA%s' % n] = ma(win['close'], n)[m:]
+
+            short, long, mid = self.macd
+            res['EMA%s' % short] = self._ewm('EMA%s' % short, close, 2 / (short + 1))
+            res['EMA%s' % long] = self._ewm('EMA%s' % long, close, 2 / (long + 1))
+            res['DIF'] = res['EMA%s' % short] - res['EMA%s' % long]
+            res['DEA'] = self._ewm('DEA', res['DIF'], 2 / (mid + 1))
+            res['MACD'] = 2 * (res['DIF'] - res['DEA'])
+
+            diff = close - yc
+            for n in self.rsi_periods:
+                up = self._ewm('RSI%s_UP' % n, np.maximum(diff, 0), 1 / n)
+                total = self._ewm('RSI%s_ABS' % n, np.abs(diff), 1 / n)
+                res['RSI%s' % n] = up / total * 100
+
+            n, k = self.boll
+            res['BOLL_MID'] = ma(win['close'], n)[m:]
+            std = rolling_std(win['close'], n)[m:]
+            res['BOLL_UP'] = res['BOLL_MID'] + k * std
+            res['BOLL_LOW'] = res['BOLL_MID'] - k * std
+
+            n, m1, m2 = self.kdj
+            llv = rolling_min(win['low'], n)[m:]
+            hhv = rolling_max(win['high'], n)[m:]
+            rsv = (close - llv) / (hhv - llv) * 100
+            res['K'] = self._ewm('K', rsv, 1 / m1, init=50.0)
+            res['D'] = self._ewm('D', res['K'], 1 / m2, init=50.0)
+            res['J'] = 3 * res['K'] - 2 * res['D']
+
+            n = self.arbr
+            res['AR'] = (rolling_sum(win['high'] - win['open'], n) / rolling_sum(win['open'] - win['low'], n))[m:] * 100
+            res['BR'] = (rolling_sum(win['high'] - pre_close, n) / rolling_sum(pre_close - win['low'], n))[m:] * 100
+
+        self.tail = {k: v[-self.tail_len:] for k, v in win.items()}
+        for values in res.values():
+            values[suspended] = np.nan
+        return res
+
+    def _ewm(self, key: str, x: np.ndarray, alpha: float, init: float = None) -> np.ndarray:
+        out, self.states[key] = ewm(x, alpha, prev=self.states.get(key), init=init)
+        return out
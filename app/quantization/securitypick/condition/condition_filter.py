@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import logging
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+'''
+条件过滤引擎：将条件字典编译为谓词，一次求出单个布尔掩码，取代逐条件 query + merge
+-- 区间条件 {'pe': [min, max]}   -> 左闭右开 [min, max)，None 表示不限；
+   列排序索引(排序值, 行号) 二分查找 [np.searchsorted]，NaN 不进入索引
+-- 等值条件 {'industry': '银行'} -> 哈希索引 {值: 行号数组}；
+   industry/area/market/exchange 等低基数列 及 symbol/name
+-- 索引按列在首次使用时构建，随数据对象(base_stock_infos 快照)复用；
+   快照更新后由使用方以新数据重建引擎
+-- 各谓词的行号按选择性从小到大合入掩码，结果保持原数据顺序和索引
+
+usage:
+    cf = ConditionFilter(base_stock_infos)
+    data = cf.filter({'industry': '银行', 'pe_ttm': [5, 10], 'pb': [None, 1]})
+'''
+log = logging.getLogger("log_quantization")
+log_err = logging.getLogger("log_err")
+
+# 谓词类型
+RANGE = 'range'
+EQUAL = 'equal'
+
+
+# noinspection PyMethodMayBeStatic
+class ConditionFilter(object):
+
+    def __init__(self, data: DataFrame):
+        self.data = data
+        self.size = len(data.index)
+        # {col: (sorted_values, order)}
+        self.sorted_indexes = {}
+        # {col: {value: positions}}
+        self.hash_indexes = {}
+
+    def sorted_index(self, col) -> tuple:
+        """列排序索引 (升序数值, 对应行号)；非数值按 NaN 处理 不进入索引"""
+        index = self.sorted_indexes.get(col)
+        if index is None:
+            values = pd.to_numeric(self.data[col], errors='coerce').to_numpy(dtype=float)
+            # NaN 排在末尾
+            order = np.argsort(values, kind='stable')
+            order = order[:np.count_nonzero(~np.isnan(values))]
+            index = (values[order], order)
+            self.sorted_indexes[col] = index
+        return index
+
+    def hash_index(self, col) -> dict:
+        """列哈希索引 {值: 行号数组}"""
+        index = self.hash_indexes.get(col)
+        if index is None:
+            codes, uniques = pd.factorize(self.data[col])
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            index = {uniques[k]: order[bounds[k]:bounds[k + 1]] for k in range(len(uniques))}
+            self.hash_indexes[col] = index
+        return index
+
+    def compile(self, condtions: dict) -> list:
+        """
+        条件字典编译为谓词 [(col, type, args)]
+        值为 [min, max] 时为区间条件，否则为等值条件；数据中不存在的列忽略
+        """
+        predicates = []
+        for col, condtion in condtions.items():
+            if col not in self.data.columns:
+                log.warning("ConditionFilter not support [{}] conditional retrieval!".format(col))
+                continue
+            if isinstance(condtion, (list, tuple)):
+                if len(condtion) != 2:
+                    raise ValueError("range condition [{}] must be [min, max], got {}".format(col, condtion))
+                predicates.append((col, RANGE, tuple(condtion)))
+            else:
+                predicates.append((col, EQUAL, condtion))
+        return predicates
+
+    def positions(self, predicate) -> np.ndarray:
+        """单个谓词命中的行号"""
+        col, kind, args = predicate
+        if kind == EQUAL:
+            return self.hash_index(col).get(args, np.empty(0, dtype=np.intp))
+        values, order = self.sorted_index(col)
+        min_val, max_val = args
+        lo = 0 if min_val is None else np.searchsorted(values, float(min_val), side='left')
+        hi = len(values) if max_val is None else np.searchsorted(values, float(max_val), side='left')
+        return order[lo:max(lo, hi)]
+
+    def mask(self, condtions: dict) -> np.ndarray:
+        """全部条件的布尔掩码"""
+        hits = sorted((self.positions(p) for p in self.compile(condtions)), key=len)
+        if len(hits) == 0:
+            return np.ones(self.size, dtype=bool)
+        mask = np.zeros(self.size, dtype=bool)
+        mask[hits[0]] = True
+        for pos in hits[1:]:
+            if not mask.any():
+                break
+            # 只保留同时命中的行
+            hit = np.zeros(self.size, dtype=bool)
+            hit[pos] = True
+            mask &= hit
+        return mask
+
+    def filter(self, condtions: dict) -> DataFrame:
+        """按条件过滤 保持原顺序和索引"""
+        return self.data.iloc[np.flatnonzero(self.mask(condtions))]
@@ -3,16 +3,17 @@ __author__ = 'carl'
 
 import logging
 
-import pandas as pd
 from pandas import DataFrame
 
+from quantization.securitypick.condition.condition_filter import ConditionFilter
 from quantization.securitypick.condition.conditonstockpick import ConditonStockPick
 from quantization.securitypick.stock_pick import StockPick
 from quotation.cache.cache import LocalBasicDataCache
-from util.obj_util import method_call
 
 '''
 条件选股01:基于 base_stock_infos 数据进行选股
+-- 区间条件 {'pe': [min, max]} 左闭右开，等值条件 {'industry': '银行'}
+-- 条件由 ConditionFilter 编译为单个布尔掩码一次过滤，引擎按快照缓存在类上 跨请求复用索引
 '''
 # ----  log ------ #
 log = logging.getLogger("log_quantization")
@@ -21,9 +22,9 @@ log_err = logging.getLogger("log_err")
 
 # ----  log ------ #
 
-# TODO list_date', 'ann_date', 'end_date', 未检索
 # noinspection DuplicatedCode,PyUnusedLocal
 class ConditonStockPick01(StockPick,ConditonStockPick):
+    condition_filter = None
 
     def __init__(self):
         """ 预备数据 base_stock_infos """
@@ -67,309 +68,9 @@ class ConditonStockPick01(StockPick,ConditonStockPick):
         return self.__retrieval_data(condtions_dict)
 
     def __retrieval_data(self, condtions_dict) -> DataFrame:
-        data: DataFrame = None
-        for condtion_key, condtion in condtions_dict.items():
-            if data is not None:
-                data = pd.merge(data, method_call(self, "_ConditonStockPick01__" + condtion_key, condtion), how="inner")
-            else:
-                data = method_call(self, "_ConditonStockPick01__" + condtion_key, condtion)
-        return data
-
-    def __symbol(self, symbol):
-        data = self.base_stock_infos.query("symbol=='{}'".format(symbol))
-        return data
-
-    def __name(self, name):
-        data = self.base_stock_infos.query("name=='{}'".format(name))
-        return data
-
-    def __area(self, area):
-        data = self.base_stock_infos.query("area=='{}'".format(area))
-        return data
-
-    def __industry(self, industry):
-        data = self.base_stock_infos.query("industry=='{}'".format(industry))
-        return data
-
-    def __market(self, market):
-        data = self.base_stock_infos.query("market=='{}'".format(market))
-        return data
-
-    def __exchange(self, exchange):
-        data = self.base_stock_infos.query("exchange=='{}'".format(exchange))
-        return data
-
-    def __pe(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[(self.base_stock_infos["pe"] >= min_val) & (self.base_stock_infos["pe"] < max_val)]
-        return data
-
-    def __pe_ttm(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["pe_ttm"] >= min_val) & (self.base_stock_infos["pe_ttm"] < max_val)]
-        return data
-
-    def __pb(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[(self.base_stock_infos["pb"] >= min_val) & (self.base_stock_infos["pb"] < max_val)]
-        return data
-
-    def __ps(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[(self.base_stock_infos["ps"] >= min_val) & (self.base_stock_infos["ps"] < max_val)]
-        return data
-
-    def __ps_ttm(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["ps_ttm"] >= min_val) & (self.base_stock_infos["ps_ttm"] < max_val)]
-        return data
-
-    def __total_share(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["total_share"] >= min_val) & (self.base_stock_infos["total_share"] < max_val)]
-        return data
-
-    def __float_share(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["float_share"] >= min_val) & (self.base_stock_infos["float_share"] < max_val)]
-        return data
-
-    def __total_mv(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["total_mv"] >= min_val) & (self.base_stock_infos["total_mv"] < max_val)]
-        return data
-
-    def __circ_mv(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["circ_mv"] >= min_val) & (self.base_stock_infos["circ_mv"] < max_val)]
-        return data
-
-    def __dv_ratio(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["dv_ratio"] >= min_val) & (self.base_stock_infos["dv_ratio"] < max_val)]
-        return data
-
-    def __dv_ttm(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["dv_ttm"] >= min_val) & (self.base_stock_infos["dv_ttm"] < max_val)]
-        return data
-
-    def __changepercent(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["changepercent"] >= min_val) & (self.base_stock_infos["changepercent"] < max_val)]
-        return data
-
-    def __trade(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["trade"] >= min_val) & (self.base_stock_infos["trade"] < max_val)]
-        return data
-
-    def __volume(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["volume"] >= min_val) & (self.base_stock_infos["volume"] < max_val)]
-        return data
-
-    def __volume_ratio(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["volume_ratio"] >= min_val) & (self.base_stock_infos["volume_ratio"] < max_val)]
-        return data
-
-    def __turnover_rate_f(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["turnover_rate_f"] >= min_val) & (
-                    self.base_stock_infos["turnover_rate_f"] < max_val)]
-        return data
-
-    def __turnover_rate(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["turnover_rate"] >= min_val) & (self.base_stock_infos["turnover_rate"] < max_val)]
-        return data
-
-    def __amount(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["amount"] >= min_val) & (self.base_stock_infos["amount"] < max_val)]
-        return data
-
-    def __eps(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["eps"] >= min_val) & (self.base_stock_infos["eps"] < max_val)]
-        return data
-
-    def __current_ratio(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["current_ratio"] >= min_val) & (self.base_stock_infos["current_ratio"] < max_val)]
-        return data
-
-    def __quick_ratio(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["quick_ratio"] >= min_val) & (self.base_stock_infos["quick_ratio"] < max_val)]
-        return data
-
-    def __bps(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["bps"] >= min_val) & (self.base_stock_infos["bps"] < max_val)]
-        return data
-
-    def __netprofit_margin(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["netprofit_margin"] >= min_val) & (
-                    self.base_stock_infos["netprofit_margin"] < max_val)]
-        return data
-
-    def __grossprofit_margin(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["grossprofit_margin"] >= min_val) & (
-                    self.base_stock_infos["grossprofit_margin"] < max_val)]
-        return data
-
-    def __profit_to_gr(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["profit_to_gr"] >= min_val) & (
-                    self.base_stock_infos["profit_to_gr"] < max_val)]
-        return data
-
-    def __op_of_gr(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["op_of_gr"] >= min_val) & (
-                    self.base_stock_infos["op_of_gr"] < max_val)]
-        return data
-
-    def __roe(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["roe"] >= min_val) & (self.base_stock_infos["roe"] < max_val)]
-        return data
-
-    def __roa(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["roa"] >= min_val) & (self.base_stock_infos["roa"] < max_val)]
-        return data
-
-    def __npta(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["npta"] >= min_val) & (self.base_stock_infos["npta"] < max_val)]
-        return data
-
-    def __roic(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["roic"] >= min_val) & (self.base_stock_infos["roic"] < max_val)]
-        return data
-
-    def __roe_yearly(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["roe_yearly"] >= min_val) & (self.base_stock_infos["roe_yearly"] < max_val)]
-        return data
-
-    def __roa2_yearly(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["roa2_yearly"] >= min_val) & (self.base_stock_infos["roa2_yearly"] < max_val)]
-        return data
-
-    def __debt_to_assets(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["debt_to_assets"] >= min_val) & (self.base_stock_infos["debt_to_assets"] < max_val)]
-        return data
-
-    def __op_yoy(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["op_yoy"] >= min_val) & (self.base_stock_infos["op_yoy"] < max_val)]
-        return data
-
-    def __ebt_yoy(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["ebt_yoy"] >= min_val) & (self.base_stock_infos["ebt_yoy"] < max_val)]
-        return data
-
-    def __tr_yoy(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["tr_yoy"] >= min_val) & (self.base_stock_infos["tr_yoy"] < max_val)]
-        return data
-
-    def __or_yoy(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["or_yoy"] >= min_val) & (self.base_stock_infos["or_yoy"] < max_val)]
-        return data
-
-    def __equity_yoy(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["equity_yoy"] >= min_val) & (self.base_stock_infos["equity_yoy"] < max_val)]
-        return data
-
-    def __basic_eps_yoy(self, val: list):
-        min_val = val[0]
-        max_val = val[1]
-        data = self.base_stock_infos[
-            (self.base_stock_infos["basic_eps_yoy"] >= min_val) & (self.base_stock_infos["basic_eps_yoy"] < max_val)]
-        return data
+        """全部条件编译为单个掩码 一次过滤[引擎及索引挂在类上，同一 base_stock_infos 快照的各实例复用]"""
+        condition_filter = ConditonStockPick01.condition_filter
+        if condition_filter is None or condition_filter.data is not self.base_stock_infos:
+            condition_filter = ConditionFilter(self.base_stock_infos)
+            ConditonStockPick01.condition_filter = condition_filter
+        return condition_filter.filter(condtions_dict)
@@ -3,11 +3,10 @@ __author__ = 'carl'
 
 import logging
 
-import numpy as np
 from pandas import DataFrame
 
+from quantization.securitypick.score_engine import FactorSpec, ScoreEngine
 from quantization.securitypick.stock_pick import StockPick
-from util.cal_util import get_data_percentile, limit_score_range
 
 """
 成长股选股模型01：
@@ -22,7 +21,7 @@ from util.cal_util import get_data_percentile, limit_score_range
 3- 市盈率（一定的估值安全边界）
     pe_ttm
 方法：
-先筛选 再打分
+先筛选 再打分 [ScoreEngine]
 """
 # ----  log ------ #
 log = logging.getLogger("log_quantization")
@@ -38,84 +37,49 @@ class GrowthStockPick01(StockPick):
         self.stock_pool = []
         self.stocksinfos = None
         self.weights = None
+        self.score_engine = None
 
-    def __filter_data(self):
+    @staticmethod
+    def factor_specs(weights: dict) -> list:
         """
         筛选法，得出初步的目标数据
         roe:前70%
-        basic_eps_yoy：在上一步基础上，取前35%
-        pe_ttm：在上一步基础上取：该指标表现最优的10%
+        basic_eps_yoy：在上一步基础上，取前25%
+        pe_ttm：在上一步基础上取：不高于 roe 筛选后 90% 分位数
+        根据各个因子排名打分，并作和，根据总分倒序排序
         """
-        # list(map(int, results))
-        # self.target_filter_data = self.stocksinfos.dropna(axis=0, how="any", subset=["roe", "basic_eps_yoy", "pe_ttm"])
-        try:
-            self.stocksinfos.drop(self.stocksinfos[np.isnan(self.stocksinfos['roe'])].index,
-                                  inplace=True)
-            self.stocksinfos.drop(self.stocksinfos[np.isnan(self.stocksinfos['basic_eps_yoy'])].index,
-                                  inplace=True)
-            self.stocksinfos.drop(self.stocksinfos[np.isnan(self.stocksinfos['pe_ttm'])].index,
-                                  inplace=True)
-        except Exception as e:
-            log_err.error("GrowthStockPick01.stocksinfos clean Exception:{}".format(e))
-            return
-        # self.stocksinfos = self.stocksinfos[
-        #     self.stocksinfos["roe"].str.contains("nan|Nan") == False]
-        # self.stocksinfos = self.stocksinfos[
-        #     self.stocksinfos["basic_eps_yoy"].str.contains("nan|Nan") == False]
-        # self.stocksinfos = self.stocksinfos[
-        #     self.stocksinfos["pe_ttm"].str.contains("nan | Nan") == False]
-        try:
-            roe_max, roe_min, roe_low, roe_mid, roe_high = get_data_percentile(
-                list(map(float, np.array(self.stocksinfos.iloc[:].loc[:, 'roe']).tolist())), 30, 70, 90)
-            data1 = self.stocksinfos[self.stocksinfos['roe'] >= roe_low]
-
-            basic_eps_yoy_max, basic_eps_yoy_min, basic_eps_yoy_low, basic_eps_yoy_mid, basic_eps_yoy_high = get_data_percentile(
-                list(map(float, np.array(data1.iloc[:].loc[:, 'basic_eps_yoy']).tolist())), 30, 75, 90)
-            data2 = data1[data1['basic_eps_yoy'] >= basic_eps_yoy_mid]
-
-            pe_ttm_max, pe_ttm_min, pe_ttm_low, pe_ttm_mid, pe_ttm_high = get_data_percentile(
-                list(map(float, np.array(data1.iloc[:].loc[:, 'pe_ttm']).tolist())), 30, 75, 90)
-            self.target_filter_data = data2[data2['pe_ttm'] <= pe_ttm_high]
-        except Exception as e:
-            log_err.error("GrowthStockPick01.target_filter_data gen Exception:{}".format(e))
-
-    def __score_filter_data(self):
-        """根据各个因子打分，并作和，根据总分倒序排序"""
-        try:
-            self.target_filter_data['roe_score'] = self.target_filter_data['roe'].rank(method='max', ascending=False)
-            limit_score_range(target_range=self.weights['roe'], org_scorer_col='roe_score', df=self.target_filter_data)
-
-            self.target_filter_data['basic_eps_yoy_score'] = self.target_filter_data['basic_eps_yoy'].rank(method='max',
-                                                                                                           ascending=False)
-            limit_score_range(target_range=self.weights['basic_eps_yoy'], org_scorer_col='basic_eps_yoy_score',
-                              df=self.target_filter_data)
-
-            self.target_filter_data['pe_ttm_score'] = self.target_filter_data['pe_ttm'].rank(method='max',
-                                                                                             ascending=False)
-            limit_score_range(target_range=self.weights['pe_ttm'], org_scorer_col='pe_ttm_score',
-                              df=self.target_filter_data)
-            self.target_filter_data['sum_score'] = self.target_filter_data[
-                ["roe_score", "basic_eps_yoy_score", "pe_ttm_score"]].sum(axis=1)
-            self.target_filter_data.sort_values(by="sum_score", ascending=False, inplace=True)
-        except Exception as e:
-            log_err.error("GrowthStockPick01.score_filter_data Exception:{}".format(e))
+        return [FactorSpec('roe', weight=weights['roe'], lower=30),
+                FactorSpec('basic_eps_yoy', weight=weights['basic_eps_yoy'], lower=75),
+                FactorSpec('pe_ttm', weight=weights['pe_ttm'], upper=90, base=1)]
 
     def init_data(self, stocksinfos: DataFrame, weights={'roe': 34, 'basic_eps_yoy': 33, 'pe_ttm': 33}):
-        self.stocksinfos = stocksinfos.copy(deep=True)
+        # 只读 不再深拷贝
+        self.stocksinfos = stocksinfos
         self.weights = weights
+        self.score_engine = ScoreEngine(self.factor_specs(weights))
+
+    def sweep_stock_pools(self, stocksinfos: DataFrame, weights_list: list, top_num: int = 5) -> list:
+        """
+        多组权重 {'roe','basic_eps_yoy','pe_ttm'} 的股票池 [参数扫描用]
+        筛选、排名与权重无关 只计算一次，各组总分由 ScoreEngine.sweep 一次矩阵乘法求出
+        """
+        specs = self.factor_specs(weights_list[0])
+        weights_matrix = [[weights[spec.col] for spec in specs] for weights in weights_list]
+        positions = ScoreEngine(specs).sweep(stocksinfos, weights_matrix, top_num=top_num)
+        return [stocksinfos.iloc[pos] for pos in positions]
 
     def get_target_stock_pool(self, top_num: int = 5):
         """
         获取该模型下得到的股票池
         """
-        self.__filter_data()
-        self.__score_filter_data()
+        try:
+            self.target_filter_data = self.score_engine.select(self.stocksinfos, top_num=top_num)
+        except Exception as e:
+            log_err.error("GrowthStockPick01.score_filter_data Exception:{}".format(e))
+            self.target_filter_data = None
         if self.target_filter_data is None or len(self.target_filter_data.index) == 0:
             log.info("GrowthStockPick01 has no stock_pool!")
             return None
-        if top_num > 0:
-            self.target_filter_data = self.target_filter_data.head(top_num)
-        for index, row in self.target_filter_data.iterrows():
-            self.stock_pool.append(row['symbol'])
+        self.stock_pool = self.target_filter_data['symbol'].tolist()
         log.info("GrowthStockPick01 top{} stock_pool: {}".format(top_num, self.stock_pool))
         return self.target_filter_data
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import logging
+
+import numpy as np
+from pandas import DataFrame
+
+"""
+多因子打分选股引擎：先筛选 再打分
+-- 因子定义 FactorSpec：因子列、分位数筛选(lower/upper)、排名方向、权重
+-- 全部因子值取为 (股票数, 因子数) 矩阵，任一因子为空的股票剔除；
+   分位数筛选按因子顺序依次进行[np.percentile]，
+   排名(同 DataFrame.rank(method='max')) 对全部因子列一次排序后二分求得，
+   排名线性缩放到 [0, weight] 作为因子得分，总分 = 得分矩阵行和
+-- 前 top_num 只用 np.argpartition 选出 再对这 top_num 个排序
+-- 排名与权重无关，sweep 以 (权重组数, 因子数) 权重矩阵一次矩阵乘法求出所有权重组合的总分
+
+usage:
+    engine = ScoreEngine([FactorSpec('roe', weight=34, lower=30),
+                          FactorSpec('basic_eps_yoy', weight=33, lower=75),
+                          FactorSpec('pe_ttm', weight=33, upper=90, base=1)])
+    target_data = engine.select(stocksinfos, top_num=5)
+    positions = engine.sweep(stocksinfos, [[34, 33, 33], [50, 25, 25]], top_num=5)
+"""
+log = logging.getLogger("log_quantization")
+log_err = logging.getLogger("log_err")
+
+
+class FactorSpec(object):
+
+    def __init__(self, col: str, weight: float = 0, ascending: bool = False, lower: float = None,
+                 upper: float = None, base: int = None):
+        """
+        col:       因子列
+        weight:    打分权重，因子得分缩放到 [0, weight]
+        ascending: 排名方向 同 DataFrame.rank(ascending)，得分随名次增大
+        lower:     下限分位数(0~100)，保留因子值 >= 该分位数的股票
+        upper:     上限分位数(0~100)，保留因子值 <= 该分位数的股票
+        base:      分位数基于前 base 个因子筛选后的股票计算；默认为之前全部因子筛选后的股票
+        """
+        self.col = col
+        self.weight = weight
+        self.ascending = ascending
+        self.lower = lower
+        self.upper = upper
+        self.base = base
+
+
+# noinspection PyMethodMayBeStatic
+class ScoreEngine(object):
+
+    def __init__(self, specs: list):
+        self.specs = specs
+        self.cols = [spec.col for spec in specs]
+        self.weights = np.array([spec.weight for spec in specs], dtype=float)
+
+    def values(self, data: DataFrame) -> np.ndarray:
+        """因子值矩阵 (股票数, 因子数)"""
+        return np.column_stack([data[col].to_numpy(dtype=float) for col in self.cols])
+
+    def filter(self, values: np.ndarray) -> np.ndarray:
+        """依次按分位数筛选，返回保留股票的行号"""
+        # 因子为空的股票剔除
+        stages = [np.flatnonzero(~np.isnan(values).any(axis=1))]
+        for k, spec in enumerate(self.specs):
+            keep = stages[-1]
+            base = stages[-1] if spec.base is None else stages[spec.base]
+            if len(base) == 0:
+                return base
+            col = values[keep, k]
+            mask = np.ones(len(keep), dtype=bool)
+            if spec.lower is not None:
+                mask &= col >= np.percentile(values[base, k], spec.lower)
+            if spec.upper is not None:
+                mask &= col <= np.percentile(values[base, k], spec.upper)
+            stages.append(keep[mask])
+        return stages[-1]
+
+    def norm_ranks(self, values: np.ndarray) -> np.ndarray:
+        """
+        各因子排名[同 rank(method='max')] 线性缩放到 [0, 1]；排名全部相同时为 NaN
+        """
+        n = values.shape[0]
+        ordered = np.sort(values, axis=0)
+        ranks = np.empty(values.shape, dtype=float)
+        for k, spec in enumerate(self.specs):
+            if spec.ascending:
+                # 小于等于该值的个数
+                ranks[:, k] = np.searchsorted(ordered[:, k], values[:, k], side='right')
+            else:
+                # 大于等于该值的个数
+                ranks[:, k] = n - np.searchsorted(ordered[:, k], values[:, k], side='left')
+        low = ranks.min(axis=0)
+        spread = ranks.max(axis=0) - low
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (ranks - low) / spread
+
+    def top(self, total: np.ndarray, top_num: int) -> np.ndarray:
+        """总分前 top_num 的行号 按总分倒序[同分保持原顺序]；top_num<=0 时全部排序"""
+        if 0 < top_num < len(total):
+            candidates = np.argpartition(-total, top_num - 1)[:top_num]
+            candidates.sort()
+        else:
+            candidates = np.arange(len(total))
+        return candidates[np.argsort(-total[candidates], kind='stable')]
+
+    def select(self, data: DataFrame, top_num: int = 5) -> DataFrame:
+        """
+        筛选打分 返回总分前 top_num 的股票[按总分倒序]，附加各因子得分 {col}_score 及总分 sum_score
+        """
+        values = self.values(data)
+        keep = self.filter(values)
+        if len(keep) == 0:
+            return None
+        scores = self.norm_ranks(values[keep]) * self.weights
+        total = np.nansum(scores, axis=1)
+        order = self.top(total, top_num)
+        target_data = data.iloc[keep[order]].copy()
+        for k, col in enumerate(self.cols):
+            target_data[col + '_score'] = scores[order, k]
+        target_data['sum_score'] = total[order]
+        return target_data
+
+    def sweep(self, data: DataFrame, weights_list: list, top_num: int = 5) -> list:
+        """
+        多组权重[每组与 specs 顺序对应] 的选股结果，返回每组选中股票在 data 中的行号
+        """
+        values = self.values(data)
+        keep = self.filter(values)
+        if len(keep) == 0:
+            return [keep for _ in weights_list]
+        ranks = np.nan_to_num(self.norm_ranks(values[keep]))
+        # (股票数, 权重组数)
+        totals = ranks @ np.asarray(weights_list, dtype=float).T
+        return [keep[self.top(totals[:, i], top_num)] for i in range(totals.shape[1])]
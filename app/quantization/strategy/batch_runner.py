@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import importlib
+import itertools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import backtrader as bt
+import pandas as pd
+from pandas import DataFrame
+
+from quotation.store.market_store import LocalMarketDataStore
+
+'''
+backtrader 策略批量回测：多只股票 × 参数网格，多进程并行
+-- 行情从本地行情存储 daily 分区一次读出[不访问网络]，按股票拆分后分批交给子进程
+-- 每只股票、每组参数一个 Cerebro，在子进程内依次运行
+   [不用 optstrategy：backtrader 1.9.76 的 optstrategy 在 python3.10+ 不可用]
+-- 策略以 模块路径 + 类名 传入子进程，任何 bt.Strategy 子类均可；策略若有 printlog 参数则关闭日志
+-- 结果：每只股票、每组参数一行 期末资产、收益率、交易次数、盈利/亏损次数、最大回撤
+
+usage:
+    runner = BacktraderBatchRunner('quantization.strategy.strategy_ma', 'MAStrategy')
+    results = runner.run(ts_codes, '20200101', '20221231', {'maperiod': [5, 10, 15, 20]}, processes=8)
+'''
+log = logging.getLogger("log_quantization")
+log_err = logging.getLogger("log_err")
+
+FEED_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def feed_frames(prices: DataFrame) -> dict:
+    """daily 行记录 -> {ts_code: 按日期升序的 OHLCV DataFrame}"""
+    prices = prices.rename(columns={'vol': 'volume'})
+    prices = prices.drop_duplicates(subset=['ts_code', 'trade_date'], keep='last')
+    prices = prices.assign(trade_date=pd.to_datetime(prices['trade_date'])).sort_values(by=['ts_code', 'trade_date'])
+    return {ts_code: data.set_index('trade_date')[FEED_COLUMNS] for ts_code, data in prices.groupby('ts_code')}
+
+
+def run_cerebro(data: DataFrame, strategy_cls, param_grid: dict, cash: float = 100000.0,
+                commission: float = 0.001, stake: int = 100) -> list:
+    """单只股票 参数网格回测 return: [{参数..., final_value, ...}]"""
+    keys = list(param_grid.keys())
+    quiet = {'printlog': False} if 'printlog' in strategy_cls.params._getkeys() else {}
+    rows = []
+    for values in itertools.product(*[param_grid[k] for k in keys]):
+        params = dict(zip(keys, values))
+        cerebro = bt.Cerebro(stdstats=False)
+        cerebro.adddata(bt.feeds.PandasData(dataname=data))
+        cerebro.addstrategy(strategy_cls, **params, **quiet)
+        cerebro.broker.setcash(cash)
+        cerebro.broker.setcommission(commission=commission)
+        cerebro.addsizer(bt.sizers.FixedSize, stake=stake)
+        cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trades')
+        cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+        res = cerebro.run()[0]
+        trades = res.analyzers.trades.get_analysis()
+        final_value = cerebro.broker.getvalue()
+        params.update(final_value=final_value,
+                      total_return=final_value / cash - 1,
+                      trades=trades.get('total', {}).get('closed', 0),
+                      won=trades.get('won', {}).get('total', 0),
+                      lost=trades.get('lost', {}).get('total', 0),
+                      max_drawdown=res.analyzers.drawdown.get_analysis()['max']['drawdown'])
+        rows.append(params)
+    return rows
+
+
+def _run_batch(task) -> list:
+    """子进程：一批股票的回测"""
+    strategy_mod, strategy_cls, frames, param_grid, broker_args = task
+    strategy_cls = getattr(importlib.import_module(strategy_mod), strategy_cls)
+    rows = []
+    for ts_code, data in frames:
+        try:
+            for row in run_cerebro(data, strategy_cls, param_grid, **broker_args):
+                row['ts_code'] = ts_code
+                rows.append(row)
+        except Exception as e:
+            log_err.error("backtrader batch run %s failed! %s" % (ts_code, e))
+    return rows
+
+
+class BacktraderBatchRunner(object):
+    """
+    strategy_mod:  策略模块 如 quantization.strategy.strategy_ma
+    strategy_cls:  策略类   如 MAStrategy
+    cash、commission、stake：初始资金、手续费率、每次交易股数
+    """
+
+    def __init__(self, strategy_mod: str, strategy_cls: str, cash: float = 100000.0, commission: float = 0.001,
+                 stake: int = 100):
+        self.strategy_mod = strategy_mod
+        self.strategy_cls = strategy_cls
+        self.broker_args = {'cash': cash, 'commission': commission, 'stake': stake}
+
+    def load_frames(self, ts_codes: list, start_date: str, end_date: str) -> dict:
+        """本地行情存储读取 {ts_code: OHLCV}"""
+        prices = LocalMarketDataStore().load_range('daily', start_date, end_date, ts_codes)
+        if prices.empty:
+            return {}
+        return feed_frames(prices)
+
+    def run(self, ts_codes: list, start_date: str, end_date: str, param_grid: dict, processes: int = None,
+            batch_size: int = 20) -> DataFrame:
+        return self.run_frames(self.load_frames(ts_codes, start_date, end_date), param_grid, processes, batch_size)
+
+    def run_frames(self, frames: dict, param_grid: dict, processes: int = None, batch_size: int = 20) -> DataFrame:
+        """
+        frames: {ts_code: OHLCV DataFrame[DatetimeIndex]}
+        return: 每只股票、每组参数一行 按收益率倒序
+        """
+        items = list(frames.items())
+        tasks = [(self.strategy_mod, self.strategy_cls, items[i:i + batch_size], param_grid, self.broker_args)
+                 for i in range(0, len(items), batch_size)]
+        processes = processes or os.cpu_count()
+        rows = []
+        with ProcessPoolExecutor(max_workers=min(processes, max(len(tasks), 1))) as executor:
+            for batch_rows in executor.map(_run_batch, tasks):
+                rows.extend(batch_rows)
+        log.info("BacktraderBatchRunner %s: %s stocks, %s runs" % (self.strategy_cls, len(items), len(rows)))
+        columns = ['ts_code'] + list(param_grid.keys()) + ['final_value', 'total_return', 'trades', 'won', 'lost',
+                                                            'max_drawdown']
+        return DataFrame(rows, columns=columns).sort_values(by='total_return', ascending=False,
+                                                            ignore_index=True)
@@ -12,11 +12,15 @@ class MAStrategy(bt.Strategy):
     # 全局参数，可选：更改交易策略中变量/参数的值，可用于参数调优。
     params = (
         ('maperiod', 15),
+        # 批量回测时关闭日志
+        ('printlog', True),
     )
 
     # 日志，可选：记录策略的执行日志，可以打印出该函数提供的日期时间和txt变量。
     def log(self, txt, dt=None):
         ''' Logging function fot this strategy'''
+        if not self.params.printlog:
+            return
         dt = dt or self.datas[0].datetime.date(0)
         print('%s, %s' % (dt.isoformat(), txt))
 
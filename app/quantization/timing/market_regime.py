@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from conf.benchmark import BENCHMARK_MAP
+from quantization.factors.technical.indicators import TechnicalIndicators, ohlc_panel
+from quotation.captures.tsdata_capturer import TuShareDataCapturer
+from util.time_util import get_today_Ymd
+
+"""
+大盘择时：市场趋势与情绪状态 当为单例
+-- 常驻内存 8 个基准指数[BENCHMARK_MAP] 最近 window 根日线，AR/BR、均线用 TechnicalIndicators 计算，
+   每日 update 只追加上次更新之后的k线增量计算[漏跑的交易日一并补齐]，不重新拉取、重算 window 天
+-- 市场宽度：全市场当日上涨/下跌家数、上涨占比及其 N 日均值、腾落线(ADL)，同样逐日累加
+-- 当前状态保存在内存，regime() 直接返回
+趋势 trend：      收盘 > MA短 > MA长 为 bull，收盘 < MA短 < MA长 为 bear，其余为 range
+情绪 sentiment：  BR>400 且 AR>180 多方极强 随时可能反转下跌 overheated；
+                 BR<40 且 AR<60 空方极强 随时可能反转上涨 oversold；
+                 BR 跌破 AR 市场开始筑底 bottoming；其余 neutral  [to see: test/article/arbr_test.py]
+宽度 breadth：    上涨占比 N 日均值 > 0.55 为 strong，< 0.45 为 weak，其余 neutral
+
+usage:
+    mr = MarketRegime()
+    mr.refresh()                    # 首次全量加载，之后每日增量
+    mr.regime('000300.SH')          # {'trade_date','close','MA20','MA60','AR','BR','trend','sentiment',...}
+    mr.market()                     # {'trade_date','up','down','up_ratio','up_ratio_ma','adl','breadth'}
+"""
+log = logging.getLogger("log_quantization")
+log_err = logging.getLogger("log_err")
+
+REGIME_COLUMNS = ['close', 'MA20', 'MA60', 'AR', 'BR']
+
+
+def cal_trend(close: float, ma_short: float, ma_long: float) -> str:
+    if close > ma_short > ma_long:
+        return 'bull'
+    if close < ma_short < ma_long:
+        return 'bear'
+    return 'range'
+
+
+def cal_sentiment(ar: float, br: float) -> str:
+    if br > 400 and ar > 180:
+        return 'overheated'
+    if br < 40 and ar < 60:
+        return 'oversold'
+    if br < ar:
+        return 'bottoming'
+    return 'neutral'
+
+
+def cal_breadth(up_ratio_ma: float) -> str:
+    if up_ratio_ma > 0.55:
+        return 'strong'
+    if up_ratio_ma < 0.45:
+        return 'weak'
+    return 'neutral'
+
+
+def advance_decline(daily: DataFrame) -> dict:
+    """全市场当日上涨、下跌家数"""
+    pct_chg = daily['pct_chg'].to_numpy(dtype=float)
+    return {'up': int((pct_chg > 0).sum()), 'down': int((pct_chg < 0).sum())}
+
+
+# noinspection PyMethodMayBeStatic
+class MarketRegime(object):
+    instance = None
+    indicators = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls.instance is None:
+            cls.instance = object.__new__(cls)
+        return cls.instance
+
+    def __init__(self, window: int = 250, breadth_days: int = 10):
+        # 单例只初始化一次
+        if self.indicators is not None:
+            return
+        self.window = window
+        self.breadth_days = breadth_days
+        self.tsdatacapture: TuShareDataCapturer = TuShareDataCapturer()
+        self.lock = threading.RLock()
+        self.indicators = TechnicalIndicators(ma_periods=(20, 60), arbr=26)
+        # 最近 window 根指数日线 {'open','high','low','close': 交易日 × 指数代码}
+        self.bars = None
+        # 最近 breadth_days 个交易日的涨跌家数 index 交易日
+        self.breadth = DataFrame(columns=['up', 'down', 'up_ratio'])
+        self.adl = 0
+        self.trade_date = None
+        self.current = {}
+        self.current_market = {}
+
+    def refresh(self, trade_date: str = None) -> bool:
+        """首次全量加载，之后增量更新到 trade_date[默认今天]"""
+        trade_date = trade_date or get_today_Ymd()
+        # 串行执行 定时任务与web请求并发时只加载一次
+        with self.lock:
+            if self.trade_date is None:
+                return self.load(trade_date)
+            return self.update(trade_date)
+
+    def load(self, end_date: str) -> bool:
+        """拉取 window 根指数日线 全量计算"""
+        start_date = (datetime.strptime(end_date, '%Y%m%d') - timedelta(days=int(self.window * 1.6))).strftime(
+            '%Y%m%d')
+        prices = [self.tsdatacapture.get_index_daily(ts_code=ts_code, start_date=start_date, end_date=end_date)
+                  for ts_code in BENCHMARK_MAP.keys()]
+        prices = [p for p in prices if p is not None and not p.empty]
+        if len(prices) == 0:
+            log_err.error("MarketRegime load index daily failed! %s" % end_date)
+            return False
+        panel = ohlc_panel(pd.concat(prices, ignore_index=True))
+        panel = {k: v.iloc[-self.window:] for k, v in panel.items()}
+        days = panel['close'].index[-self.breadth_days:]
+        dailys = [self.tsdatacapture.get_daily(trade_date=d) for d in days]
+        if any(d is None or d.empty for d in dailys):
+            log_err.error("MarketRegime load daily failed! %s——%s" % (days[0], days[-1]))
+            return False
+        breadth = DataFrame([advance_decline(d) for d in dailys], index=days)
+        with self.lock:
+            res = self.indicators.compute(**panel)
+            self.bars = panel
+            self.breadth = breadth.assign(up_ratio=breadth['up'] / (breadth['up'] + breadth['down']))
+            self.adl = int((self.breadth['up'] - self.breadth['down']).sum())
+            self._set_current(panel['close'].index[-1], {name: v.iloc[-1] for name, v in res.items()})
+        log.info("MarketRegime loaded %s bars to %s" % (len(panel['close'].index), self.trade_date))
+        return True
+
+    def update(self, trade_date: str) -> bool:
+        """
+        增量更新到 trade_date：拉取上次更新之后至 trade_date 的全部k线[含漏跑、失败的交易日]，逐日按序增量计算
+        任一指数或当日涨跌家数获取失败时不更新，下次一并补齐；无新k线或已更新过返回 False
+        """
+        if self.trade_date is None:
+            return self.load(trade_date)
+        if trade_date <= self.trade_date:
+            return False
+        start_date = (datetime.strptime(self.trade_date, '%Y%m%d') + timedelta(days=1)).strftime('%Y%m%d')
+        bars = [self.tsdatacapture.get_index_daily(ts_code=ts_code, start_date=start_date, end_date=trade_date)
+                for ts_code in BENCHMARK_MAP.keys()]
+        if any(b is None for b in bars):
+            log_err.error("MarketRegime fetch index daily failed! %s——%s" % (start_date, trade_date))
+            return False
+        bars = [b for b in bars if not b.empty]
+        if len(bars) == 0:
+            return False
+        bars = pd.concat(bars, ignore_index=True).drop_duplicates(subset=['ts_code', 'trade_date'], keep='last')
+        days = sorted(bars['trade_date'].unique())
+        dailys = [self.tsdatacapture.get_daily(trade_date=d) for d in days]
+        if any(d is None or d.empty for d in dailys):
+            log_err.error("MarketRegime fetch daily failed! %s——%s" % (start_date, trade_date))
+            return False
+        with self.lock:
+            for day, daily in zip(days, dailys):
+                self._append(day, bars[bars['trade_date'] == day].set_index('ts_code'), advance_decline(daily))
+        log.info("MarketRegime updated %s days to %s" % (len(days), self.trade_date))
+        return True
+
+    def _append(self, trade_date: str, bar: DataFrame, counts: dict):
+        """追加一根k线 增量计算"""
+        row = self.indicators.update(trade_date, bar)
+        for k, v in self.bars.items():
+            v = pd.concat([v, bar[[k]].T.rename(index={k: trade_date})])
+            self.bars[k] = v.iloc[-self.window:]
+        counts['up_ratio'] = counts['up'] / (counts['up'] + counts['down'])
+        self.breadth = pd.concat([self.breadth, DataFrame([counts], index=[trade_date])]).iloc[-self.breadth_days:]
+        self.adl += counts['up'] - counts['down']
+        self._set_current(trade_date, {name: row[name] for name in row.columns})
+
+    def _set_current(self, trade_date, values: dict):
+        """values: {指标名: Series(指数代码 -> 值)}"""
+        current = {}
+        for ts_code in self.bars['close'].columns:
+            item = {'ts_code': ts_code, 'name': BENCHMARK_MAP.get(ts_code), 'trade_date': trade_date,
+                    'close': float(self.bars['close'][ts_code].iloc[-1])}
+            item.update({k: float(values[k][ts_code]) for k in REGIME_COLUMNS[1:]})
+            item['trend'] = cal_trend(item['close'], item['MA20'], item['MA60'])
+            item['sentiment'] = cal_sentiment(item['AR'], item['BR'])
+            current[ts_code] = item
+        up_ratio_ma = float(self.breadth['up_ratio'].mean()) if len(self.breadth.index) else np.nan
+        last = self.breadth.iloc[-1] if len(self.breadth.index) else {'up': 0, 'down': 0, 'up_ratio': np.nan}
+        self.current = current
+        self.current_market = {'trade_date': trade_date, 'up': int(last['up']), 'down': int(last['down']),
+                               'up_ratio': float(last['up_ratio']), 'up_ratio_ma': up_ratio_ma, 'adl': self.adl,
+                               'breadth': cal_breadth(up_ratio_ma)}
+        self.trade_date = trade_date
+
+    def regime(self, ts_code: str = None):
+        """指数当前状态；ts_code 为空返回全部指数"""
+        if ts_code is None:
+            return dict(self.current)
+        return self.current.get(ts_code)
+
+    def market(self) -> dict:
+        """市场宽度当前状态"""
+        return dict(self.current_market)
@@ -3,37 +3,70 @@ __author__ = 'carl'
 
 import logging
 import os
+import threading
 import time
+from datetime import datetime
 
 from db.myredis.redis_cli import RedisClient
 from db.myredis.redis_lock import RedisLock
 from quotation.cleaning.data_clean import BaseDataClean
-from util.obj_util import dumps_data, loads_data
+from quotation.cache.codec import CacheCodec
+from quotation.cache.result_cache import ResultCache
+from quotation.cache.shared_store import SharedFrameStore
 from util.sys_util import get_mac_address
 
 '''
 常用基础数据缓存，每日自动拉取一次，可主动刷新
 -- 远程缓存：只有一个进程每日更新
 -- 本地缓存：每个进程从远程缓存拉去数据【保证每个进程缓存一致】
+-- 编解码：CacheCodec [cache.info 配置 arrow/pickle]
+-- 版本快照：
+   远程缓存每次更新生成新版本，数据写入 key:版本 后再原子切换版本指针 BasicDataCache.version，
+   写入时即带过期时间，切换前才持久化 [更新中途失败的版本不会遗留在 redis]，
+   并通过 redis pub/sub 频道 BasicDataCache.refresh 通知各进程；旧版本数据保留一段时间后过期
+   本地缓存订阅通知，在后台线程加载新版本，加载完成前继续使用旧快照，读取方从不阻塞
+-- 同机共享：本机第一个加载新版本的进程将快照发布到 SharedFrameStore，
+   其余进程只读 mmap 映射，不再从 redis 反序列化 [cache.info shared=True]
+-- 接口结果缓存 ResultCache 以快照版本为 key 的一部分，本地切换版本时清空旧结果
 '''
 
 # ----  log ------ #
 log = logging.getLogger("app")
 log_err = logging.getLogger("log_err")
 
-
 # ----  log ------ #
 
+# 版本指针
+VERSION_KEY = "BasicDataCache.version"
+# 版本号序列
+VERSION_SEQ_KEY = "BasicDataCache.version.seq"
+# 更新通知频道
+REFRESH_CHANNEL = "BasicDataCache.refresh"
+# 快照包含的数据
+SNAPSHOT_KEYS = ["base_stock_infos", "stocks_pool", "smb_industry_map", "industry_set"]
+
+
+def snapshot_key(name, version) -> str:
+    """某版本快照数据的 redis key"""
+    return "%s:%s" % (name, version)
+
+
+def to_str(val):
+    return val.decode() if isinstance(val, bytes) else val
+
+
 # noinspection SpellCheckingInspection,PyMethodMayBeStatic
 class RemoteBasicDataCache(object):
     instance = None
-    # 0:未更新 1：已更新
-    updateflag = 0
     rediscli = RedisClient().get_redis_cli()
     # 本进程标志
     uid = get_mac_address() + str(os.getpid())
     # 分布式锁
     rl = RedisLock(lock_name="IAOSTask", uid=uid, expire=30)
+    # 缓存编解码
+    codec = CacheCodec()
+    # 旧版本快照保留时间(s) [保证正在加载旧版本的进程可以读完]
+    expire_seconds = 3600
 
     def __new__(cls, *args, **kwargs):
         if cls.instance is None:
@@ -46,24 +79,14 @@ class RemoteBasicDataCache(object):
         args：is_request=True: 前端请求强制刷新缓存
         """
         res = False
-        cls.updateflag = 0
-        cls.rediscli.set("RemoteBasicDataCache.updateflag", cls.updateflag)
         try:
-            if is_request:
-                cls.store_base_stock_infos()
-                cls.store_smb_industry_map()
-                res = True
-                cls.updateflag = 1
-                cls.rediscli.set("RemoteBasicDataCache.updateflag", cls.updateflag)
-                log.info("远程全部股票每日重要的基础数据更新完毕.")
-                return res
-            if not is_request and cls.rl.lock():
-                cls.store_base_stock_infos()
-                cls.store_smb_industry_map()
+            if is_request or cls.rl.lock():
+                version = cls.new_version()
+                cls.store_base_stock_infos(version)
+                cls.store_smb_industry_map(version)
+                cls.publish(version)
                 res = True
-                cls.updateflag = 1
-                cls.rediscli.set("RemoteBasicDataCache.updateflag", cls.updateflag)
-                log.info("远程全部股票每日重要的基础数据更新完毕.")
+                log.info("远程全部股票每日重要的基础数据更新完毕. version:%s" % version)
         except Exception as e:
             log_err.error("远程全部股票每日重要的基础数据更新失败！%s" % e)
         finally:
@@ -71,7 +94,25 @@ class RemoteBasicDataCache(object):
         return res
 
     @classmethod
-    def store_base_stock_infos(cls):
+    def new_version(cls) -> str:
+        """
+        新版本号 时间戳+序列号[纯数字 按时间有序；redis 重建后也不会与本机共享快照的旧版本重复]
+        """
+        return datetime.now().strftime('%Y%m%d%H%M%S') + str(cls.rediscli.incr(VERSION_SEQ_KEY)).zfill(6)
+
+    @classmethod
+    def publish(cls, version):
+        """新版本持久化后原子切换版本指针 旧版本延时过期 并通知各进程"""
+        for name in SNAPSHOT_KEYS:
+            cls.rediscli.persist(snapshot_key(name, version))
+        old_version = to_str(cls.rediscli.getset(VERSION_KEY, version))
+        if old_version is not None and old_version != version:
+            for name in SNAPSHOT_KEYS:
+                cls.rediscli.expire(snapshot_key(name, old_version), cls.expire_seconds)
+        cls.rediscli.publish(REFRESH_CHANNEL, version)
+
+    @classmethod
+    def store_base_stock_infos(cls, version):
         """
         存储下述信息进redis
         ['TS股票代码', '股票代码', '股票名称', '地区', '行业', '市场', '上市日期', '交易所',
@@ -87,11 +128,13 @@ class RemoteBasicDataCache(object):
         # base_stock_infos.to_csv("/Users/zhangtao/projects/IAOS/iaos-server/app/test/testdata/base_stock_infos.csv")
         path = os.path.join(os.getcwd(), "test/testdata/stocks_pool.csv")
         BaseDataClean.stocks_pool.to_csv(path)
-        cls.rediscli.set("base_stock_infos", dumps_data(base_stock_infos))
-        cls.rediscli.set("stocks_pool", dumps_data(BaseDataClean.stocks_pool))
+        cls.rediscli.set(snapshot_key("base_stock_infos", version),
+                         cls.codec.dumps("base_stock_infos", base_stock_infos), ex=cls.expire_seconds)
+        cls.rediscli.set(snapshot_key("stocks_pool", version),
+                         cls.codec.dumps("stocks_pool", BaseDataClean.stocks_pool), ex=cls.expire_seconds)
 
     @classmethod
-    def store_smb_industry_map(cls):
+    def store_smb_industry_map(cls, version):
         """
         存储下述数据进redis：
         {
@@ -103,18 +146,28 @@ class RemoteBasicDataCache(object):
         """
         smb_industry_map = BaseDataClean.init_smb_industry_map()
         industry_set = BaseDataClean.industry_set
-        cls.rediscli.set("smb_industry_map", dumps_data(smb_industry_map))
-        cls.rediscli.set("industry_set", dumps_data(industry_set))
+        cls.rediscli.set(snapshot_key("smb_industry_map", version),
+                         cls.codec.dumps("smb_industry_map", smb_industry_map), ex=cls.expire_seconds)
+        cls.rediscli.set(snapshot_key("industry_set", version), cls.codec.dumps("industry_set", industry_set),
+                         ex=cls.expire_seconds)
 
 
 # noinspection SpellCheckingInspection,PyMethodMayBeStatic
 class LocalBasicDataCache(object):
     instance = None
     rediscli = RedisClient().get_redis_cli()
+    codec = CacheCodec()
+    shared_store = SharedFrameStore()
     smb_industry_map = None
     industry_set = None
     base_stock_infos = None
     stocks_pool = None
+    # 当前快照版本
+    version = None
+    # 订阅线程
+    subscriber = None
+    # 保证同一时刻只有一个线程加载快照
+    lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if cls.instance is None:
@@ -123,14 +176,82 @@ class LocalBasicDataCache(object):
 
     @classmethod
     def refresh(cls):
-        try:
-            while int(cls.rediscli.get("RemoteBasicDataCache.updateflag")) == 0:
-                time.sleep(1)
-            cls.load_base_stock_infos()
-            cls.load_smb_industry_map()
-            log.info("本地加载全部股票每日重要的基础数据完毕.")
-        except Exception as e:
-            log_err.error("本地加载全部股票每日重要的基础数据失败！%s" % e)
+        """
+        加载最新版本快照 [版本未变化不加载；加载完成前继续使用旧快照]
+        """
+        with cls.lock:
+            try:
+                version = to_str(cls.rediscli.get(VERSION_KEY))
+                if version is None:
+                    log.info("远程基础数据缓存尚未生成，等待更新通知.")
+                    return
+                if version == cls.version:
+                    return
+                snapshot = cls.load_shared_snapshot(version)
+                if snapshot is None:
+                    return
+                cls.base_stock_infos, cls.stocks_pool, cls.smb_industry_map, cls.industry_set = snapshot
+                cls.version = version
+                # 旧版本的接口结果缓存失效
+                ResultCache().invalidate(version)
+                log.info("本地加载全部股票每日重要的基础数据完毕. version:%s" % version)
+            except Exception as e:
+                log_err.error("本地加载全部股票每日重要的基础数据失败！%s" % e)
+
+    @classmethod
+    def load_snapshot(cls, version) -> tuple:
+        """
+        读取某版本快照 (base_stock_infos, stocks_pool, smb_industry_map, industry_set)
+        """
+        contents = cls.rediscli.mget([snapshot_key(name, version) for name in SNAPSHOT_KEYS])
+        if any(content is None for content in contents):
+            log_err.error("基础数据缓存快照不完整！version:%s" % version)
+            return None
+        return tuple(cls.codec.loads(name, content) for name, content in zip(SNAPSHOT_KEYS, contents))
+
+    @classmethod
+    def load_shared_snapshot(cls, version) -> tuple:
+        """
+        优先映射本机已发布的共享快照；未发布时从 redis 读取并发布 再映射共享快照
+        """
+        if not cls.shared_store.enabled:
+            return cls.load_snapshot(version)
+        shared = cls.shared_store.attach(version, SNAPSHOT_KEYS)
+        if shared is not None:
+            return tuple(shared[name] for name in SNAPSHOT_KEYS)
+        snapshot = cls.load_snapshot(version)
+        if snapshot is None:
+            return None
+        if cls.shared_store.publish(version, dict(zip(SNAPSHOT_KEYS, snapshot))):
+            shared = cls.shared_store.attach(version, SNAPSHOT_KEYS)
+            if shared is not None:
+                return tuple(shared[name] for name in SNAPSHOT_KEYS)
+        return snapshot
+
+    @classmethod
+    def subscribe(cls):
+        """
+        订阅更新通知 [每个进程一个后台线程]；订阅前先加载当前版本
+        """
+        if cls.subscriber is not None:
+            return
+
+        def listen():
+            while True:
+                try:
+                    pubsub = RedisClient().get_redis_cli().pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(REFRESH_CHANNEL)
+                    # (重新)订阅后补齐可能错过的更新
+                    cls.refresh()
+                    for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            cls.refresh()
+                except Exception as e:
+                    log_err.error("基础数据缓存更新通知订阅异常！%s" % e)
+                    time.sleep(5)
+
+        cls.subscriber = threading.Thread(target=listen, name="LocalBasicDataCache.subscriber", daemon=True)
+        cls.subscriber.start()
 
     @classmethod
     def load_base_stock_infos(cls):
@@ -144,17 +265,14 @@ class LocalBasicDataCache(object):
          '年化净资产收益率','年化总资产报酬率', '资产负债率', '营业利润同比增长率', '利润总额同比增长率',
          '营业总收入同比增长率', '营业收入同比增长率', '净资产同比增长率', '更新标识'
          ]
+        远程缓存尚未生成时 本进程直接计算
         """
-        data = cls.rediscli.get("base_stock_infos")
-        data1 = cls.rediscli.get("stocks_pool")
-        if data is not None and data1 is not None:
-            cls.base_stock_infos = loads_data(data)
-            cls.stocks_pool = loads_data(data1)
-        else:
+        if cls.base_stock_infos is None:
+            cls.refresh()
+        if cls.base_stock_infos is None:
             cls.base_stock_infos = BaseDataClean.init_base_stock_infos()
             cls.stocks_pool = BaseDataClean.stocks_pool
-            cls.rediscli.set("base_stock_infos", dumps_data(cls.base_stock_infos))
-            cls.rediscli.set("stocks_pool", dumps_data(cls.stocks_pool))
+        return cls.base_stock_infos
 
     @classmethod
     def load_smb_industry_map(cls):
@@ -166,16 +284,11 @@ class LocalBasicDataCache(object):
              "大盘股":{"行业1":stockinfoDataFrame,"行业2":stockinfoDataFrame,...}
         }
         ["行业1","行业2",... ...]
+        远程缓存尚未生成时 本进程直接计算
         """
-        data = cls.rediscli.get("smb_industry_map")
-        if data is not None:
-            cls.smb_industry_map = loads_data(data)
-        else:
+        if cls.smb_industry_map is None:
+            cls.refresh()
+        if cls.smb_industry_map is None:
             cls.smb_industry_map = BaseDataClean.init_smb_industry_map()
-            cls.rediscli.set("smb_industry_map", dumps_data(cls.smb_industry_map))
-        data = cls.rediscli.get("industry_set")
-        if data is not None:
-            cls.industry_set = loads_data(data)
-        else:
             cls.industry_set = BaseDataClean.industry_set
-            cls.rediscli.set("industry_set", dumps_data(cls.industry_set))
+        return cls.smb_industry_map
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import json
+import logging
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+import pyarrow as pa
+from pandas import DataFrame
+
+from conf.globalcfg import GlobalCfg
+from util.obj_util import dumps_data, loads_data
+
+'''
+基础数据缓存编解码 当为单例
+-- arrow:  DataFrame 编码为 Arrow IPC 列式二进制，可选 lz4/zstd 压缩[pyarrow 内置]；
+           行业/地区/市场等低基数字符串列编码为字典列，解码后为 category
+           {key:{key:DataFrame}} 这类同构嵌套字典 拼成一张表编码，解码时按行切片拆回[smb_industry_map]
+-- pickle: 原有 pickle 序列化；不可列式编码的对象(set、list等)也回落为 pickle
+-- 解码按 payload 头自动识别，兼容已有 pickle 缓存
+-- 每个 key 记录 payload 大小、编解码耗时、峰值内存[cache.info trace_memory=True 时统计]
+
+usage:
+    codec = CacheCodec()
+    rediscli.set("base_stock_infos", codec.dumps("base_stock_infos", base_stock_infos))
+    base_stock_infos = codec.loads("base_stock_infos", rediscli.get("base_stock_infos"))
+    codec.stats()
+'''
+log = logging.getLogger("app")
+log_err = logging.getLogger("log_err")
+
+MAGIC = b'IAOSARW1'
+# payload 类型：单表、嵌套字典
+TYPE_FRAME = b'F'
+TYPE_MAP = b'M'
+META_LAYOUT = b'iaos.layout'
+
+
+# noinspection PyMethodMayBeStatic,PyBroadException
+class CacheCodec(object):
+    instance = None
+    codec = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls.instance is None:
+            cls.instance = object.__new__(cls)
+        return cls.instance
+
+    def __init__(self) -> object:
+        # 单例只初始化一次 保证统计不被重置
+        if self.codec is not None:
+            return
+        cache_info = GlobalCfg().get_cache_info()
+        self.codec = cache_info.get("codec", "arrow")
+        compression = cache_info.get("compression", "zstd") or None
+        if compression is not None and not pa.Codec.is_available(compression):
+            log_err.error("CacheCodec compression %s not available, use uncompressed." % compression)
+            compression = None
+        self.compression = compression
+        self.category_cols = [c.strip() for c in cache_info.get("category_cols", "").split(",") if c.strip()]
+        self.trace_memory = cache_info.get("trace_memory", "False").lower() == "true"
+        # {key:{'codec':'','size':0,'encode_time':0,'decode_time':0,'encode_peak':0,'decode_peak':0}}
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def dumps(self, key: str, obj) -> bytes:
+        """编码"""
+        start, tracing = self._begin()
+        content = None
+        codec = 'pickle'
+        if self.codec == 'arrow':
+            try:
+                content = self.encode(obj)
+            except Exception as e:
+                log_err.error("CacheCodec encode %s by arrow failed, use pickle! %s" % (key, e))
+            if content is not None:
+                codec = 'arrow'
+        if content is None:
+            content = dumps_data(obj)
+        self._record(key, 'encode', start, tracing, codec=codec, size=len(content))
+        return content
+
+    def loads(self, key: str, content: bytes):
+        """解码 按 payload 头识别编码方式"""
+        start, tracing = self._begin()
+        if content[:len(MAGIC)] == MAGIC:
+            obj = self.decode(content)
+        else:
+            obj = loads_data(content)
+        self._record(key, 'decode', start, tracing)
+        return obj
+
+    def encode(self, obj) -> bytes:
+        """Arrow IPC 编码，不可列式编码时返回None"""
+        if isinstance(obj, DataFrame):
+            return MAGIC + TYPE_FRAME + self._write_table(self.categorize(obj))
+        items = self.flatten(obj)
+        if items is None:
+            return None
+        # 各子表按顺序拼接 键及行数记入 schema 元数据，解码时按行切片还原
+        layout = [[list(keys), len(df.index)] for keys, df in items]
+        data = self.categorize(pd.concat([df for _, df in items], axis=0))
+        return MAGIC + TYPE_MAP + self._write_table(data, {META_LAYOUT: json.dumps(layout).encode()})
+
+    def decode(self, content: bytes):
+        """Arrow IPC 解码"""
+        payload_type = content[len(MAGIC):len(MAGIC) + 1]
+        reader = pa.ipc.open_stream(pa.py_buffer(content)[len(MAGIC) + 1:])
+        table = reader.read_all()
+        data = table.to_pandas()
+        if payload_type == TYPE_FRAME:
+            return data
+        obj = {}
+        start = 0
+        for keys, rows in json.loads(table.schema.metadata[META_LAYOUT]):
+            node = obj
+            for k in keys[:-1]:
+                node = node.setdefault(k, {})
+            node[keys[-1]] = data.iloc[start:start + rows]
+            start += rows
+        return obj
+
+    def _write_table(self, data: DataFrame, metadata: dict = None) -> bytes:
+        table = pa.Table.from_pandas(data, preserve_index=True)
+        if metadata:
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+        sink = pa.BufferOutputStream()
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def categorize(self, data: DataFrame) -> DataFrame:
+        """低基数字符串列 转为 category[Arrow 字典列]"""
+        cols = [c for c in data.columns if c in self.category_cols and data[c].dtype == object]
+        if len(cols) == 0:
+            return data
+        return data.astype({c: 'category' for c in cols})
+
+    def flatten(self, obj, keys: tuple = ()) -> list:
+        """
+        同构嵌套字典 展开为 [(keys, DataFrame)]
+        键非字符串、叶子非DataFrame、深度或列不一致 返回None
+        """
+        if isinstance(obj, DataFrame):
+            return [(keys, obj)] if len(keys) > 0 else None
+        if not isinstance(obj, dict) or len(obj) == 0:
+            return None
+        items = []
+        for k, v in obj.items():
+            if not isinstance(k, str):
+                return None
+            sub = self.flatten(v, keys + (k,))
+            if sub is None:
+                return None
+            items.extend(sub)
+        first_keys, first = items[0]
+        for item_keys, df in items:
+            if len(item_keys) != len(first_keys) or list(df.columns) != list(first.columns):
+                return None
+        return items
+
+    def _begin(self):
+        start = time.perf_counter()
+        tracing = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            tracing = True
+        return start, tracing
+
+    def _record(self, key, op, start, tracing, codec=None, size=None):
+        elapsed = time.perf_counter() - start
+        peak = None
+        if tracing:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        with self.lock:
+            metric = self.metrics.setdefault(key, {'codec': None, 'size': None, 'encode_time': None,
+                                                   'decode_time': None, 'encode_peak': None,
+                                                   'decode_peak': None})
+            metric[op + '_time'] = elapsed
+            metric[op + '_peak'] = peak
+            if codec is not None:
+                metric['codec'] = codec
+            if size is not None:
+                metric['size'] = size
+        log.info("CacheCodec %s %s cost %.4fs%s" % (op, key, elapsed,
+                                                    "" if size is None else ", size %s bytes" % size))
+
+    def stats(self) -> DataFrame:
+        """每个 key 的 payload 大小(bytes)、编解码耗时(s)、峰值内存(bytes)"""
+        with self.lock:
+            return DataFrame(self.metrics).T
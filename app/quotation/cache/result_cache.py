@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from conf.globalcfg import GlobalCfg
+from db.myredis.redis_cli import RedisClient
+from util.obj_util import dumps_data, loads_data
+
+'''
+接口计算结果缓存 当为单例
+-- 缓存 key：接口名 + 请求参数(条件字典/权重)规范化 json 的哈希 + 基础数据快照版本
+-- 两级：本进程有界 LRU -> redis 共享层[多个 worker 共享，过期时间 result_expire]
+-- 失效：快照版本更新后 key 随版本变化自然不再命中；
+   本地缓存切换版本时(LocalBasicDataCache.refresh) 清空本进程 LRU 中的旧版本结果
+-- 快照版本为空(远程缓存尚未生成) 不缓存
+-- redis 不可用时只使用本地 LRU
+
+usage:
+    ResultCache().cached("sel_stks_by_cons", LocalBasicDataCache.version, condtions_dict,
+                         lambda: compute(condtions_dict))
+'''
+log = logging.getLogger("app")
+log_err = logging.getLogger("log_err")
+
+KEY_PREFIX = "ResultCache"
+
+
+def params_hash(params) -> str:
+    """请求参数规范化哈希 [键排序，与字典顺序无关]"""
+    content = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+# noinspection PyMethodMayBeStatic,PyBroadException
+class ResultCache(object):
+    instance = None
+    maxsize = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls.instance is None:
+            cls.instance = object.__new__(cls)
+        return cls.instance
+
+    def __init__(self) -> object:
+        if self.maxsize is not None:
+            return
+        cache_info = GlobalCfg().get_cache_info()
+        self.maxsize = int(cache_info.get("result_cache_size", 256))
+        self.expire_seconds = int(cache_info.get("result_expire", 86400))
+        self.rediscli = RedisClient().get_redis_cli()
+        # 当前快照版本 及其结果 {key: result}
+        self.version = None
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def key(self, name, version, params) -> str:
+        return "%s:%s:%s:%s" % (KEY_PREFIX, version, name, params_hash(params))
+
+    def cached(self, name, version, params, func):
+        """取缓存结果，未命中则调用 func() 计算并写入两级缓存"""
+        if version is None:
+            return func()
+        key = self.key(name, version, params)
+        found, result = self.get(version, key)
+        if found:
+            return result
+        result = func()
+        self.set(version, key, result)
+        return result
+
+    def get(self, version, key) -> tuple:
+        """(是否命中, 结果)"""
+        with self.lock:
+            self._switch(version)
+            if version == self.version and key in self.results:
+                self.results.move_to_end(key)
+                self.hits += 1
+                return True, self.results[key]
+        content = None
+        if self.rediscli is not None:
+            try:
+                content = self.rediscli.get(key)
+            except Exception as e:
+                log_err.error("ResultCache get %s from redis failed! %s" % (key, e))
+        if content is None:
+            with self.lock:
+                self.misses += 1
+            return False, None
+        result = loads_data(content)
+        with self.lock:
+            self.redis_hits += 1
+            self._put(version, key, result)
+        return True, result
+
+    def set(self, version, key, result):
+        with self.lock:
+            self._put(version, key, result)
+        if self.rediscli is None:
+            return
+        try:
+            self.rediscli.set(key, dumps_data(result), ex=self.expire_seconds)
+        except Exception as e:
+            log_err.error("ResultCache set %s to redis failed! %s" % (key, e))
+
+    def invalidate(self, version):
+        """快照切换到 version，清空其它版本的本地结果"""
+        with self.lock:
+            self._switch(version)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'version': self.version, 'size': len(self.results), 'hits': self.hits,
+                    'redis_hits': self.redis_hits, 'misses': self.misses}
+
+    def _switch(self, version):
+        # 版本号为递增数字 只向新版本切换[避免旧版本的迟到请求清空缓存]
+        if self.version is None or int(version) > int(self.version):
+            self.results.clear()
+            self.version = version
+
+    def _put(self, version, key, result):
+        # 计算期间版本已切换 不缓存旧版本结果
+        if version != self.version:
+            return
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.maxsize:
+            self.results.popitem(last=False)
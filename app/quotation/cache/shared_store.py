@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from conf.globalcfg import GlobalCfg
+from quotation.cache.codec import CacheCodec
+
+'''
+基础数据快照 同机多进程零拷贝共享 当为单例
+-- 每个缓存版本只由本机第一个加载该版本的进程发布一次：
+   数值列按 dtype 合并为二维 .npy 列块，category 列保存字典编码 codes，其余列 pickle
+   整个版本先写入临时目录 再 rename 为 shared_path/version 保证原子可见
+-- 其余进程只读 mmap 打开 .npy，按列构造 DataFrame[copy=False 不合并列块]，数值列与 category codes 不拷贝，
+   多个 gunicorn worker 共享同一份页缓存[shared_path 默认在 tmpfs /dev/shm 上]；
+   字符串等 object 列仍为每进程一份
+-- 同构嵌套字典(smb_industry_map) 拼成一张表发布，attach 后按行切片还原[切片为视图]
+-- 其它对象(industry_set 等) pickle 保存，attach 时反序列化
+-- 共享数据只读，使用方需 copy 后再修改
+
+目录结构：
+shared_path/
+    12/base_stock_infos/meta.json
+    12/base_stock_infos/block_0.npy      float64 列块 (列数,行数)
+    12/base_stock_infos/codes_3.npy      第3列 category codes
+    12/base_stock_infos/objects.pkl      object 列
+    12/industry_set/object.pkl
+'''
+log = logging.getLogger("app")
+log_err = logging.getLogger("log_err")
+
+
+# noinspection PyMethodMayBeStatic,PyBroadException
+class SharedFrameStore(object):
+    instance = None
+    shared_path = None
+    # 保留的版本数 [正在使用旧版本的进程映射仍然有效]
+    keep_versions = 2
+
+    def __new__(cls, *args, **kwargs):
+        if cls.instance is None:
+            cls.instance = object.__new__(cls)
+        return cls.instance
+
+    def __init__(self) -> object:
+        if self.shared_path is not None:
+            return
+        cache_info = GlobalCfg().get_cache_info()
+        self.enabled = cache_info.get("shared", "True").lower() == "true"
+        shared_path = cache_info.get("shared_path", "/dev/shm/iaos")
+        if not os.path.isdir(os.path.dirname(shared_path)):
+            # 无 tmpfs[非linux] 使用临时目录
+            shared_path = os.path.join(tempfile.gettempdir(), "iaos_shared")
+        self.shared_path = shared_path
+        self.codec = CacheCodec()
+
+    def version_path(self, version) -> str:
+        return os.path.join(self.shared_path, str(version))
+
+    def exists(self, version) -> bool:
+        return os.path.isdir(self.version_path(version))
+
+    def publish(self, version, snapshot: dict) -> bool:
+        """
+        发布某版本快照 {name: obj}；该版本已发布则跳过
+        """
+        if self.exists(version):
+            return True
+        os.makedirs(self.shared_path, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(prefix=".%s." % version, dir=self.shared_path)
+        try:
+            for name, obj in snapshot.items():
+                self._write(os.path.join(tmp_path, name), obj)
+            os.rename(tmp_path, self.version_path(version))
+        except OSError:
+            # 其它进程已发布
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return self.exists(version)
+        except Exception as e:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            log_err.error("SharedFrameStore publish version %s failed! %s" % (version, e))
+            return False
+        self.clean(version)
+        log.info("SharedFrameStore publish version %s." % version)
+        return True
+
+    def attach(self, version, names: list) -> dict:
+        """只读映射某版本快照 {name: obj}；未发布返回None"""
+        if not self.exists(version):
+            return None
+        try:
+            return {name: self._read(os.path.join(self.version_path(version), name)) for name in names}
+        except Exception as e:
+            log_err.error("SharedFrameStore attach version %s failed! %s" % (version, e))
+            return None
+
+    def clean(self, version):
+        """只保留最新的 keep_versions 个版本"""
+        versions = sorted((v for v in os.listdir(self.shared_path) if v.isdigit()), key=int)
+        for v in versions[:-self.keep_versions]:
+            if v != str(version):
+                shutil.rmtree(self.version_path(v), ignore_errors=True)
+
+    def _write(self, path, obj):
+        os.makedirs(path)
+        if isinstance(obj, DataFrame):
+            self._write_frame(path, obj, {'type': 'frame'})
+            return
+        items = self.codec.flatten(obj)
+        if items is None:
+            with open(os.path.join(path, "object.pkl"), 'wb') as f:
+                pickle.dump(obj, f)
+            return
+        layout = [[list(keys), len(df.index)] for keys, df in items]
+        self._write_frame(path, pd.concat([df for _, df in items], axis=0), {'type': 'map', 'layout': layout})
+
+    def _write_frame(self, path, df: DataFrame, meta: dict):
+        df = self.codec.categorize(df)
+        meta['columns'] = [str(c) for c in df.columns]
+        meta['rows'] = len(df.index)
+        meta['blocks'] = []
+        meta['categories'] = []
+        # 数值、日期列按 dtype 合并为二维列块
+        groups = {}
+        others = []
+        for i, dtype in enumerate(df.dtypes):
+            if isinstance(dtype, np.dtype) and dtype.kind in 'fiubMm':
+                groups.setdefault(dtype.str, []).append(i)
+            elif isinstance(dtype, pd.CategoricalDtype):
+                codes = df.iloc[:, i].cat.codes.to_numpy()
+                np.save(os.path.join(path, "codes_%s.npy" % i), codes)
+                meta['categories'].append({'placement': i, 'ordered': bool(dtype.ordered),
+                                           'categories': dtype.categories.tolist()})
+            else:
+                others.append(i)
+        for k, placement in enumerate(groups.values()):
+            values = np.ascontiguousarray(np.stack([df.iloc[:, i].to_numpy() for i in placement]))
+            np.save(os.path.join(path, "block_%s.npy" % k), values)
+            meta['blocks'].append({'file': "block_%s.npy" % k, 'placement': placement})
+        if isinstance(df.index, pd.RangeIndex):
+            meta['index'] = [df.index.start, df.index.stop, df.index.step]
+        with open(os.path.join(path, "objects.pkl"), 'wb') as f:
+            pickle.dump({'placement': others, 'values': [df.iloc[:, i].array for i in others],
+                         'index': None if 'index' in meta else df.index}, f)
+        with open(os.path.join(path, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    def _read(self, path):
+        meta_file = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_file):
+            with open(os.path.join(path, "object.pkl"), 'rb') as f:
+                return pickle.load(f)
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        df = self._read_frame(path, meta)
+        if meta['type'] == 'frame':
+            return df
+        obj = {}
+        start = 0
+        for keys, rows in meta['layout']:
+            node = obj
+            for k in keys[:-1]:
+                node = node.setdefault(k, {})
+            node[keys[-1]] = df.iloc[start:start + rows]
+            start += rows
+        return obj
+
+    def _read_frame(self, path, meta: dict) -> DataFrame:
+        columns = {}
+        for block in meta['blocks']:
+            values = np.load(os.path.join(path, block['file']), mmap_mode='r')
+            for row, i in enumerate(block['placement']):
+                # 列块的一行即一列，为 mmap 的连续视图
+                columns[i] = values[row]
+        for cat in meta['categories']:
+            codes = np.load(os.path.join(path, "codes_%s.npy" % cat['placement']), mmap_mode='r')
+            dtype = pd.CategoricalDtype(cat['categories'], ordered=cat['ordered'])
+            columns[cat['placement']] = pd.Categorical.from_codes(codes, dtype=dtype)
+        with open(os.path.join(path, "objects.pkl"), 'rb') as f:
+            objects = pickle.load(f)
+        for i, values in zip(objects['placement'], objects['values']):
+            if isinstance(values, pd.arrays.PandasArray):
+                values = values.to_numpy()
+            columns[i] = values
+        index = pd.RangeIndex(*meta['index']) if 'index' in meta else objects['index']
+        # 按位置构造 [列名可能重复]，copy=False 时各列单独成块、不拷贝
+        df = DataFrame({i: columns[i] for i in range(len(meta['columns']))}, index=index, copy=False)
+        df.columns = pd.Index(meta['columns'], dtype=object)
+        return df
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import asyncio
+import logging
+import time
+
+import aiohttp
+import pandas as pd
+from pandas import DataFrame
+
+from conf.globalcfg import GlobalCfg
+from quotation.store.market_store import LocalMarketDataStore
+from util.decorator_util import retry
+from util.time_util import get_today_Ymd
+
+'''
+异步数据获取器：直接请求 tushare HTTP 接口，不经过阻塞的 tushare 客户端
+-- 一个 aiohttp 会话、连接池复用 keep-alive 连接，只在 async with 内有效
+-- 信号量限制同时在途的请求数[tushare.info async_concurrency]，异步令牌桶限制请求频次[max_calls_per_minute]
+-- 单个请求失败[网络错误、接口返回非0错误码] 由 decorator_util.retry 异步重试，重试耗尽返回 None
+-- gather_dates 按交易日、gather_chunks 按 ts_code 分块 并发请求后一次性 concat，网络延迟重叠而非串行累加
+-- ingest_daily 全市场日线按交易日并发获取，落地本地行情存储并标记全市场分区[只落地当日之前的交易日]
+
+usage:
+    async with AsyncTuShareCapturer() as capturer:
+        daily = await capturer.gather_dates('daily', trade_dates)
+        fina = await capturer.gather_chunks('fina_indicator_vip', ts_codes, chunk_size=600, period='20221231')
+    # 同步调用
+    ingest_daily(trade_dates, endpoints=('daily', 'adj_factor'))
+'''
+log = logging.getLogger("app")
+log_err = logging.getLogger("log_err")
+
+TUSHARE_HTTP_URL = 'http://api.tushare.pro'
+
+
+class AsyncTokenBucket(object):
+    """
+    异步令牌桶限流 [同 batch_fetcher.TokenBucket，等待时不阻塞事件循环]
+    rate:     每秒生成令牌数
+    capacity: 桶容量[允许的突发请求数]
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.timestamp = time.monotonic()
+
+    async def acquire(self):
+        """获取一个令牌，不足时等待"""
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+            self.timestamp = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class TuShareAPIError(Exception):
+    """tushare 接口返回非0错误码"""
+
+    def __init__(self, api_name: str, code, msg: str):
+        super().__init__("%s code=%s msg=%s" % (api_name, code, msg))
+        self.code = code
+
+
+def to_frame(body: dict) -> DataFrame:
+    """tushare 接口响应 {'code','msg','data':{'fields','items'}} -> DataFrame"""
+    data = body.get('data') or {}
+    return DataFrame(data.get('items') or [], columns=data.get('fields') or [])
+
+
+class AsyncTuShareCapturer(object):
+    """
+    token:       默认 tushare.info token
+    url:         默认 tushare.info http_url
+    concurrency: 同时在途的请求数，默认 tushare.info async_concurrency
+    timeout:     单个请求超时(s)
+    """
+
+    def __init__(self, token: str = None, url: str = None, concurrency: int = None, timeout: int = 60,
+                 max_retry: int = 3, time_interval: int = 2):
+        ts_info = GlobalCfg().get_ts_info()
+        self.token = token or ts_info.get("token")
+        self.url = url or ts_info.get("http_url", TUSHARE_HTTP_URL)
+        self.concurrency = concurrency or int(ts_info.get("async_concurrency", 10))
+        self.calls_per_minute = int(ts_info.get("max_calls_per_minute", 500))
+        self.timeout = timeout
+        self.max_retry = max_retry
+        self.time_interval = time_interval
+        self.session = None
+        self.semaphore = None
+        self.bucket = None
+        # 实际发出的请求数[含重试]
+        self.requests = 0
+
+    async def __aenter__(self):
+        # 会话、信号量须在事件循环内创建
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(connector=connector,
+                                             timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.bucket = AsyncTokenBucket(rate=self.calls_per_minute / 60.0, capacity=self.concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.session.close()
+        self.session = None
+
+    async def _post(self, api_name: str, fields: str, params: dict) -> DataFrame:
+        """单个请求，失败抛出异常[由 retry 重试]"""
+        await self.bucket.acquire()
+        async with self.semaphore:
+            self.requests += 1
+            payload = {'api_name': api_name, 'token': self.token, 'params': params, 'fields': fields}
+            async with self.session.post(self.url, json=payload) as resp:
+                resp.raise_for_status()
+                body = await resp.json(content_type=None)
+        if body.get('code') != 0:
+            raise TuShareAPIError(api_name, body.get('code'), body.get('msg'))
+        return to_frame(body)
+
+    async def query(self, api_name: str, fields: str = '', **params) -> DataFrame:
+        """
+        请求 tushare 接口，参数同 tushare pro_api.query
+        return: DataFrame，重试耗尽返回 None
+        """
+        params = {k: v for k, v in params.items() if v is not None}
+        data = await retry(max_retry=self.max_retry, time_interval=self.time_interval)(self._post)(
+            api_name, fields, params)
+        if data is None:
+            log_err.error("AsyncTuShareCapturer %s %s failed after %s retries!" % (api_name, params, self.max_retry))
+        return data
+
+    async def get_daily(self, ts_code: str = '', trade_date: str = '', start_date: str = '', end_date: str = ''):
+        return await self.query('daily', ts_code=ts_code, trade_date=trade_date, start_date=start_date,
+                                end_date=end_date)
+
+    async def get_daily_basic(self, ts_code: str = '', trade_date: str = '', fields: str = ''):
+        return await self.query('daily_basic', fields=fields, ts_code=ts_code, trade_date=trade_date)
+
+    async def get_adj_factor(self, ts_code: str = '', trade_date: str = ''):
+        return await self.query('adj_factor', ts_code=ts_code, trade_date=trade_date)
+
+    async def get_fina_indicator(self, ts_code: str = '', period: str = ''):
+        return await self.query('fina_indicator_vip', ts_code=ts_code, period=period)
+
+    async def gather_by_date(self, api_name: str, trade_dates: list, fields: str = '', **params) -> dict:
+        """按交易日并发请求 [每个交易日一个请求]，返回 {交易日: DataFrame}；失败的交易日记录日志后不含"""
+        results = await asyncio.gather(*[self.query(api_name, fields, trade_date=d, **params)
+                                         for d in trade_dates])
+        failed = [d for d, r in zip(trade_dates, results) if r is None]
+        if len(failed) > 0:
+            log_err.error("AsyncTuShareCapturer %s failed: %s" % (api_name, failed))
+        return {d: r for d, r in zip(trade_dates, results) if r is not None}
+
+    async def gather_dates(self, api_name: str, trade_dates: list, fields: str = '', **params) -> DataFrame:
+        """按交易日并发请求后 concat"""
+        return concat_results(list((await self.gather_by_date(api_name, trade_dates, fields, **params)).values()))
+
+    async def gather_chunks(self, api_name: str, ts_codes: list, chunk_size: int = 500, fields: str = '',
+                            **params) -> DataFrame:
+        """ts_code 按 chunk_size 分块并发请求后 concat [ts_code 可传多值的接口]；失败的分块记录日志后跳过"""
+        chunks = [",".join(ts_codes[i:i + chunk_size]) for i in range(0, len(ts_codes), chunk_size)]
+        results = await asyncio.gather(*[self.query(api_name, fields, ts_code=c, **params) for c in chunks])
+        failed = [c for c, r in zip(chunks, results) if r is None]
+        if len(failed) > 0:
+            log_err.error("AsyncTuShareCapturer %s failed chunks: %s" % (api_name, failed))
+        return concat_results(results)
+
+
+def concat_results(results: list) -> DataFrame:
+    results = [r for r in results if r is not None and not r.empty]
+    if len(results) == 0:
+        return DataFrame()
+    return pd.concat(results, axis=0, ignore_index=True)
+
+
+async def ingest_daily_async(capturer: AsyncTuShareCapturer, trade_dates: list,
+                             endpoints=('daily',)) -> dict:
+    """
+    全市场日线按交易日并发获取 落地本地行情存储[标记全市场分区]；已是全市场的分区跳过
+    当日及之后的数据可能尚未入库完整，不获取、不落地 [同 LocalMarketDataStore.read_through]
+    return: {endpoint: 落地的交易日列表}
+    """
+    store = LocalMarketDataStore()
+    today = get_today_Ymd()
+    saved = {}
+    for endpoint in endpoints:
+        dates = [d for d in trade_dates if str(d) < today and not store.is_full(endpoint, d)]
+        frames = await capturer.gather_by_date(endpoint, dates)
+        saved[endpoint] = []
+        for trade_date, data in frames.items():
+            if data.empty:
+                # 非交易日或当日数据尚未更新
+                continue
+            store.write(endpoint, trade_date, data, full=True)
+            saved[endpoint].append(trade_date)
+        store.count(endpoint, requests=len(dates))
+        log.info("AsyncTuShareCapturer ingested %s %s/%s dates." % (endpoint, len(saved[endpoint]), len(dates)))
+    return saved
+
+
+def ingest_daily(trade_dates: list, endpoints=('daily',), **kwargs) -> dict:
+    """ingest_daily_async 的同步入口；离线模式不访问网络"""
+    if LocalMarketDataStore().offline:
+        return {endpoint: [] for endpoint in endpoints}
+
+    async def _ingest():
+        async with AsyncTuShareCapturer(**kwargs) as capturer:
+            return await ingest_daily_async(capturer, trade_dates, endpoints)
+
+    return asyncio.run(_ingest())
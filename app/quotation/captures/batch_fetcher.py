@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+from pandas import DataFrame
+
+from conf.globalcfg import GlobalCfg
+
+'''
+分块并发数据获取器 当为单例
+适用于 ts_code 可传多值的接口[get_daily、get_adj_factor、get_fina_indicator、get_pro_bar(start_date=end_date)等]
+-- ts_code 列表按 chunk_size 分块，提交到有界线程池并发获取
+-- 令牌桶限流，保证请求频次不超过 tushare 接口配额 [tushare.info max_calls_per_minute]
+-- 只重试失败的分块，全部完成后一次性 concat
+-- 记录每个分块的耗时等指标
+
+usage:
+    fetcher = BatchFetcher()
+    closes = fetcher.fetch(tsdatacapture.get_daily, ts_code_list, chunk_size=500, trade_date=trade_date)
+    fetcher.metrics()
+'''
+log = logging.getLogger("app")
+log_err = logging.getLogger("log_err")
+
+
+class TokenBucket(object):
+    """
+    令牌桶限流
+    rate:     每秒生成令牌数
+    capacity: 桶容量[允许的突发请求数]
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.timestamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """获取一个令牌，不足时阻塞等待"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+                self.timestamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# noinspection PyBroadException
+class BatchFetcher(object):
+    instance = None
+    executor = None
+    # 保留最近的分块指标条数
+    max_metrics = 10000
+
+    def __new__(cls, *args, **kwargs):
+        if cls.instance is None:
+            cls.instance = object.__new__(cls)
+        return cls.instance
+
+    def __init__(self) -> object:
+        # 单例只初始化一次 线程池、令牌桶全局共享
+        if self.executor is not None:
+            return
+        cfg = GlobalCfg()
+        max_workers = int(cfg.get_thread_info().get("max_workers", 4))
+        calls_per_minute = int(cfg.get_ts_info().get("max_calls_per_minute", 500))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="BatchFetcher")
+        self.bucket = TokenBucket(rate=calls_per_minute / 60.0, capacity=max_workers)
+        self.chunk_metrics = deque(maxlen=self.max_metrics)
+        self.lock = threading.Lock()
+
+    def fetch(self, func, ts_codes: list, chunk_size: int = 500, max_retry: int = 3, **kwargs) -> DataFrame:
+        """
+        分块并发获取
+        func:       数据获取函数，以 ts_code=逗号分隔代码 调用
+        ts_codes:   股票代码列表
+        chunk_size: 每块代码数
+        max_retry:  失败分块最大重试轮数
+        kwargs:     透传给 func 的其余参数
+        """
+        endpoint = getattr(func, "__name__", str(func))
+        chunks = [ts_codes[i:i + chunk_size] for i in range(0, len(ts_codes), chunk_size)]
+        results = []
+        for attempt in range(max_retry + 1):
+            if len(chunks) == 0:
+                break
+            futures = {self.executor.submit(self._fetch_chunk, func, endpoint, chunk, attempt, kwargs): chunk
+                       for chunk in chunks}
+            failed = []
+            for future in as_completed(futures):
+                data = future.result()
+                if data is None:
+                    failed.append(futures[future])
+                else:
+                    results.append(data)
+            chunks = failed
+        if len(chunks) > 0:
+            log_err.error("BatchFetcher %s failed chunks: %s" % (endpoint, [",".join(c) for c in chunks]))
+        results = [r for r in results if not r.empty]
+        if len(results) == 0:
+            return DataFrame()
+        return pd.concat(results, axis=0, ignore_index=True)
+
+    def _fetch_chunk(self, func, endpoint, chunk, attempt, kwargs):
+        """获取单个分块 失败返回None"""
+        self.bucket.acquire()
+        start = time.perf_counter()
+        data = None
+        try:
+            data = func(ts_code=",".join(chunk), **kwargs)
+        except Exception as e:
+            log_err.error("BatchFetcher %s chunk fetch failed! %s" % (endpoint, e))
+        latency = time.perf_counter() - start
+        with self.lock:
+            self.chunk_metrics.append({'endpoint': endpoint, 'codes': len(chunk),
+                                       'rows': 0 if data is None else len(data.index),
+                                       'attempt': attempt, 'ok': data is not None, 'latency': latency})
+        return data
+
+    def metrics(self) -> DataFrame:
+        """每个分块的获取指标 [endpoint, codes, rows, attempt, ok, latency(s)]"""
+        with self.lock:
+            return DataFrame(list(self.chunk_metrics))
+
+    def latency_summary(self) -> DataFrame:
+        """按接口汇总分块耗时"""
+        metrics = self.metrics()
+        if metrics.empty:
+            return metrics
+        return metrics.groupby('endpoint')['latency'].describe(percentiles=[0.5, 0.9, 0.99])
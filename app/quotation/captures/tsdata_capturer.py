@@ -7,11 +7,13 @@ import tushare as ts
 from pandas import DataFrame
 
 from conf.globalcfg import GlobalCfg
+from quotation.store.market_store import read_through
 from util.decorator_util import retry
 
 warnings.filterwarnings("ignore")
 '''
 tushare数据获取器 当为单例
+行情、指标类接口经 LocalMarketDataStore 读穿透：先查本地分区，仅拉取缺失数据 [see quotation.store.market_store]
 '''
 
 
@@ -130,6 +132,7 @@ class TuShareDataCapturer(object):
 
     '''----------------------以下：行情数据----------------------'''
 
+    @read_through(endpoint='daily')
     @retry(max_retry=3, time_interval=2)
     def get_daily(self, ts_code: str = None, trade_date: str = None, start_date: str = None,
                   end_date: str = None) -> DataFrame:
@@ -154,6 +157,7 @@ class TuShareDataCapturer(object):
         return df
 
     # @retry_for_none
+    @read_through(endpoint='adj_factor')
     @retry(max_retry=3, time_interval=5)
     def get_adj_factor(self, ts_code: str = '', trade_date: str = None, start_date: str = None,
                        end_date: str = None):
@@ -175,6 +179,10 @@ class TuShareDataCapturer(object):
         df = self.pro.adj_factor(ts_code=ts_code, trade_date=trade_date, start_date=start_date, end_date=end_date)
         return df
 
+    # 前复权价格随最新复权因子变动 不缓存
+    @read_through(endpoint=lambda p: 'pro_bar_%s_%s_%s' % (p['asset'], p['adj'], p['freq']),
+                  cacheable=lambda p: p['adj'] != 'qfq' and not p['ma'] and not p['factors'] and not p['adjfactor']
+                  and p['offset'] is None and p['limit'] is None)
     @retry(max_retry=3, time_interval=5)
     def get_pro_bar(self, ts_code='', start_date='', end_date='', freq='D', asset='E',
                     adj=None, ma=[], factors=None, adjfactor=False,
@@ -208,6 +216,7 @@ class TuShareDataCapturer(object):
 
         return df
 
+    @read_through(endpoint='daily_basic')
     @retry(max_retry=5, time_interval=3)
     def get_daily_basic(self, ts_code: str = '', trade_date: str = None,
                         start_date: str = None, end_date: str = None) -> DataFrame:
@@ -512,6 +521,7 @@ class TuShareDataCapturer(object):
         """todo 描述：分红送股数据"""
         pass
 
+    @read_through(endpoint='fina_indicator', partition_arg='period')
     @retry(max_retry=5, time_interval=2)
     def get_fina_indicator(self, ts_code: str = None, ann_date: str = None, start_date: str = None,
                            end_date: str = None, period: str = None) -> DataFrame:
@@ -659,7 +669,7 @@ class TuShareDataCapturer(object):
         vol	        float	成交量（手）
         amount	    float	成交额（千元）
         """
-        df = self.pro.index_daily(ts_code=ts_code, rade_date=trade_date,
+        df = self.pro.index_daily(ts_code=ts_code, trade_date=trade_date,
                                   start_date=start_date, end_date=end_date)
         return df
 
@@ -2,7 +2,6 @@
 __author__ = 'carl'
 
 import logging
-import time
 
 import numpy as np
 import pandas as pd
@@ -10,7 +9,8 @@ from pandas import DataFrame
 
 from db.myredis.redis_cli import RedisClient
 from quotation.captures.tsdata_capturer import TuShareDataCapturer
-from util.cal_util import get_data_percentile
+from quotation.cleaning.fina_pit import FinaIndicatorPIT
+from quotation.store.snapshot_store import SnapshotStore
 from util.decorator_util import retry
 from util.quant_util import get_period_fl_trade_date
 from util.time_util import get_befortoday_Ymd, get_after_today_Ymd
@@ -53,9 +53,6 @@ log_err = logging.getLogger("log_err")
 
 # noinspection PyMethodMayBeStatic,SpellCheckingInspection,PyIncorrectDocstring,DuplicatedCode,PyBroadException
 class BaseDataClean(object):
-    # 交易日所在年上一年年报数据
-    year_fina_indictor = None
-    pre_final_period = None
     # 上一个交易日
     pretrade_date: str = None
     # 股票池 [上市]
@@ -73,11 +70,11 @@ class BaseDataClean(object):
     tscode_set = set()
     # 行业
     industry_set = set()
-    # 小盘股
+    # 小盘股 DataFrame
     small_cap_stocks = list()
-    # 中盘股
+    # 中盘股 DataFrame
     mid_cap_stocks = list()
-    # 大盘股
+    # 大盘股 DataFrame
     big_cap_stocks = list()
     labels = ['小盘股', '中盘股', '大盘股']
     # 分位数设定
@@ -157,9 +154,6 @@ class BaseDataClean(object):
              "大盘股":{"行业1":stockinfoDataFrame,"行业2":stockinfoDataFrame,...}
         }
         """
-        BaseDataClean.smb_industry_map = {
-            '小盘股': {}, '中盘股': {}, '大盘股': {}
-        }
         # 获取流通市值 float_share、行业 industry
         dfall = None
         try:
@@ -167,46 +161,13 @@ class BaseDataClean(object):
         except Exception as e:
             log_err.error("BaseDataClean.tsdatacapture.get_bak_basic Failed! %s" % e)
             raise Exception("BaseDataClean.tsdatacapture.get_bak_basic Failed! %s" % e)
-        for idx, stkdata in dfall.iterrows():
-            ts_code = stkdata['ts_code']
-            BaseDataClean.tscode_set.discard(ts_code)
-        for tcod in BaseDataClean.tscode_set:
-            df = BaseDataClean.tsdatacapture.get_bak_basic(ts_code=tcod)
-            dfall = dfall.append(df, ignore_index=True)
+        # 全量结果中缺失的股票 一次批量拉取
+        BaseDataClean.tscode_set.difference_update(dfall['ts_code'])
+        if len(BaseDataClean.tscode_set) > 0:
+            df = BaseDataClean.tsdatacapture.get_bak_basic(ts_code=",".join(sorted(BaseDataClean.tscode_set)))
+            dfall = pd.concat([dfall, df], axis=0, ignore_index=True)
         # print("BaseDataClean\r\n"+dfall.head(5))
-
-        # 此次划分标准：分析 流通股本的中位数、75%分位数、90%分位数
-        # 中位数以下：小盘股
-        # 90%分位数以上：大盘股
-        data_max, data_min, valuation_low, valuation_mid, valuation_high = get_data_percentile(
-            np.array(dfall.iloc[:].loc[:, 'float_share']).tolist(), 50, 75, 90)
-        for idx, stkdata in dfall.iterrows():
-            float_mv = stkdata["float_share"]
-            ele_industry = stkdata["industry"]
-            BaseDataClean.industry_set.add(stkdata["industry"])
-            if float_mv <= valuation_low:
-                BaseDataClean.small_cap_stocks.append(stkdata)
-                if BaseDataClean.smb_industry_map['小盘股'].get(ele_industry) is None:
-                    BaseDataClean.smb_industry_map['小盘股'][ele_industry] = DataFrame()
-                BaseDataClean.smb_industry_map['小盘股'][ele_industry] = BaseDataClean.smb_industry_map['小盘股'][
-                    ele_industry].append(stkdata, ignore_index=True)
-                # BaseDataClean.smb_industry_map['小盘股'][ele_industry].append(stkdata)
-            elif float_mv >= valuation_high:
-                BaseDataClean.big_cap_stocks.append(stkdata)
-                if BaseDataClean.smb_industry_map['大盘股'].get(ele_industry) is None:
-                    BaseDataClean.smb_industry_map['大盘股'][ele_industry] = DataFrame()
-                # BaseDataClean.smb_industry_map['大盘股'][ele_industry].append(stkdata)
-                BaseDataClean.smb_industry_map['大盘股'][ele_industry] = BaseDataClean.smb_industry_map['大盘股'][
-                    ele_industry].append(stkdata, ignore_index=True)
-
-            else:
-                BaseDataClean.mid_cap_stocks.append(stkdata)
-                if BaseDataClean.smb_industry_map['中盘股'].get(ele_industry) is None:
-                    BaseDataClean.smb_industry_map['中盘股'][ele_industry] = DataFrame()
-                # BaseDataClean.smb_industry_map['中盘股'][ele_industry].append(stkdata)
-                BaseDataClean.smb_industry_map['中盘股'][ele_industry] = BaseDataClean.smb_industry_map['中盘股'][
-                    ele_industry].append(stkdata, ignore_index=True)
-        # %s" % e
+        BaseDataClean.smb_industry_map = cls.cal_smb_industry_map(dfall)
         log.info("大盘股数量：{} 中盘股数量：{} 小盘股数量：{}".format(
             len(BaseDataClean.big_cap_stocks),
             len(BaseDataClean.mid_cap_stocks),
@@ -215,8 +176,44 @@ class BaseDataClean(object):
         return BaseDataClean.smb_industry_map
 
     @classmethod
-    def get_certainday_base_stock_infos(cls, trade_date: str) -> DataFrame:
-        """获取指定日期的base_stock_infos"""
+    def cal_smb_industry_map(cls, dfall: DataFrame) -> dict:
+        """
+        按流通股本分位数划分大、中、小盘，再按行业分组 [一次分组生成全部 盘子×行业 DataFrame]
+        此次划分标准：分析 流通股本的中位数、75%分位数、90%分位数
+        中位数以下：小盘股
+        90%分位数以上：大盘股
+        """
+        float_share = dfall['float_share'].to_numpy(dtype=float)
+        valuation_low, valuation_high = np.nanpercentile(float_share, [50, 90])
+        cap_labels = np.select([float_share <= valuation_low, float_share >= valuation_high],
+                               [cls.labels[0], cls.labels[2]], default=cls.labels[1])
+        smb_industry_map = {label: {} for label in cls.labels}
+        for (cap_label, industry), data in dfall.groupby([cap_labels, dfall['industry'].to_numpy()], sort=False,
+                                                         dropna=False):
+            smb_industry_map[cap_label][industry] = data.reset_index(drop=True)
+        BaseDataClean.industry_set = set(dfall['industry'])
+        BaseDataClean.small_cap_stocks = dfall[cap_labels == cls.labels[0]]
+        BaseDataClean.mid_cap_stocks = dfall[cap_labels == cls.labels[1]]
+        BaseDataClean.big_cap_stocks = dfall[cap_labels == cls.labels[2]]
+        return smb_industry_map
+
+    @classmethod
+    def get_certainday_base_stock_infos(cls, trade_date: str, columns: list = None) -> DataFrame:
+        """
+        获取指定日期的base_stock_infos [历史时点快照只构建一次，之后从本地快照读取]
+        columns: 只返回指定列
+        """
+        return SnapshotStore().get('base_stock_infos', trade_date, cls.build_certainday_base_stock_infos, columns)
+
+    @classmethod
+    def iter_certainday_base_stock_infos(cls, trade_dates: list, columns: list = None):
+        """依次产出 (交易日, base_stock_infos)，缺失的快照按需构建"""
+        return SnapshotStore().iter_range('base_stock_infos', trade_dates, cls.build_certainday_base_stock_infos,
+                                          columns)
+
+    @classmethod
+    def build_certainday_base_stock_infos(cls, trade_date: str) -> DataFrame:
+        """构建指定日期的base_stock_infos [4次远程获取 + 合并]"""
         try:
             if BaseDataClean.pretrade_date is None:
                 cls.get_pretrade_date()
@@ -261,13 +258,10 @@ class BaseDataClean(object):
             # t2 = time.time()
             # t21 = t2 - t1
             # print(t21)
-            # 取上一年年报财务数据
-            final_period = str(int(trade_date[0:4]) - 1) + "1231"
-            f_col, fina_indicator = cls.get_year_fina_indictor(base_stock_infos['ts_code'].tolist(), final_period)
+            # 交易日前已公告的最新年报财务数据 [按公告日 as-of，无未来数据]
+            f_col, fina_indicator = cls.get_year_fina_indictor(base_stock_infos['ts_code'].tolist(), trade_date)
             if fina_indicator is not None:
-                fina_indicator = fina_indicator[f_col]
-                fina_indicator.drop_duplicates(subset=['ts_code'], keep='first', inplace=True)
-                base_stock_infos = pd.merge(left=base_stock_infos, right=fina_indicator, on='ts_code')
+                base_stock_infos = pd.merge(left=base_stock_infos, right=fina_indicator[f_col], on='ts_code')
             # t3 = time.time()
             # t32 = t3 - t2
             # '总市值', '流通市值'[万元--->亿元] '总股本', '流通股本'[万股--->亿股]
@@ -283,9 +277,9 @@ class BaseDataClean(object):
             raise e
 
     @classmethod
-    def get_year_fina_indictor(cls, ts_codes_str, final_period):
+    def get_year_fina_indictor(cls, ts_codes: list, trade_date: str):
         """
-        交易日所在年上一年年报数据
+        交易日前已公告的最新年报数据 [时点表 按公告日 as-of，同一交易日全部股票一次完成]
         """
         # TS股票代码 公告日期 报告期 基本每股收益  流动比率  速动比率  每股净资产 销售净利率  销售毛利率
         # 营业净利率  净利润率  净资产收益率 总资产报酬率 总资产净利润  投入资本回报率
@@ -295,30 +289,11 @@ class BaseDataClean(object):
                  'netprofit_margin', 'grossprofit_margin', 'profit_to_gr', 'op_of_gr', 'roe', 'basic_eps_yoy',
                  'roa', 'npta', 'roic', 'roe_yearly', 'roa_yearly','roa2_yearly', 'debt_to_assets', 'op_yoy',
                  'ebt_yoy', 'tr_yoy', 'or_yoy', 'equity_yoy', 'update_flag']
-        if final_period != cls.pre_final_period:
-            cls.pre_final_period = final_period
-            fina_indicator = DataFrame()
-            if len(ts_codes_str) > 300:
-                f = lambda a: map(lambda b: a[b:b + 600], range(0, len(a), 600))
-                part_ports = f(ts_codes_str)
-            for part_port in part_ports:
-                ts_codes = ",".join(part_port)
-                new_fina_indicator = BaseDataClean.tsdatacapture.get_fina_indicator(ts_code=ts_codes,
-                                                                                    period=final_period)
-                fina_indicator = pd.concat([fina_indicator, new_fina_indicator], axis=0)
-
-            if fina_indicator is None or fina_indicator.empty:
-                for _ in range(3):
-                    try:
-                        for part_port in part_ports:
-                            ts_codes = ",".join(part_port)
-                            new_fina_indicator = BaseDataClean.tsdatacapture.get_fina_indicator(ts_code=ts_codes,
-                                                                                                period=final_period)
-                            fina_indicator = pd.concat([fina_indicator, new_fina_indicator], axis=0)
-                    except:
-                        time.sleep(3)
-            cls.year_fina_indictor = fina_indicator
-        return f_col, cls.year_fina_indictor
+        fina_indicator = FinaIndicatorPIT().asof(trade_date, ts_codes, columns=f_col, report_type='annual')
+        if fina_indicator is None or fina_indicator.empty:
+            log_err.error("trade_date %s fina_indicator capture Failed!" % trade_date)
+            return f_col, None
+        return f_col, fina_indicator
 
     @classmethod
     def get_pretrade_date(cls) -> str:
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from quotation.captures.batch_fetcher import BatchFetcher
+from quotation.captures.tsdata_capturer import TuShareDataCapturer
+from quotation.store.market_store import LocalMarketDataStore
+from util.time_util import get_today_Ymd
+
+'''
+时点(point-in-time)财务指标表 当为单例
+-- fina_indicator 按报告期落地在本地行情存储[fina_indicator/报告期.parquet]，缺失的报告期/股票才远程获取
+-- 披露期内尚未公告的股票不记为已知，每日最多重新获取一次[常驻进程中新公告的报告可及时载入]
+-- 内存中合并为一张按 (ts_code, ann_date, end_date) 排序的表，键 (ts_code, end_date, ann_date) 去重[保留更新后的记录]
+-- 交易日 T 可见的最新报告：公告日 ann_date < T 的报告中报告期最新者
+   [公告多在盘后，T 日公告的报告 T+1 日起可用；晚于已有报告期的旧报告更正不会覆盖更新的报告期]
+-- 全部股票、全部交易日一次 merge_asof(by=ts_code, on=公告日) 完成，无未来数据
+-- report_type='annual' 只用年报[同原先 上一年年报 的口径，但按公告日取可见的最新年报]，'all' 为全部定期报告
+
+usage:
+    fina = FinaIndicatorPIT().asof('20220415', ts_codes)                     # 单个交易日
+    panel = FinaIndicatorPIT().asof_frame(DataFrame({'ts_code':..., 'trade_date':...}))  # 多个交易日
+'''
+log = logging.getLogger("log_quantization")
+log_err = logging.getLogger("log_err")
+
+ENDPOINT = 'fina_indicator'
+KEY = ['ts_code', 'end_date', 'ann_date']
+
+
+def to_date_key(dates) -> np.ndarray:
+    """YYYYMMDD -> int64，空值为 -1"""
+    return pd.to_numeric(pd.Series(dates, dtype=object), errors='coerce').fillna(-1).astype(np.int64).to_numpy()
+
+
+def pit_table(data: DataFrame) -> DataFrame:
+    """整理为时点表：键 (ts_code, end_date, ann_date) 去重[保留更新后的记录]，按公告日排序"""
+    data = data.dropna(subset=['ann_date', 'end_date'])
+    sort_cols = KEY + (['update_flag'] if 'update_flag' in data.columns else [])
+    data = data.sort_values(by=sort_cols).drop_duplicates(subset=KEY, keep='last')
+    data = data.assign(ann_key=to_date_key(data['ann_date']), end_key=to_date_key(data['end_date']))
+    return data.sort_values(by=['ann_key', 'ts_code', 'end_key'], kind='stable').reset_index(drop=True)
+
+
+def latest_reports(table: DataFrame) -> DataFrame:
+    """只保留公告时报告期不早于该股票已公告的最新报告期的记录 [旧报告期的更正不覆盖更新的报告期]"""
+    latest = table.groupby('ts_code', sort=False)['end_key'].cummax()
+    return table[table['end_key'].to_numpy() == latest.to_numpy()]
+
+
+def asof_merge(left: DataFrame, table: DataFrame) -> DataFrame:
+    """
+    left: ts_code、trade_date 列；return: left 每行附加 trade_date 前已公告的最新报告[无则丢弃]
+    """
+    left = left.assign(ann_key=to_date_key(left['trade_date']))
+    order = np.argsort(left['ann_key'].to_numpy(), kind='stable')
+    merged = pd.merge_asof(left.iloc[order], table, on='ann_key', by='ts_code', allow_exact_matches=False)
+    merged = merged.dropna(subset=['end_key'])
+    return merged.drop(columns=['ann_key', 'end_key'])
+
+
+def disclosure_deadline(period: str) -> str:
+    """报告期的法定披露截止日：一季报 4月30日、半年报 8月31日、三季报 10月31日、年报 次年4月30日"""
+    year, md = str(period)[0:4], str(period)[4:8]
+    if md == '1231':
+        return '%s0430' % (int(year) + 1)
+    return year + {'0331': '0430', '0630': '0831', '0930': '1031'}.get(md, '1231')
+
+
+def report_periods(trade_dates, report_type: str = 'annual') -> list:
+    """交易日可能可见的报告期：上两年的年报[annual]，或上两年至今的全部季报[all]"""
+    years = sorted({int(str(d)[0:4]) for d in trade_dates})
+    periods = set()
+    for year in years:
+        for y in [year - 2, year - 1] + ([year] if report_type != 'annual' else []):
+            periods.update(['%s1231' % y] if report_type == 'annual' else
+                           ['%s0331' % y, '%s0630' % y, '%s0930' % y, '%s1231' % y])
+    return sorted(periods)
+
+
+# noinspection PyMethodMayBeStatic
+class FinaIndicatorPIT(object):
+    instance = None
+    table = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls.instance is None:
+            cls.instance = object.__new__(cls)
+        return cls.instance
+
+    def __init__(self):
+        if self.table is not None:
+            return
+        self.tsdatacapture: TuShareDataCapturer = TuShareDataCapturer()
+        self.lock = threading.RLock()
+        # {报告期: 已确认本地存在的股票}
+        self.known = {}
+        # {报告期: (获取日, 当日已获取过的股票)}
+        self.checked = {}
+        self.raw = {}
+        self.table = DataFrame()
+        # {report_type: 时点表}
+        self.views = {}
+
+    def ensure(self, periods: list, ts_codes: list):
+        """
+        报告期数据确保已在本地[只获取缺失的股票] 并载入时点表
+        只有取到数据的股票记为已知；披露期内未取到的股票[尚未公告] 每日最多重新获取一次，披露截止后不再获取
+        """
+        changed = False
+        today = get_today_Ymd()
+        for period in periods:
+            codes = set(ts_codes) - self.known.get(period, set())
+            checked_day, checked = self.checked.get(period, (None, set()))
+            if checked_day == today:
+                codes -= checked
+            if len(codes) == 0:
+                continue
+            # 600个一块 并发获取 失败分块自动重试；已落地的股票直接从本地读取
+            data = BatchFetcher().fetch(self.tsdatacapture.get_fina_indicator, sorted(codes), chunk_size=600,
+                                        period=period)
+            returned = set() if data is None or data.empty else set(data['ts_code'])
+            with self.lock:
+                closed = today > disclosure_deadline(period)
+                self.known[period] = self.known.get(period, set()) | (codes if closed else returned)
+                self.checked[period] = (today, (checked if checked_day == today else set()) | codes)
+                if len(returned) == 0:
+                    # 报告期尚未披露
+                    log.info("period %s fina_indicator is empty." % period)
+                    continue
+                raw = self.raw.get(period)
+                self.raw[period] = data if raw is None else pd.concat([raw, data], ignore_index=True)
+            changed = True
+        if changed:
+            self.rebuild()
+
+    def load_local(self):
+        """载入本地已落地的全部报告期 [不访问网络]"""
+        store = LocalMarketDataStore()
+        with self.lock:
+            for period in store.partitions(ENDPOINT):
+                data = store.read(ENDPOINT, period)
+                if not data.empty:
+                    self.raw[period] = data
+                    self.known[period] = set(data['ts_code'])
+        self.rebuild()
+
+    def rebuild(self):
+        with self.lock:
+            frames = [df for df in self.raw.values() if df is not None and not df.empty]
+            self.table = pit_table(pd.concat(frames, ignore_index=True)) if frames else DataFrame()
+            self.views = {}
+        log.info("FinaIndicatorPIT table rebuilt: %s periods, %s rows" % (len(self.raw), len(self.table.index)))
+
+    def view(self, report_type: str = 'annual') -> DataFrame:
+        """按报告类型筛选后的时点表"""
+        with self.lock:
+            if report_type not in self.views:
+                table = self.table
+                if not table.empty:
+                    if report_type == 'annual':
+                        table = table[table['end_date'].astype(str).str.endswith('1231')]
+                    table = latest_reports(table)
+                self.views[report_type] = table
+            return self.views[report_type]
+
+    def asof_frame(self, left: DataFrame, columns: list = None, report_type: str = 'annual') -> DataFrame:
+        """
+        left: ts_code、trade_date 列[多个交易日一次完成]
+        columns: 返回的财务指标列[默认全部]；时点表中不存在的列返回 NaN
+        """
+        self.ensure(report_periods(left['trade_date'].unique(), report_type), left['ts_code'].unique().tolist())
+        table = self.view(report_type)
+        if table.empty:
+            return None
+        if columns is not None:
+            table = table.reindex(columns=list(dict.fromkeys(['ts_code', 'ann_key', 'end_key'] + list(columns))))
+        return asof_merge(left[['ts_code', 'trade_date']], table).reset_index(drop=True)
+
+    def asof(self, trade_date: str, ts_codes: list, columns: list = None, report_type: str = 'annual') -> DataFrame:
+        """交易日 trade_date 可见的各股票最新报告[公告日早于交易日]"""
+        left = DataFrame({'ts_code': list(ts_codes), 'trade_date': str(trade_date)})
+        data = self.asof_frame(left, columns, report_type)
+        return None if data is None else data.drop(columns=['trade_date'])
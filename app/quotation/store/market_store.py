@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import inspect
+import logging
+import os
+import threading
+from functools import wraps
+
+import pandas as pd
+from pandas import DataFrame
+
+from conf.globalcfg import GlobalCfg
+from util.time_util import get_today_Ymd
+
+'''
+本地列式行情数据存储 当为单例
+-- 按 接口(endpoint)/交易日(trade_date) 分区，每个分区一个 parquet 文件
+-- 读穿透：先查本地分区，只向远程拉取本地缺失的 ts_code，拉取结果合并写回分区
+-- 离线模式：只读本地数据，从不访问网络，保证回测、因子校验可复现
+-- 命中/未命中计数：以 ts_code 为单位统计，远程请求次数单独统计
+
+目录结构：
+store_path/
+    daily/20230103.parquet
+    daily/20230103.full             全市场标志：该分区已含当日全部股票
+    daily_basic/20230103.parquet
+    adj_factor/20230103.parquet
+    fina_indicator/20221231.parquet 财务指标按报告期分区
+    pro_bar_E_hfq_D/20230103.parquet
+'''
+log = logging.getLogger("app")
+log_err = logging.getLogger("log_err")
+
+
+# noinspection PyMethodMayBeStatic
+class LocalMarketDataStore(object):
+    instance = None
+    store_path = None
+    file_suffix = '.parquet'
+    full_suffix = '.full'
+
+    def __new__(cls, *args, **kwargs):
+        if cls.instance is None:
+            cls.instance = object.__new__(cls)
+        return cls.instance
+
+    def __init__(self) -> object:
+        # 单例只初始化一次 保证计数不被重置
+        if self.store_path is not None:
+            return
+        store_info = GlobalCfg().get_store_info()
+        self.store_path = store_info.get("store_path", "../data/store")
+        self.offline = store_info.get("offline", "False").lower() == "true"
+        # {endpoint:{'hits':0,'misses':0,'requests':0}}
+        self.counters = {}
+        self.lock = threading.RLock()
+        os.makedirs(self.store_path, exist_ok=True)
+
+    def partition_file(self, endpoint: str, partition: str, suffix: str = None) -> str:
+        return os.path.join(self.store_path, endpoint, str(partition) + (suffix or self.file_suffix))
+
+    def read(self, endpoint: str, partition: str) -> DataFrame:
+        """读取分区，不存在返回空DataFrame"""
+        path = self.partition_file(endpoint, partition)
+        if not os.path.exists(path):
+            return DataFrame()
+        try:
+            return pd.read_parquet(path)
+        except Exception as e:
+            log_err.error("LocalMarketDataStore read %s failed! %s" % (path, e))
+            return DataFrame()
+
+    def write(self, endpoint: str, partition: str, df: DataFrame, full: bool = False):
+        """
+        合并写入分区 [先写临时文件再替换 防止多进程读到半个文件]
+        full=True: 标记该分区已含全市场数据
+        """
+        if df is None or df.empty:
+            return
+        with self.lock:
+            path = self.partition_file(endpoint, partition)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            local = self.read(endpoint, partition)
+            data = pd.concat([local, df], axis=0, ignore_index=True).drop_duplicates(ignore_index=True)
+            tmp_path = "%s.%s.tmp" % (path, os.getpid())
+            data.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+            if full:
+                open(self.partition_file(endpoint, partition, self.full_suffix), 'w').close()
+
+    def is_full(self, endpoint: str, partition: str) -> bool:
+        return os.path.exists(self.partition_file(endpoint, partition, self.full_suffix))
+
+    def partitions(self, endpoint: str) -> list:
+        """某接口本地已有分区 升序"""
+        path = os.path.join(self.store_path, endpoint)
+        if not os.path.isdir(path):
+            return []
+        return sorted(f[:-len(self.file_suffix)] for f in os.listdir(path) if f.endswith(self.file_suffix))
+
+    def load_range(self, endpoint: str, start_date: str, end_date: str, ts_codes: list = None) -> DataFrame:
+        """
+        读取 start_date——end_date 内全部本地分区 [不访问网络]
+        ts_codes: 仅保留指定股票
+        """
+        parts = [p for p in self.partitions(endpoint) if start_date <= p <= end_date]
+        frames = [self.read(endpoint, p) for p in parts]
+        if len(frames) == 0:
+            return DataFrame()
+        data = pd.concat(frames, axis=0, ignore_index=True)
+        if ts_codes:
+            data = data[data['ts_code'].isin(ts_codes)].reset_index(drop=True)
+        return data
+
+    def count(self, endpoint: str, hits: int = 0, misses: int = 0, requests: int = 0):
+        with self.lock:
+            counter = self.counters.setdefault(endpoint, {'hits': 0, 'misses': 0, 'requests': 0})
+            counter['hits'] += hits
+            counter['misses'] += misses
+            counter['requests'] += requests
+
+    def stats(self) -> DataFrame:
+        """命中/未命中统计 [以 ts_code 为单位]"""
+        with self.lock:
+            stats = DataFrame(self.counters).T
+        if not stats.empty:
+            stats['hit_rate'] = stats['hits'] / (stats['hits'] + stats['misses']).where(lambda x: x > 0)
+        return stats
+
+    def reset_stats(self):
+        with self.lock:
+            self.counters = {}
+
+    def read_through(self, endpoint: str, partition: str, ts_code: str, fetch) -> DataFrame:
+        """
+        读穿透
+        endpoint:  接口分区名
+        partition: 分区值 [交易日/报告期]
+        ts_code:   逗号分隔的股票代码 ''或None表示全市场
+        fetch:     fetch(ts_code) 远程获取函数，只会传入本地缺失的股票
+        """
+        local = self.read(endpoint, partition)
+        codes = [c for c in ts_code.split(',') if c] if ts_code else []
+        # 当日数据可能尚未入库完整 不写入本地
+        persist = str(partition) < get_today_Ymd()
+        if len(codes) == 0:
+            if not local.empty and self.is_full(endpoint, partition):
+                self.count(endpoint, hits=len(local.index))
+                return local
+            if self.offline:
+                self.count(endpoint, hits=len(local.index))
+                return local
+            data = fetch('')
+            self.count(endpoint, misses=0 if data is None else len(data.index), requests=1)
+            if persist and data is not None and not data.empty:
+                self.write(endpoint, partition, data, full=True)
+            return data
+        if local.empty:
+            hit = local
+            missing = codes
+        else:
+            hit = local[local['ts_code'].isin(codes)]
+            local_codes = set(hit['ts_code'])
+            missing = [c for c in codes if c not in local_codes]
+            if len(missing) > 0 and self.is_full(endpoint, partition):
+                # 全市场分区中不存在的股票 当日确无数据[停牌等]
+                missing = []
+        self.count(endpoint, hits=len(codes) - len(missing), misses=len(missing))
+        if len(missing) == 0 or self.offline:
+            return hit.reset_index(drop=True)
+        self.count(endpoint, requests=1)
+        data = fetch(",".join(missing))
+        if data is None or data.empty:
+            return hit.reset_index(drop=True) if not hit.empty else data
+        if persist:
+            self.write(endpoint, partition, data)
+        return pd.concat([hit, data], axis=0, ignore_index=True)
+
+
+def read_through(endpoint, partition_arg: str = 'trade_date', cacheable=None):
+    """
+    TuShareDataCapturer 接口读穿透装饰器
+    endpoint:      分区名，或 endpoint(params) -> str
+    partition_arg: 分区参数名；未传时若 start_date==end_date 则以 start_date 分区
+    cacheable:     cacheable(params) -> bool 不可缓存的请求直接访问远程
+    无分区的区间请求：在线时直接访问远程，离线时读取区间内本地分区
+    """
+
+    def _read_through(func):
+        sig = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            bound = sig.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            params = dict(bound.arguments)
+            params.pop('self')
+            store = LocalMarketDataStore()
+            name = endpoint(params) if callable(endpoint) else endpoint
+            partition = params.get(partition_arg)
+            if not partition and params.get('start_date') and params.get('start_date') == params.get('end_date'):
+                partition = params.get('start_date')
+            if cacheable is not None and not cacheable(params):
+                partition = None
+            if not partition:
+                if store.offline:
+                    codes = [c for c in (params.get('ts_code') or '').split(',') if c]
+                    return store.load_range(name, params.get('start_date') or '',
+                                            params.get('end_date') or '99991231', codes)
+                return func(self, **params)
+
+            def fetch(ts_code):
+                fetch_params = dict(params)
+                fetch_params['ts_code'] = ts_code
+                return func(self, **fetch_params)
+
+            return store.read_through(name, partition, params.get('ts_code'), fetch)
+
+        return wrapper
+
+    return _read_through
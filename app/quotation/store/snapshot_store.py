@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import logging
+import os
+import threading
+
+import pyarrow.parquet as pq
+from pandas import DataFrame
+
+from conf.globalcfg import GlobalCfg
+from util.time_util import get_today_Ymd
+
+'''
+历史时点快照存储 当为单例
+-- 按 快照名/版本/交易日 每个交易日一个压缩列式文件[parquet zstd]，保存合并、单位换算后的完整结果
+-- 历史快照不再变化：只构建一次，之后直接读取；当日及之后的快照数据可能不完整，不落地
+-- 读取支持列投影[只解码需要的列]及内存映射
+-- iter_range 按交易日依次产出快照，缺失的快照按需构建，内存中只保留当前一个
+-- 快照构建逻辑变化时升级 version，旧版本快照不再读取
+
+目录结构：
+snapshot_path/
+    base_stock_infos/v2/20230103.parquet
+
+usage:
+    store = SnapshotStore()
+    data = store.get('base_stock_infos', '20230103', build, columns=['ts_code', 'roe'])
+    for trade_date, data in store.iter_range('base_stock_infos', trade_dates, build):
+        ...
+'''
+log = logging.getLogger("app")
+log_err = logging.getLogger("log_err")
+
+
+# noinspection PyMethodMayBeStatic
+class SnapshotStore(object):
+    instance = None
+    snapshot_path = None
+    file_suffix = '.parquet'
+    # v2: 财务指标改为按公告日 as-of 的时点数据
+    version = 'v2'
+
+    def __new__(cls, *args, **kwargs):
+        if cls.instance is None:
+            cls.instance = object.__new__(cls)
+        return cls.instance
+
+    def __init__(self) -> object:
+        if self.snapshot_path is not None:
+            return
+        store_info = GlobalCfg().get_store_info()
+        self.snapshot_path = store_info.get("snapshot_path", "../data/snapshot")
+        self.compression = store_info.get("snapshot_compression", "zstd")
+        self.lock = threading.RLock()
+        os.makedirs(self.snapshot_path, exist_ok=True)
+
+    def snapshot_file(self, name: str, trade_date: str) -> str:
+        return os.path.join(self.snapshot_path, name, self.version, str(trade_date) + self.file_suffix)
+
+    def exists(self, name: str, trade_date: str) -> bool:
+        return os.path.exists(self.snapshot_file(name, trade_date))
+
+    def dates(self, name: str) -> list:
+        """已落地的快照交易日 升序"""
+        path = os.path.join(self.snapshot_path, name, self.version)
+        if not os.path.isdir(path):
+            return []
+        return sorted(f[:-len(self.file_suffix)] for f in os.listdir(path) if f.endswith(self.file_suffix))
+
+    def read(self, name: str, trade_date: str, columns: list = None, memory_map: bool = True) -> DataFrame:
+        """读取快照，不存在返回 None；columns 只读取指定列"""
+        path = self.snapshot_file(name, trade_date)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pq.read_table(path, columns=columns, memory_map=memory_map).to_pandas()
+        except Exception as e:
+            log_err.error("SnapshotStore read %s failed! %s" % (path, e))
+            return None
+
+    def write(self, name: str, trade_date: str, df: DataFrame):
+        """写入快照 [先写临时文件再替换 防止多进程读到半个文件]"""
+        if df is None or df.empty:
+            return
+        path = self.snapshot_file(name, trade_date)
+        with self.lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = "%s.%s.tmp" % (path, os.getpid())
+            df.to_parquet(tmp_path, index=False, compression=self.compression)
+            os.replace(tmp_path, path)
+
+    def get(self, name: str, trade_date: str, build, columns: list = None) -> DataFrame:
+        """
+        读取快照，不存在时 build(trade_date) 构建；历史交易日的快照构建后落地
+        columns: 只返回指定列
+        """
+        data = self.read(name, trade_date, columns)
+        if data is not None:
+            return data
+        data = build(trade_date)
+        if data is not None and str(trade_date) < get_today_Ymd():
+            self.write(name, trade_date, data)
+            log.info("SnapshotStore %s %s built." % (name, trade_date))
+        if data is not None and columns is not None:
+            return data[columns]
+        return data
+
+    def iter_range(self, name: str, trade_dates: list, build=None, columns: list = None):
+        """
+        依次产出 (交易日, 快照)
+        build 为空时只读取已落地的快照，缺失的交易日跳过
+        """
+        for trade_date in trade_dates:
+            if build is None:
+                data = self.read(name, trade_date, columns)
+                if data is None:
+                    continue
+            else:
+                data = self.get(name, trade_date, build, columns)
+            yield trade_date, data
+
+    def range_dates(self, name: str, start_date: str, end_date: str) -> list:
+        """start_date——end_date 内已落地的快照交易日"""
+        return [d for d in self.dates(name) if start_date <= d <= end_date]
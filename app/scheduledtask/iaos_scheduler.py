@@ -12,6 +12,7 @@ from flask_apscheduler import APScheduler
 
 from db.myredis.redis_lock import RedisLock
 from entity.singleton import Singleton
+from quantization.timing.market_regime import MarketRegime
 from quotation.cache.cache import RemoteBasicDataCache, LocalBasicDataCache
 from util.sys_util import get_mac_address
 
@@ -21,6 +22,7 @@ log_err = logging.getLogger("log_err")
 定时任务
 1- 基础数据定时更新
 2- 选股策略每日执行，更新股票池 [每个策略模型一个任务，利用分布式锁尽可能进程间均匀执行]
+3- 大盘择时状态每日收盘后增量更新 [每个进程各自维护内存中的状态]
 
 ！注意定时任务的时间间隔：数据缓存在策略前，策略之间的时间间隔保留是尽可能完全执行结束
 ! trigger: 触发器类型：“date”、“cron”、“interval” 
@@ -86,6 +88,17 @@ class IAOSTask(Singleton):
         except Exception as e:
             log_err.error("execute IAOSTask __update_local_base_data failed. {}".format(e))
 
+    def __update_market_regime(self):
+        """
+        大盘择时状态增量更新
+        """
+        try:
+            log.info("start IAOSTask __update_market_regime.")
+            if MarketRegime().refresh():
+                log.info("execute IAOSTask __update_market_regime success.")
+        except Exception as e:
+            log_err.error("execute IAOSTask __update_market_regime failed. {}".format(e))
+
     def __pick_stock(self):
         """
         todo
@@ -138,6 +151,11 @@ class IAOSTask(Singleton):
                                day_of_week='0-6', hour=0, minute=55,
                                start_date='2023-3-1', end_date='2099-3-1')
 
+        # 每周一到周五的17点30分执行[指数、个股日线16点前入库]
+        self.scheduler.add_job(id='4', func=self.__update_market_regime, trigger='cron',
+                               day_of_week='mon-fri', hour=17, minute=30,
+                               start_date='2023-3-1', end_date='2099-3-1')
+
         # 从2023年3月1日开始后的的每周一到周五的23点23分执行
         # self.scheduler.add_job(id='3', func=self.__pick_stock, 'cron', day_of_week='mon-fri', hour=23, minute=23,
         #                        start_date='2023-3-1')
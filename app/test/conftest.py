@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from quotation.store.market_store import LocalMarketDataStore
+from quotation.store.snapshot_store import SnapshotStore
+
+
+@pytest.fixture
+def market_store(monkeypatch, tmp_path):
+    """本地行情存储 指向临时目录、在线模式、计数清零；测试结束后还原单例状态"""
+    store = LocalMarketDataStore()
+    monkeypatch.setattr(store, 'store_path', str(tmp_path / 'store'))
+    monkeypatch.setattr(store, 'offline', False)
+    monkeypatch.setattr(store, 'counters', {})
+    return store
+
+
+@pytest.fixture
+def snapshot_store(monkeypatch, tmp_path):
+    """快照存储 指向临时目录；测试结束后还原"""
+    store = SnapshotStore()
+    monkeypatch.setattr(store, 'snapshot_path', str(tmp_path / 'snapshot'))
+    return store
+
+
+@pytest.fixture
+def fresh_singleton(monkeypatch):
+    """
+    reset(cls, guard): 置空单例 instance 及初始化标志属性，下一次构造重新初始化
+    测试结束后还原原有单例
+    """
+    def reset(cls, guard: str = None):
+        monkeypatch.setattr(cls, 'instance', None)
+        if guard is not None:
+            monkeypatch.setattr(cls, guard, None)
+
+    return reset
+
+
+@pytest.fixture
+def daily_prices():
+    """
+    随机游走日线行记录工厂
+    make(n, days, seed, start_date) -> ts_code/trade_date/open/high/low/close/vol，ts_code 为 000000.SZ 起
+    """
+    def make(n: int = 3, days: int = 300, seed: int = 5, start_date: str = '2021-01-01') -> pd.DataFrame:
+        rng = np.random.default_rng(seed)
+        dates = pd.bdate_range(start_date, periods=days).strftime('%Y%m%d')
+        rows = []
+        for i in range(n):
+            close = 10 * np.cumprod(1 + rng.normal(0, 0.02, days))
+            open_ = close * (1 + rng.normal(0, 0.01, days))
+            rows.append(pd.DataFrame({'ts_code': '%06d.SZ' % i, 'trade_date': dates, 'open': open_,
+                                      'high': np.maximum(open_, close) * 1.01,
+                                      'low': np.minimum(open_, close) * 0.99,
+                                      'close': close, 'vol': rng.uniform(1e4, 1e5, days)}))
+        return pd.concat(rows, ignore_index=True)
+
+    return make
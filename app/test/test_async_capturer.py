@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web
+
+from quotation.captures.async_capturer import AsyncTuShareCapturer, ingest_daily_async
+from util.time_util import get_today_Ymd
+
+
+class StubTuShare(object):
+    """本地 tushare HTTP 接口桩：每个请求延迟 delay 秒，记录最大在途请求数"""
+
+    def __init__(self, delay: float = 0.2, fail_first: int = 0):
+        self.delay = delay
+        self.fail_first = fail_first
+        self.requests = 0
+        self.inflight = 0
+        self.max_inflight = 0
+
+    async def handle(self, request):
+        body = await request.json()
+        self.requests += 1
+        seq = self.requests
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        await asyncio.sleep(self.delay)
+        self.inflight -= 1
+        if seq <= self.fail_first:
+            return web.json_response({'code': 40203, 'msg': '抱歉，您每分钟最多访问该接口500次', 'data': None})
+        params = body['params']
+        codes = params.get('ts_code', '000001.SZ,600000.SH').split(',')
+        items = [[code, params.get('trade_date', ''), 10.0] for code in codes]
+        return web.json_response({'code': 0, 'msg': '',
+                                  'data': {'fields': ['ts_code', 'trade_date', 'close'], 'items': items}})
+
+
+async def run_with_stub(stub, func, concurrency=5):
+    app = web.Application()
+    app.router.add_post('/', stub.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        capturer = AsyncTuShareCapturer(token='test', url='http://127.0.0.1:%s/' % port, concurrency=concurrency,
+                                        time_interval=0)
+        capturer.calls_per_minute = 600000
+        async with capturer:
+            return await func(capturer)
+    finally:
+        await runner.cleanup()
+
+
+def test_gather_dates_overlaps_requests():
+    stub = StubTuShare(delay=0.2)
+    dates = ['202301%02d' % d for d in range(3, 13)]
+    data = asyncio.run(run_with_stub(stub, lambda c: c.gather_dates('daily', dates)))
+    assert len(data.index) == 20 and sorted(data['trade_date'].unique()) == dates
+    # 请求重叠 并发受信号量限制
+    assert stub.max_inflight == 5
+
+
+def test_gather_chunks_and_retry():
+    stub = StubTuShare(delay=0.01, fail_first=2)
+    codes = ['%06d.SZ' % i for i in range(25)]
+    data = asyncio.run(run_with_stub(stub, lambda c: c.gather_chunks('daily', codes, chunk_size=10,
+                                                                     trade_date='20230103')))
+    assert sorted(data['ts_code']) == codes
+    # 前两个请求返回限频错误码后重试
+    assert stub.requests == 5
+
+
+def test_ingest_daily(market_store):
+    store = market_store
+    stub = StubTuShare(delay=0.01)
+    saved = asyncio.run(run_with_stub(stub, lambda c: ingest_daily_async(c, ['20230103', '20230104',
+                                                                          get_today_Ymd()])))
+    # 当日数据不获取、不落地
+    assert saved == {'daily': ['20230103', '20230104']} and store.partitions('daily') == ['20230103', '20230104']
+    assert store.is_full('daily', '20230103') and len(store.read('daily', '20230104').index) == 2
+    # 已是全市场的分区不再请求
+    asyncio.run(run_with_stub(stub, lambda c: ingest_daily_async(c, ['20230103', '20230104'])))
+    assert stub.requests == 2
@@ -0,0 +1,90 @@
+import pandas as pd
+
+from quotation.cache import cache
+from quotation.cache.cache import RemoteBasicDataCache, LocalBasicDataCache, snapshot_key
+from quotation.cleaning.data_clean import BaseDataClean
+
+
+class FakeRedis(object):
+    """内存版 redis [仅实现缓存用到的命令]"""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.published = []
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+        if ex is not None:
+            self.expires[key] = ex
+
+    def getset(self, key, value):
+        old = self.data.get(key)
+        self.set(key, value)
+        return old
+
+    def incr(self, key):
+        self.set(key, int(self.data.get(key, b'0')) + 1)
+        return int(self.data[key])
+
+    def expire(self, key, seconds):
+        self.expires[key] = seconds
+
+    def persist(self, key):
+        self.expires.pop(key, None)
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+
+def fake_snapshot(monkeypatch, rows):
+    df = pd.DataFrame({'ts_code': ['%06d.SZ' % i for i in range(rows)], 'industry': '银行',
+                       'float_share': range(rows)})
+    monkeypatch.setattr(BaseDataClean, 'init_base_stock_infos', classmethod(lambda c: df))
+    monkeypatch.setattr(BaseDataClean, 'stocks_pool', df[['ts_code']])
+    monkeypatch.setattr(BaseDataClean, 'init_smb_industry_map',
+                        classmethod(lambda c: BaseDataClean.cal_smb_industry_map(df)))
+
+
+def test_versioned_refresh(monkeypatch, tmp_path):
+    redis = FakeRedis()
+    monkeypatch.setattr(LocalBasicDataCache.shared_store, 'enabled', False)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'test' / 'testdata').mkdir(parents=True)
+    monkeypatch.setattr(RemoteBasicDataCache, 'rediscli', redis)
+    monkeypatch.setattr(LocalBasicDataCache, 'rediscli', redis)
+    monkeypatch.setattr(LocalBasicDataCache, 'version', None)
+    monkeypatch.setattr(LocalBasicDataCache, 'base_stock_infos', None)
+
+    # 尚无快照 不阻塞
+    LocalBasicDataCache.refresh()
+    assert LocalBasicDataCache.base_stock_infos is None
+
+    fake_snapshot(monkeypatch, 10)
+    assert RemoteBasicDataCache.refresh(is_request=True)
+    LocalBasicDataCache.refresh()
+    version = LocalBasicDataCache.version
+    assert version.endswith('000001') and len(LocalBasicDataCache.base_stock_infos.index) == 10
+
+    # 新版本写入中：指针未切换前 本地仍为旧快照
+    fake_snapshot(monkeypatch, 20)
+    RemoteBasicDataCache.store_base_stock_infos('2')
+    # 未发布的新版本带过期时间 [更新失败不遗留]
+    assert redis.expires[snapshot_key('base_stock_infos', '2')] == RemoteBasicDataCache.expire_seconds
+    LocalBasicDataCache.refresh()
+    assert LocalBasicDataCache.version == version and len(LocalBasicDataCache.base_stock_infos.index) == 10
+
+    RemoteBasicDataCache.store_smb_industry_map('2')
+    RemoteBasicDataCache.publish('2')
+    assert redis.published[-1] == (cache.REFRESH_CHANNEL, '2')
+    assert redis.expires[snapshot_key('base_stock_infos', version)] == RemoteBasicDataCache.expire_seconds
+    assert all(snapshot_key(name, '2') not in redis.expires for name in cache.SNAPSHOT_KEYS)
+    LocalBasicDataCache.refresh()
+    assert LocalBasicDataCache.version == '2' and len(LocalBasicDataCache.base_stock_infos.index) == 20
+    assert LocalBasicDataCache.industry_set == {'银行'}
@@ -0,0 +1,34 @@
+import time
+
+import pandas as pd
+
+from quotation.captures.batch_fetcher import BatchFetcher, TokenBucket
+
+
+def test_fetch_retry_failed_chunks_only():
+    calls = []
+
+    def get_daily(ts_code, trade_date):
+        calls.append(ts_code)
+        # 第一次获取 000003.SZ 所在分块失败
+        if '000003.SZ' in ts_code and calls.count(ts_code) == 1:
+            return None
+        return pd.DataFrame({'ts_code': ts_code.split(','), 'trade_date': trade_date})
+
+    fetcher = BatchFetcher()
+    codes = ['%06d.SZ' % i for i in range(7)]
+    data = fetcher.fetch(get_daily, codes, chunk_size=2, trade_date='20230103')
+    assert sorted(data['ts_code']) == codes
+    assert len(calls) == 5
+    assert calls.count('000002.SZ,000003.SZ') == 2
+    metrics = fetcher.metrics()
+    assert metrics[metrics['endpoint'] == 'get_daily']['ok'].sum() == 4
+
+
+def test_token_bucket_limit():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # 首个令牌立即可用 其余每个 1/50 秒
+    assert time.monotonic() - start >= 0.09
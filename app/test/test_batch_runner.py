@@ -0,0 +1,15 @@
+import numpy as np
+
+from quantization.strategy.batch_runner import BacktraderBatchRunner, feed_frames, run_cerebro
+from quantization.strategy.strategy_ma import MAStrategy
+
+
+def test_batch_run(daily_prices):
+    frames = feed_frames(daily_prices(n=6, days=250, seed=2))
+    runner = BacktraderBatchRunner('quantization.strategy.strategy_ma', 'MAStrategy')
+    results = runner.run_frames(frames, {'maperiod': [5, 15]}, processes=2, batch_size=2)
+    assert len(results.index) == 12 and results['total_return'].is_monotonic_decreasing
+    # 与单独回测一致
+    row = results[(results['ts_code'] == '000001.SZ') & (results['maperiod'] == 15)].iloc[0]
+    single = run_cerebro(frames['000001.SZ'], MAStrategy, {'maperiod': [15]})[0]
+    assert np.isclose(row['final_value'], single['final_value']) and row['trades'] == single['trades']
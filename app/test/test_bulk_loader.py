@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+from db.mymysql.bulk_loader import MySqlBulkLoader, sql_literals, upsert_batches, write_infile
+
+
+class FakeCursor(object):
+
+    def __init__(self, fail_on: str = None):
+        self.statements = []
+        self.fail_on = fail_on
+
+    def execute(self, sql, param=None):
+        if self.fail_on and sql.startswith(self.fail_on):
+            raise Exception("fake failure")
+        self.statements.append((sql, param))
+        return 1
+
+    def executemany(self, sql, param):
+        self.statements.append((sql, param))
+        return len(param)
+
+    def close(self):
+        pass
+
+
+class FakeConn(object):
+
+    def __init__(self):
+        self.committed = False
+        self.rolled_back = False
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        pass
+
+
+class FakePool(object):
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.conn = FakeConn()
+
+    def getconn(self):
+        return self.cursor, self.conn
+
+
+def new_loader(fresh_singleton, cursor, mode='upsert', max_bytes=4 * 1024 * 1024):
+    fresh_singleton(MySqlBulkLoader, 'pool')
+    loader = MySqlBulkLoader()
+    loader.pool = FakePool(cursor)
+    loader.mode = mode
+    loader.max_bytes = max_bytes
+    return loader
+
+
+def prices(n: int = 3) -> pd.DataFrame:
+    return pd.DataFrame({'ts_code': ['%06d.SZ' % i for i in range(n)], 'close': np.arange(n) + 0.1,
+                         'asset': 'E', 'trade_date': '20230103'})
+
+
+def test_sql_literals():
+    df = pd.DataFrame({'ts_code': ["a'b", None], 'close': [0.1 + 0.2, np.nan], 'vol': [3, 4],
+                       'flag': [True, False], 'mv': [np.inf, 1e-5]})
+    rows = sql_literals(df)
+    assert rows[0] == "('a\\'b',0.30000000000000004,3,1,NULL)"
+    assert rows[1] == "(NULL,NULL,4,0,1e-05)"
+
+
+def test_upsert_batches_byte_budget():
+    df = prices(1000)
+    sqls = list(upsert_batches('sample_stk_price', df, max_bytes=4096))
+    assert len(sqls) > 1 and all(len(s) <= 4096 for s in sqls)
+    assert sqls[0].startswith("insert into sample_stk_price (`ts_code`,`close`,`asset`,`trade_date`) values (")
+    assert sqls[0].endswith("on duplicate key update `ts_code`=values(`ts_code`),`close`=values(`close`),"
+                            "`asset`=values(`asset`),`trade_date`=values(`trade_date`)")
+    assert sum(s.count("'E'") for s in sqls) == 1000
+
+
+def test_write_infile(tmp_path):
+    path = str(tmp_path / 'prices.tsv')
+    df = pd.DataFrame({'ts_code': ['a\tb', 'c'], 'close': [1.5, np.nan]})
+    write_infile(df, path)
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == 'a\\tb\t1.5\nc\t\\N\n'
+
+
+def test_replace_partitions_in_one_transaction(fresh_singleton):
+    cursor = FakeCursor()
+    loader = new_loader(fresh_singleton, cursor, max_bytes=1024)
+    df = pd.concat([prices(50), pd.DataFrame({'ts_code': ['000001.SH'], 'close': [3000.0], 'asset': 'I',
+                                              'trade_date': '20230103'})], ignore_index=True)
+    loader.replace_partitions('sample_stk_price', df, partition_cols=['trade_date', 'asset'])
+    sql, param = cursor.statements[0]
+    assert sql == "delete from sample_stk_price where `trade_date`=%s and `asset`=%s"
+    assert param == [('20230103', 'E'), ('20230103', 'I')]
+    assert len(cursor.statements) > 2 and all(s.startswith('insert') for s, _ in cursor.statements[1:])
+    assert loader.pool.conn.committed
+
+
+def test_rollback_and_load_data(fresh_singleton):
+    cursor = FakeCursor(fail_on='insert')
+    loader = new_loader(fresh_singleton, cursor)
+    assert loader.upsert('sample_stk_price', prices()) == 0
+    assert loader.pool.conn.rolled_back and not loader.pool.conn.committed
+
+    cursor = FakeCursor()
+    loader = new_loader(fresh_singleton, cursor, mode='load_data')
+    loader.delete_partitions('sample_stk_price', 'trade_date', ['20230103', '20230201', '20230301'], batch_size=2)
+    loader.upsert('sample_stk_price', prices())
+    assert [p for _, p in cursor.statements[:2]] == [('20230103', '20230201'), ('20230301',)]
+    assert cursor.statements[2][0].startswith("load data local infile '")
+    assert cursor.statements[2][0].endswith("replace into table sample_stk_price character set utf8 "
+                                            "(`ts_code`,`close`,`asset`,`trade_date`)")
@@ -0,0 +1,53 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from quotation.cache.codec import CacheCodec
+from quotation.cleaning.data_clean import BaseDataClean
+
+
+def stock_infos(n=3000):
+    rng = np.random.default_rng(1)
+    return pd.DataFrame({'ts_code': ['%06d.SZ' % i for i in range(n)],
+                         'name': ['股票%s' % i for i in range(n)],
+                         'industry': rng.choice(['银行', '软件', '医药', '汽车', '电力'], n),
+                         'area': rng.choice(['深圳', '北京', '上海'], n),
+                         'market': rng.choice(['主板', '创业板'], n),
+                         'circ_mv': rng.uniform(1e4, 1e7, n),
+                         'float_share': rng.uniform(1e3, 1e6, n),
+                         'pe': rng.normal(20, 5, n)})
+
+
+def test_frame_round_trip():
+    codec = CacheCodec()
+    data = stock_infos()
+    content = codec.dumps('base_stock_infos', data)
+    assert len(content) < len(pickle.dumps(data))
+    res = codec.loads('base_stock_infos', content)
+    assert res['industry'].dtype == 'category'
+    pd.testing.assert_frame_equal(res, data, check_categorical=False, check_dtype=False)
+    assert len(res.query("industry=='银行'").index) == (data['industry'] == '银行').sum()
+    stats = codec.stats().loc['base_stock_infos']
+    assert stats['codec'] == 'arrow' and stats['size'] == len(content) and stats['decode_time'] > 0
+
+
+def test_smb_industry_map_round_trip():
+    codec = CacheCodec()
+    smb_industry_map = BaseDataClean.cal_smb_industry_map(stock_infos())
+    res = codec.loads('smb_industry_map', codec.dumps('smb_industry_map', smb_industry_map))
+    assert list(res.keys()) == list(smb_industry_map.keys())
+    for cap, industries in smb_industry_map.items():
+        assert list(res[cap].keys()) == list(industries.keys())
+        for industry, df in industries.items():
+            pd.testing.assert_frame_equal(res[cap][industry], df, check_categorical=False, check_dtype=False)
+
+
+def test_fallback_pickle():
+    codec = CacheCodec()
+    industry_set = {'银行', '软件'}
+    content = codec.dumps('industry_set', industry_set)
+    assert codec.stats().loc['industry_set', 'codec'] == 'pickle'
+    assert codec.loads('industry_set', content) == industry_set
+    # 兼容原有 pickle 缓存
+    assert codec.loads('stocks_pool', pickle.dumps(stock_infos(10))).shape == (10, 8)
@@ -0,0 +1,54 @@
+import pandas as pd
+
+from quantization.securitypick.condition.condition_filter import ConditionFilter
+
+
+def load_data():
+    return pd.read_csv("./testdata/base_stock_infos.csv", index_col=0, dtype={'symbol': str})
+
+
+def test_filter_parity():
+    data = load_data()
+    cf = ConditionFilter(data)
+    condtions = {'industry': '银行', 'pe_ttm': [3, 10], 'pb': [None, 1]}
+    res = cf.filter(condtions)
+    expected = data[(data['industry'] == '银行') & (data['pe_ttm'] >= 3) & (data['pe_ttm'] < 10) & (data['pb'] < 1)]
+    pd.testing.assert_frame_equal(res, expected)
+    assert len(res.index) > 0
+    # 左闭右开
+    pe = data['pe'].dropna().iloc[0]
+    assert (cf.filter({'pe': [pe, pe]}).index.size == 0) and (pe in cf.filter({'pe': [pe, pe + 1e-6]})['pe'].values)
+    assert len(cf.filter({'industry': '不存在的行业'}).index) == 0
+    assert len(cf.filter({'not_a_col': 1}).index) == len(data.index)
+
+
+def test_mask_matches_filter():
+    data = load_data()
+    cf = ConditionFilter(data)
+    condtions = {'industry': '银行', 'area': '深圳', 'pe_ttm': [3, 10], 'pb': [0, 3], 'roe': [5, 50]}
+    res = cf.filter(condtions)
+    # 重复筛选结果一致
+    for _ in range(3):
+        pd.testing.assert_frame_equal(data[cf.mask(condtions)], res)
+
+
+def test_stock_pick_reuses_filter(monkeypatch):
+    from quantization.securitypick.condition.conditionstockpick01 import ConditonStockPick01
+    from quotation.cache.cache import LocalBasicDataCache
+    data = load_data()
+    monkeypatch.setattr(LocalBasicDataCache, 'base_stock_infos', data)
+    monkeypatch.setattr(ConditonStockPick01, 'condition_filter', None)
+    condtions = {'industry': '银行', 'pe_ttm': [3, 10]}
+    first = ConditonStockPick01().get_target_stock_pool(**condtions)
+    cf = ConditonStockPick01.condition_filter
+    assert set(cf.sorted_indexes.keys()) == {'pe_ttm'} and set(cf.hash_indexes.keys()) == {'industry'}
+    indexes = cf.sorted_indexes['pe_ttm'], cf.hash_indexes['industry']
+    # 同一快照 新实例复用引擎及已构建的索引
+    second = ConditonStockPick01().get_target_stock_pool(**condtions)
+    assert ConditonStockPick01.condition_filter is cf
+    assert cf.sorted_indexes['pe_ttm'] is indexes[0] and cf.hash_indexes['industry'] is indexes[1]
+    pd.testing.assert_frame_equal(first, second)
+    # 快照更新后重建
+    monkeypatch.setattr(LocalBasicDataCache, 'base_stock_infos', data.copy())
+    ConditonStockPick01().get_target_stock_pool(**condtions)
+    assert ConditonStockPick01.condition_filter is not cf
@@ -25,7 +25,17 @@ def test_init_stocks_pool():
 
 
 def test_init_smb_industry_map():
-    assert False
+    dfall = pd.DataFrame({'ts_code': ['%06d.SZ' % i for i in range(10)],
+                          'industry': ['银行', '银行', '软件', '软件', '银行', '软件', '银行', '软件', '银行', '软件'],
+                          'float_share': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0]})
+    smb_industry_map = BaseDataClean.cal_smb_industry_map(dfall)
+    assert list(smb_industry_map.keys()) == ['小盘股', '中盘股', '大盘股']
+    assert smb_industry_map['小盘股']['银行']['ts_code'].tolist() == ['000000.SZ', '000001.SZ', '000004.SZ']
+    assert smb_industry_map['小盘股']['软件']['ts_code'].tolist() == ['000002.SZ', '000003.SZ']
+    assert smb_industry_map['中盘股']['软件']['ts_code'].tolist() == ['000005.SZ', '000007.SZ']
+    assert smb_industry_map['大盘股']['软件']['ts_code'].tolist() == ['000009.SZ']
+    assert len(BaseDataClean.mid_cap_stocks.index) == 4
+    assert BaseDataClean.industry_set == {'银行', '软件'}
 
 
 def test_get_data_percentile():
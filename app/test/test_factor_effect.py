@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+from pandas import DataFrame
+
+from quantization.factor_validity_check.factor_effect import cal_factor_effect, FactorEffectPool, \
+    ports_profit_frame, monthly_records, monthly_frames
+from quantization.factor_validity_check.price_panel import PricePanel, cal_ports_return
+
+
+def random_panel(t=13, n=40, f=5, seed=3):
+    rng = np.random.default_rng(seed)
+    close = np.cumprod(1 + rng.normal(0.01, 0.05, (t, n)), axis=0) * 10
+    panel = PricePanel(dates=['2022%04d' % i for i in range(t)], codes=['%06d.SZ' % i for i in range(n)],
+                       close=close, cmv=rng.uniform(1, 100, (t, n)),
+                       benchmark_close=np.cumprod(1 + rng.normal(0.005, 0.03, t)))
+    factors = rng.normal(size=(f, t, n))
+    return panel, factors, ['fac_%s' % i for i in range(f)]
+
+
+def test_cal_factor_effect():
+    monthly = DataFrame([[0.02, 0.01], [0.0, 0.0], [0.0, 0.0], [0.0, 0.0], [0.05, 0.04], [0.01, 0.01]],
+                        index=['port_1', 'port_2', 'port_3', 'port_4', 'port_5', 'benchmark'])
+    effect = cal_factor_effect(monthly)
+    # port_5 赢家组合 port_1 输家组合
+    assert effect['win_total_return'] == effect['total_return']['port_5']
+    assert effect['loss_total_return'] == effect['total_return']['port_1']
+    assert effect['win_prob'] == 1.0 and effect['loss_prob'] == 0.0
+    np.testing.assert_allclose(effect['excess'][0],
+                               effect['annual_return']['port_5'] - effect['annual_return']['benchmark'])
+
+
+def test_factor_effect_pool_match_serial(tmp_path):
+    panel, factors, names = random_panel()
+    with FactorEffectPool(panel, factors, names, processes=2, picture_path=str(tmp_path)) as pool:
+        results = pool.run()
+    assert [r[0] for r in results] == names
+    ports_return = cal_ports_return(factors, panel.close, panel.cmv)
+    for k, (fac, port_profit, effect) in enumerate(results):
+        expect_profit, monthly = ports_profit_frame(ports_return[k], panel.benchmark_return().tolist())
+        assert port_profit == expect_profit
+        assert effect['ic'] == cal_factor_effect(monthly)['ic']
+        assert os.path.exists(os.path.join(str(tmp_path), '%s.png' % fac))
+
+
+def test_monthly_records_roll():
+    panel, factors, names = random_panel(f=2)
+    ports_return = cal_ports_return(factors, panel.close, panel.cmv)
+    ports_return[1, 0, 3] = np.nan
+    columns = ['factor_id', 'benchmark', 'trade_date', 'port_1', 'port_2', 'port_3', 'port_4', 'port_5',
+               'benchmark_return']
+    records = []
+    monthly = {}
+    for k, fac in enumerate(names):
+        port_profit, monthly[fac] = ports_profit_frame(ports_return[k], panel.benchmark_return().tolist())
+        records.extend(monthly_records(fac, '000001.SH', list(panel.dates[:-1]), port_profit))
+    assert records[len(panel.dates) - 1 + 3][3] is None
+    # 乱序读出 按交易日还原 并滚动去掉首月
+    frames = monthly_frames(DataFrame(records[::-1], columns=columns).drop(columns=['benchmark']))
+    for fac in names:
+        np.testing.assert_allclose(frames[fac].to_numpy(), monthly[fac].to_numpy())
+        rolled = cal_factor_effect(frames[fac].iloc[:, 1:])
+        expect = cal_factor_effect(monthly[fac].iloc[:, 1:])
+        assert rolled['ic'] == expect['ic'] and rolled['win_prob'] == expect['win_prob']
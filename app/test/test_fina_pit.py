@@ -0,0 +1,99 @@
+import pandas as pd
+
+from quotation.cleaning.fina_pit import FinaIndicatorPIT, report_periods
+
+RAW = pd.DataFrame({
+    'ts_code': ['000001.SZ', '000001.SZ', '000001.SZ', '000001.SZ', '600000.SH', '600000.SH'],
+    'ann_date': ['20210320', '20210428', '20220315', '20220601', '20210410', '20220420'],
+    'end_date': ['20201231', '20210331', '20211231', '20201231', '20201231', '20211231'],
+    'roe': [10.0, 3.0, 12.0, 9.5, 8.0, 7.0],
+    'update_flag': ['0', '0', '0', '1', '0', '0']})
+
+
+def init_pit(fresh_singleton):
+    fresh_singleton(FinaIndicatorPIT, 'table')
+    pit = FinaIndicatorPIT()
+    pit.ensure = lambda periods, ts_codes: None
+    pit.raw = {'all': RAW}
+    pit.rebuild()
+    return pit
+
+
+def test_asof_no_lookahead(fresh_singleton):
+    pit = init_pit(fresh_singleton)
+    codes = ['000001.SZ', '600000.SH']
+    # 公告当日不可见
+    data = pit.asof('20210320', codes).set_index('ts_code')
+    assert data.empty
+    data = pit.asof('20210321', codes).set_index('ts_code')
+    assert data.loc['000001.SZ', 'roe'] == 10.0 and '600000.SH' not in data.index
+    data = pit.asof('20220316', codes).set_index('ts_code')
+    assert data.loc['000001.SZ', 'end_date'] == '20211231' and data.loc['600000.SH', 'end_date'] == '20201231'
+    # 旧报告期的更正不覆盖更新的报告期
+    data = pit.asof('20220701', codes, columns=['roe']).set_index('ts_code')
+    assert data.loc['000001.SZ', 'roe'] == 12.0 and data.columns.tolist() == ['roe']
+    # 时点表中不存在的列为 NaN
+    data = pit.asof('20220701', codes, columns=['roe', 'roa']).set_index('ts_code')
+    assert data.columns.tolist() == ['roe', 'roa'] and data['roa'].isna().all()
+    # 全部定期报告
+    data = pit.asof('20210501', codes, report_type='all').set_index('ts_code')
+    assert data.loc['000001.SZ', 'end_date'] == '20210331'
+
+
+def test_asof_frame_matches_single_dates(fresh_singleton):
+    pit = init_pit(fresh_singleton)
+    dates = ['20210401', '20210501', '20220316', '20220501']
+    left = pd.DataFrame([(c, d) for d in dates for c in ['000001.SZ', '600000.SH']], columns=['ts_code', 'trade_date'])
+    panel = pit.asof_frame(left)
+    for d in dates:
+        single = pit.asof(d, ['000001.SZ', '600000.SH']).sort_values('ts_code').reset_index(drop=True)
+        part = panel[panel['trade_date'] == d].drop(columns=['trade_date']).sort_values('ts_code')
+        pd.testing.assert_frame_equal(single, part.reset_index(drop=True))
+
+
+def test_report_periods():
+    assert report_periods(['20220316']) == ['20201231', '20211231']
+    assert report_periods(['20220316'], report_type='all')[-1] == '20221231'
+
+
+class FakeCapturer(object):
+    """按 today 返回已公告的报告"""
+
+    def __init__(self):
+        self.today = '20220115'
+        self.calls = []
+
+    def get_fina_indicator(self, ts_code=None, period=None):
+        self.calls.append((period, ts_code))
+        data = RAW[(RAW['end_date'] == period) & (RAW['ann_date'] <= self.today) &
+                   RAW['ts_code'].isin(ts_code.split(','))]
+        return data.reset_index(drop=True)
+
+
+def test_ensure_refetch_undisclosed(monkeypatch, fresh_singleton):
+    import quotation.cleaning.fina_pit as fina_pit
+    fresh_singleton(FinaIndicatorPIT, 'table')
+    capturer = FakeCapturer()
+    monkeypatch.setattr(fina_pit, 'get_today_Ymd', lambda: capturer.today)
+    pit = FinaIndicatorPIT()
+    pit.tsdatacapture = capturer
+    codes = ['000001.SZ', '600000.SH']
+    # 1月 2021年报尚未公告
+    data = pit.asof('20220116', codes, columns=['end_date']).set_index('ts_code')
+    assert data['end_date'].tolist() == ['20201231', '20201231']
+    calls = len(capturer.calls)
+    pit.asof('20220116', codes)
+    assert len(capturer.calls) == calls
+    # 披露期内 次日重新获取未公告的股票
+    capturer.today = '20220421'
+    data = pit.asof('20220421', codes, columns=['end_date']).set_index('ts_code')
+    assert data['end_date'].tolist() == ['20211231', '20211231']
+    assert capturer.calls[calls:] == [('20211231', '000001.SZ,600000.SH')]
+    # 披露截止后不再获取
+    capturer.today = '20220502'
+    pit.asof('20220502', codes + ['000002.SZ'])
+    calls = len(capturer.calls)
+    pit.asof('20220502', codes + ['000002.SZ'])
+    capturer.today = '20220503'
+    pit.asof('20220503', codes + ['000002.SZ'])
+    assert len(capturer.calls) == calls
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from quantization.factors.technical.indicators import TechnicalIndicators, ohlc_panel, rolling_max
+
+
+def listed_prices(daily_prices):
+    prices = daily_prices(n=4, days=120, seed=9, start_date='2022-01-03')
+    dates = sorted(prices['trade_date'].unique())
+    # 000001 上市晚 10 天，000002 停牌一天
+    return prices[~((prices['ts_code'] == '000001.SZ') & (prices['trade_date'] < dates[10])) &
+                  ~((prices['ts_code'] == '000002.SZ') & (prices['trade_date'] == dates[50]))]
+
+
+def test_against_pandas(daily_prices):
+    panel = ohlc_panel(listed_prices(daily_prices))
+    res = TechnicalIndicators().compute(**panel)
+    close = panel['close']['000000.SZ']
+    assert np.allclose(res['MA20']['000000.SZ'], close.rolling(20).mean(), equal_nan=True)
+    assert np.allclose(res['EMA12']['000000.SZ'], close.ewm(span=12, adjust=False).mean())
+    dif = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    assert np.allclose(res['DEA']['000000.SZ'], dif.ewm(span=9, adjust=False).mean())
+    assert np.allclose(res['BOLL_UP']['000000.SZ'], close.rolling(20).mean() + 2 * close.rolling(20).std(ddof=0),
+                       equal_nan=True)
+    ho = (panel['high'] - panel['open'])['000000.SZ'].rolling(26).sum()
+    ol = (panel['open'] - panel['low'])['000000.SZ'].rolling(26).sum()
+    assert np.allclose(res['AR']['000000.SZ'], ho / ol * 100, equal_nan=True)
+    # 上市前、停牌日为 nan
+    assert res['MA5']['000001.SZ'].iloc[:14].isna().all() and res['MA5']['000001.SZ'].iloc[14:].notna().all()
+    assert np.isnan(res['RSI6']['000002.SZ'].iloc[50]) and not np.isnan(res['RSI6']['000002.SZ'].iloc[51])
+
+
+def test_rolling_max():
+    x = np.array([[1.0], [3.0], [2.0], [0.0]])
+    assert np.allclose(rolling_max(x, 2)[:, 0], [np.nan, 3, 3, 2], equal_nan=True)
+
+
+def test_incremental_update(daily_prices):
+    panel = ohlc_panel(listed_prices(daily_prices))
+    full = TechnicalIndicators().compute(**panel)
+    ti = TechnicalIndicators()
+    ti.compute(**{k: v.iloc[:100] for k, v in panel.items()})
+    for i in range(100, len(panel['close'].index)):
+        trade_date = panel['close'].index[i]
+        bar = pd.DataFrame({k: v.iloc[i] for k, v in panel.items()}).dropna()
+        row = ti.update(trade_date, bar)
+        for name in ti.names():
+            assert np.allclose(row[name], full[name].iloc[i], equal_nan=True), name
+
+
+def test_full_market_shape():
+    rng = np.random.default_rng(0)
+    close = pd.DataFrame(10 * np.cumprod(1 + rng.normal(0, 0.02, (250, 5000)), axis=0))
+    ti = TechnicalIndicators()
+    res = ti.compute(open=close * 0.99, high=close * 1.02, low=close * 0.98, close=close)
+    assert sorted(res.keys()) == sorted(ti.names())
+    assert all(v.shape == close.shape for v in res.values())
+    assert res['MA60'].iloc[58].isna().all() and res['MA60'].iloc[59:].notna().all().all()
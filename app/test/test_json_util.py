@@ -0,0 +1,63 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from util.json_util import dumps_json, encode_cursor, frame_cursor, frame_records, frame_split, iter_ndjson, \
+    page_frame
+
+
+def stock_infos():
+    return pd.DataFrame({'symbol': ['000001', '000002', '000003'], 'industry': ['银行', None, '软件'],
+                         'pe': [5.5, np.nan, 20.0], 'list_days': [100, 200, 300]}).astype({'industry': 'category'})
+
+
+def test_frame_split():
+    data = stock_infos()
+    payload = json.loads(dumps_json(frame_split(data, page=2, page_size=2, fields=['symbol', 'pe', 'no_col'])))
+    assert payload == {'columns': ['symbol', 'pe'], 'index': [2], 'data': [['000003'], [20.0]],
+                       'total': 3, 'page': 2, 'page_size': 2}
+    payload = json.loads(dumps_json(frame_split(data)))
+    assert payload['data'][1] == ['银行', None, '软件'] and payload['data'][2] == [5.5, None, 20.0]
+    assert payload['page_size'] == 3
+
+
+def test_frame_records():
+    data = stock_infos()
+    records = json.loads(dumps_json(frame_records(data, fields=['pe'])))
+    assert records == {'000001': {'pe': 5.5}, '000002': {'pe': None}, '000003': {'pe': 20.0}}
+    assert json.loads(dumps_json({'code': '0', 'data': {1: np.float32(1.5), 'set': {'a'}}})) == \
+        {'code': '0', 'data': {'1': 1.5, 'set': ['a']}}
+
+
+def test_frame_cursor():
+    data = stock_infos()
+    payload = frame_cursor(data, '1', limit=2, fields=['symbol'])
+    assert payload['data'][0] == ['000001', '000002'] and payload['total'] == 3
+    payload = frame_cursor(data, '1', payload['next_cursor'], limit=2, fields=['symbol'])
+    assert payload['data'][0] == ['000003'] and payload['next_cursor'] is None
+    # 快照更新后 旧游标失效
+    with pytest.raises(ValueError):
+        frame_cursor(data, '2', frame_cursor(data, '1', limit=2)['next_cursor'], limit=2)
+
+
+def test_invalid_paging():
+    data = stock_infos()
+    for limit in [0, -1]:
+        with pytest.raises(ValueError):
+            frame_cursor(data, '1', limit=limit)
+    with pytest.raises(ValueError):
+        frame_cursor(data, '1', encode_cursor('1', -2), limit=2)
+    with pytest.raises(ValueError):
+        page_frame(data, page=1, page_size=0)
+    assert page_frame(data, page=-1, page_size=2)['symbol'].tolist() == ['000001', '000002']
+
+
+def test_iter_ndjson():
+    data = stock_infos()
+    chunks = list(iter_ndjson(data, fields=['symbol', 'pe'], chunk_size=2))
+    assert len(chunks) == 2
+    rows = [json.loads(line) for line in b"".join(chunks).splitlines()]
+    assert rows == [{'symbol': '000001', 'pe': 5.5}, {'symbol': '000002', 'pe': None},
+                    {'symbol': '000003', 'pe': 20.0}]
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from conf.benchmark import BENCHMARK_MAP
+from quantization.timing.market_regime import MarketRegime, cal_sentiment, cal_trend
+
+DATES = pd.bdate_range('2021-01-04', periods=320).strftime('%Y%m%d')
+
+
+class FakeCapturer(object):
+
+    def __init__(self):
+        rng = np.random.default_rng(3)
+        rows = []
+        for ts_code in BENCHMARK_MAP.keys():
+            close = 3000 * np.cumprod(1 + rng.normal(0, 0.01, len(DATES)))
+            open_ = close * (1 + rng.normal(0, 0.005, len(DATES)))
+            rows.append(pd.DataFrame({'ts_code': ts_code, 'trade_date': DATES, 'open': open_, 'close': close,
+                                      'high': np.maximum(open_, close) * 1.01,
+                                      'low': np.minimum(open_, close) * 0.99}))
+        self.index_daily = pd.concat(rows, ignore_index=True)
+        self.pct_chg = {d: rng.normal(0, 2, 100) for d in DATES}
+        self.calls = 0
+        self.fail = False
+        self.daily_fail = False
+
+    def get_index_daily(self, ts_code, trade_date=None, start_date=None, end_date=None):
+        self.calls += 1
+        if self.fail:
+            return None
+        df = self.index_daily[self.index_daily['ts_code'] == ts_code]
+        if trade_date:
+            return df[df['trade_date'] == trade_date]
+        return df[(df['trade_date'] >= start_date) & (df['trade_date'] <= end_date)]
+
+    def get_daily(self, trade_date=None):
+        if self.daily_fail:
+            return None
+        return pd.DataFrame({'pct_chg': self.pct_chg.get(trade_date, [])})
+
+
+def new_regime(fresh_singleton, capturer):
+    fresh_singleton(MarketRegime, 'indicators')
+    mr = MarketRegime()
+    mr.tsdatacapture = capturer
+    return mr
+
+
+def test_incremental_equals_reload(fresh_singleton):
+    capturer = FakeCapturer()
+    mr = new_regime(fresh_singleton, capturer)
+    assert mr.refresh(DATES[300])
+    for d in DATES[301:]:
+        assert mr.update(d)
+    # 已更新过 不再拉取
+    calls = capturer.calls
+    assert not mr.update(DATES[-1]) and capturer.calls == calls
+    updated, updated_market = mr.regime(), mr.market()
+    reloaded = new_regime(fresh_singleton, capturer)
+    reloaded.refresh(DATES[-1])
+    assert len(updated) == 8 and updated_market['trade_date'] == DATES[-1]
+    for ts_code, item in reloaded.regime().items():
+        for k in ['close', 'MA20', 'MA60', 'AR', 'BR']:
+            assert np.isclose(updated[ts_code][k], item[k])
+        assert updated[ts_code]['trend'] == item['trend'] and updated[ts_code]['sentiment'] == item['sentiment']
+    assert np.isclose(updated_market['up_ratio_ma'], reloaded.market()['up_ratio_ma'])
+
+
+def test_load_daily_failed(fresh_singleton):
+    capturer = FakeCapturer()
+    mr = new_regime(fresh_singleton, capturer)
+    # 涨跌家数获取失败 不加载、不抛异常
+    capturer.daily_fail = True
+    assert not mr.refresh(DATES[300]) and mr.trade_date is None
+    capturer.daily_fail = False
+    assert mr.refresh(DATES[300]) and mr.trade_date == DATES[300]
+
+
+def test_update_fills_missed_days(fresh_singleton):
+    capturer = FakeCapturer()
+    mr = new_regime(fresh_singleton, capturer)
+    assert mr.refresh(DATES[300])
+    # 获取失败不更新
+    capturer.fail = True
+    assert not mr.update(DATES[302]) and mr.trade_date == DATES[300]
+    # 漏跑的交易日一并补齐
+    capturer.fail = False
+    assert mr.update(DATES[305]) and mr.trade_date == DATES[305]
+    assert list(mr.bars['close'].index[-6:]) == list(DATES[300:306])
+    updated, updated_market = mr.regime(), mr.market()
+    reloaded = new_regime(fresh_singleton, capturer)
+    reloaded.refresh(DATES[305])
+    for ts_code, item in reloaded.regime().items():
+        for k in ['close', 'MA20', 'MA60', 'AR', 'BR']:
+            assert np.isclose(updated[ts_code][k], item[k])
+    assert np.isclose(updated_market['up_ratio_ma'], reloaded.market()['up_ratio_ma'])
+
+
+def test_rules():
+    assert cal_trend(10, 9, 8) == 'bull' and cal_trend(8, 9, 10) == 'bear' and cal_trend(9, 10, 8) == 'range'
+    assert cal_sentiment(200, 450) == 'overheated' and cal_sentiment(50, 30) == 'oversold'
+    assert cal_sentiment(120, 100) == 'bottoming' and cal_sentiment(100, 120) == 'neutral'
@@ -0,0 +1,43 @@
+import pandas as pd
+
+
+def fake_fetch(calls):
+    def fetch(ts_code):
+        calls.append(ts_code)
+        codes = ts_code.split(',') if ts_code else ['000001.SZ', '000002.SZ', '600000.SH']
+        return pd.DataFrame({'ts_code': codes, 'trade_date': '20230103', 'close': [10.0] * len(codes)})
+
+    return fetch
+
+
+def test_read_through_only_fetch_missing(market_store):
+    store = market_store
+    calls = []
+    store.read_through('daily', '20230103', '000001.SZ', fake_fetch(calls))
+    data = store.read_through('daily', '20230103', '000001.SZ,000002.SZ', fake_fetch(calls))
+    assert calls == ['000001.SZ', '000002.SZ']
+    assert sorted(data['ts_code']) == ['000001.SZ', '000002.SZ']
+    stats = store.stats().loc['daily']
+    assert stats['hits'] == 1 and stats['misses'] == 2 and stats['requests'] == 2
+
+
+def test_full_partition_never_refetch(market_store):
+    store = market_store
+    calls = []
+    store.read_through('daily_basic', '20230103', '', fake_fetch(calls))
+    assert store.is_full('daily_basic', '20230103')
+    # 全市场分区中不存在的股票不再拉取
+    data = store.read_through('daily_basic', '20230103', '000001.SZ,000004.SZ', fake_fetch(calls))
+    assert calls == ['']
+    assert data['ts_code'].tolist() == ['000001.SZ']
+
+
+def test_offline_never_fetch(market_store, monkeypatch):
+    store = market_store
+    calls = []
+    store.read_through('adj_factor', '20230103', '000001.SZ', fake_fetch(calls))
+    monkeypatch.setattr(store, 'offline', True)
+    data = store.read_through('adj_factor', '20230103', '000001.SZ,000002.SZ', fake_fetch(calls))
+    assert calls == ['000001.SZ']
+    assert data['ts_code'].tolist() == ['000001.SZ']
+    assert len(store.load_range('adj_factor', '20230101', '20230131', ['000001.SZ']).index) == 1
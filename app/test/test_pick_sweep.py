@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from quantization.backtest.securitypick_backtest import stk_pick_backtest
+from quantization.backtest.securitypick_backtest.pick_sweep import PickSweepData, PickSweepPool, eval_group, \
+    eval_params, group_params, sweep_params
+from quantization.backtest.securitypick_backtest.stk_pick_backtest import SecurityPickBackTest
+from quantization.securitypick.growth.growthstockpick01 import GrowthStockPick01
+from quotation.cleaning.data_clean import BaseDataClean
+
+
+def sweep_data(n=300):
+    rng = np.random.default_rng(5)
+    dates = ['20200102', '20200701', '20210104', '20210701', '20220104']
+    codes = ['%06d.SZ' % i for i in range(n)]
+    snapshots = {d: pd.DataFrame({'ts_code': codes, 'symbol': [c[:6] for c in codes],
+                                  'roe': rng.normal(10, 5, n), 'basic_eps_yoy': rng.normal(20, 30, n),
+                                  'pe_ttm': rng.uniform(5, 80, n), 'circ_mv': rng.uniform(1e4, 1e6, n)})
+                 for d in dates}
+    closes = {d: pd.Series(rng.uniform(5, 50, n), index=codes) for d in dates}
+    benchmark = {d: 3000 + 100 * i for i, d in enumerate(dates)}
+    periods = {6: list(zip(dates[:-1], dates[1:])), 12: [(dates[0], dates[2]), (dates[2], dates[4])]}
+    return PickSweepData(snapshots, closes, benchmark, periods)
+
+
+def test_eval_params():
+    data = sweep_data()
+    params = {'weights': {'roe': 34, 'basic_eps_yoy': 33, 'pe_ttm': 33}, 'top_num': 5, 'shift_period': 6}
+    effect = eval_params(data, GrowthStockPick01(), params)
+    # 逐期手算
+    gsp01 = GrowthStockPick01()
+    total = 1
+    for start_date, end_date in data.periods[6]:
+        gsp01.init_data(stocksinfos=data.snapshots[start_date], weights=params['weights'])
+        target = gsp01.get_target_stock_pool(top_num=5)
+        profit = data.closes[end_date][target['ts_code']].to_numpy() / data.closes[start_date][
+            target['ts_code']].to_numpy() - 1
+        total *= 1 + (profit * target['circ_mv'].to_numpy()).sum() / target['circ_mv'].sum()
+    assert np.isclose(effect['total_return'], total - 1)
+    assert effect['periods'] == 4 and np.isclose(effect['benchmark_return'], 3400 / 3000 - 1)
+
+
+class PlainStockPick(object):
+    """不提供 sweep_stock_pools 的选股模型 逐组选股"""
+
+    def __init__(self):
+        self.gsp01 = GrowthStockPick01()
+
+    def init_data(self, stocksinfos, weights):
+        self.gsp01.init_data(stocksinfos=stocksinfos, weights=weights)
+
+    def get_target_stock_pool(self, top_num):
+        return self.gsp01.get_target_stock_pool(top_num=top_num)
+
+
+def test_eval_group_matches_single():
+    data = sweep_data()
+    params = sweep_params({'roe': [10, 50], 'basic_eps_yoy': [10, 50], 'pe_ttm': [10, 50]},
+                          top_nums=[5, 10], shift_periods=[6, 12])
+    groups = group_params(params, batch_size=3)
+    assert all(len({(p['top_num'], p['shift_period']) for p in g}) == 1 and len(g) <= 3 for g in groups)
+    assert sum(len(g) for g in groups) == 32
+    for group in groups:
+        for effect, p in zip(eval_group(data, GrowthStockPick01(), group), group):
+            single = eval_params(data, PlainStockPick(), p)
+            assert effect['weights'] == p['weights'] and np.isclose(effect['total_return'], single['total_return'])
+
+
+def test_sweep_pool():
+    data = sweep_data()
+    params = sweep_params({'roe': [10, 50], 'basic_eps_yoy': [10, 50], 'pe_ttm': [10, 50]},
+                          top_nums=[5, 10], shift_periods=[6, 12])
+    assert len(params) == 32
+    assert len(sweep_params({'roe': [10, 50], 'pe_ttm': [10, 50]}, n_random=3, seed=1)) == 3
+    with PickSweepPool(data, 'quantization.securitypick.growth.growthstockpick01', 'GrowthStockPick01',
+                       processes=2, params_batch=8) as pool:
+        results = pool.run(params)
+    assert len(results.index) == 32 and results['excess_return'].is_monotonic_decreasing
+    best = results.iloc[0]
+    effect = eval_params(data, GrowthStockPick01(), {'weights': best['weights'], 'top_num': best['top_num'],
+                                                     'shift_period': best['shift_period']})
+    assert np.isclose(effect['total_return'], best['total_return'])
+
+
+def test_load_sweep_data_price_failed(monkeypatch):
+    data = sweep_data(10)
+    failed = {'20210104'}
+
+    def get_price(ts_code_list, trade_date, asset='E'):
+        if trade_date in failed:
+            return None
+        close = data.closes[trade_date] if asset == 'E' else pd.Series([data.benchmark[trade_date]])
+        return pd.DataFrame({'close': close})
+
+    monkeypatch.setattr(stk_pick_backtest, 'get_price', get_price)
+    monkeypatch.setattr(BaseDataClean, 'iter_certainday_base_stock_infos',
+                        classmethod(lambda c, dates: ((d, data.snapshots[d]) for d in dates)))
+    bt = SecurityPickBackTest()
+    bt.period_dates = lambda shift_period: data.periods[shift_period]
+    # 获取失败的交易日 涉及的换仓周期剔除
+    loaded = bt.load_sweep_data([6, 12])
+    assert loaded.periods == {6: [('20200102', '20200701'), ('20210701', '20220104')], 12: []}
+    assert '20210104' not in loaded.closes
+    failed.update(['20200701', '20220104'])
+    with pytest.raises(ValueError, match='no sweep period left'):
+        bt.load_sweep_data([6, 12])
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from quantization.factor_validity_check.price_panel import PricePanel, cal_ports_return
+
+
+def ref_port_return(basics_data, close1, close2):
+    """原 part_data_cal_mon_profit + cal_port_monthly_return 的分组、加权规则"""
+    basics_data = basics_data.dropna(subset=['fac'])
+    score = basics_data[['ts_code', 'fac']].sort_values(by='fac', kind='stable')
+    cmv = basics_data.set_index('ts_code')['CMV']
+    codes = list(score['ts_code'])
+    n = len(codes)
+    ports = [codes[: n // 5], codes[n // 5: 2 * n // 5], codes[2 * n // 5: -2 * n // 5],
+             codes[-2 * n // 5: -n // 5], codes[-n // 5:]]
+    result = []
+    for port in ports:
+        valid = [c for c in port if c in close1.index and c in close2.index]
+        ret = close2.loc[valid] / close1.loc[valid] - 1
+        circ_mv = cmv.loc[valid]
+        result.append((ret * circ_mv).sum() / circ_mv.sum())
+    return result
+
+
+def test_cal_ports_return_match_slicing():
+    rng = np.random.default_rng(7)
+    dates = ['20220131', '20220228', '20220331', '20220429']
+    codes = ['%06d.SZ' % i for i in range(23)]
+    rows = []
+    frames = {}
+    for date in dates:
+        for code in codes:
+            # 随机缺失价格
+            if rng.random() > 0.1:
+                rows.append([code, date, rng.uniform(5, 50), 'E'])
+        rows.append(['000300.SH', date, rng.uniform(3000, 5000), 'I'])
+        fac = rng.normal(size=len(codes))
+        fac[rng.random(len(codes)) < 0.15] = np.nan
+        fac[:3] = 1.0
+        frames[date] = pd.DataFrame({'ts_code': codes, 'CMV': rng.uniform(1, 100, len(codes)), 'fac': fac})
+    prices = pd.DataFrame(rows, columns=['ts_code', 'trade_date', 'close', 'asset'])
+
+    panel = PricePanel.from_frame(prices, dates=dates, codes=codes, benchmark='000300.SH')
+    panel.cmv = panel.align(frames, ['CMV'])[0]
+    result = cal_ports_return(panel.align(frames, ['fac']), panel.close, panel.cmv)
+    assert result.shape == (1, 5, len(dates) - 1)
+
+    closes = {d: prices[(prices['trade_date'] == d) & (prices['asset'] == 'E')].set_index('ts_code')['close']
+              for d in dates}
+    for t in range(len(dates) - 1):
+        expect = ref_port_return(frames[dates[t]], closes[dates[t]], closes[dates[t + 1]])
+        np.testing.assert_allclose(result[0, :, t], expect, equal_nan=True)
+
+    bench = prices[prices['asset'] == 'I']['close'].to_numpy()
+    np.testing.assert_allclose(panel.benchmark_return(), bench[1:] / bench[:-1] - 1)
+
+
+def test_cal_ports_return_empty_group():
+    close = np.array([[10.0, 20.0, 30.0], [11.0, 22.0, 33.0]])
+    cmv = np.ones((2, 3))
+    factors = np.array([[[1.0, 2.0, np.nan], [np.nan, np.nan, np.nan]]])
+    result = cal_ports_return(factors, close, cmv)
+    # 2只股票分5组 只有第3、5组有股票
+    assert np.isnan(result[0, [0, 1, 3], 0]).all()
+    np.testing.assert_allclose(result[0, [2, 4], 0], [0.1, 0.1])
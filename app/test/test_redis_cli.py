@@ -1,5 +1,5 @@
 from db.myredis.redis_cli import RedisClient
-from util.obj_util import loads_data
+from quotation.cache.codec import CacheCodec
 
 
 class TestRedisClient:
@@ -9,8 +9,9 @@ class TestRedisClient:
         rcc = TestRedisClient.rc.get_redis_cli()
         # rcc.set("test","test")
         # print(rcc.get("test"))
-        print(loads_data(rcc.get("base_stock_infos")))
+        version = rcc.get("BasicDataCache.version").decode()
+        print(CacheCodec().loads("base_stock_infos", rcc.get("base_stock_infos:%s" % version)))
 
     def test_get_redis(self):
         rcc = TestRedisClient.rc.get_redis_cli()
-        print(int(rcc.get("RemoteBasicDataCache.updateflag")) == 1)
+        print(rcc.get("BasicDataCache.version"))
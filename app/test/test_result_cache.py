@@ -0,0 +1,58 @@
+from quotation.cache.result_cache import ResultCache, params_hash
+
+
+class FakeRedis(object):
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+def result_cache(monkeypatch, maxsize=2):
+    rc = ResultCache()
+    monkeypatch.setattr(rc, 'rediscli', FakeRedis())
+    monkeypatch.setattr(rc, 'maxsize', maxsize)
+    monkeypatch.setattr(rc, 'version', None)
+    rc.results.clear()
+    return rc
+
+
+def test_params_hash():
+    assert params_hash({'pe': [1, 2], 'industry': '银行'}) == params_hash({'industry': '银行', 'pe': [1, 2]})
+    assert params_hash({'pe': [1, 2]}) != params_hash({'pe': [1, 3]})
+
+
+def test_cached(monkeypatch):
+    rc = result_cache(monkeypatch)
+    calls = []
+
+    def compute(n):
+        calls.append(n)
+        return {'n': n}
+
+    assert rc.cached('screen', '1', {'n': 1}, lambda: compute(1)) == {'n': 1}
+    assert rc.cached('screen', '1', {'n': 1}, lambda: compute(1)) == {'n': 1}
+    assert calls == [1]
+
+    # 本地 LRU 淘汰后 从 redis 共享层命中
+    rc.cached('screen', '1', {'n': 2}, lambda: compute(2))
+    rc.cached('screen', '1', {'n': 3}, lambda: compute(3))
+    assert len(rc.results) == 2
+    rc.cached('screen', '1', {'n': 1}, lambda: compute(1))
+    assert calls == [1, 2, 3] and rc.redis_hits >= 1
+
+    # 新版本 旧结果失效；旧版本迟到请求不清空新版本结果
+    rc.invalidate('2')
+    assert len(rc.results) == 0
+    rc.cached('screen', '2', {'n': 1}, lambda: compute(1))
+    assert calls == [1, 2, 3, 1]
+    rc.cached('screen', '1', {'n': 9}, lambda: compute(9))
+    assert rc.version == '2' and len(rc.results) == 1
+
+    # 无快照版本 不缓存
+    rc.cached('screen', None, {'n': 1}, lambda: compute(1))
+    assert calls == [1, 2, 3, 1, 9, 1]
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from quantization.securitypick.score_engine import FactorSpec, ScoreEngine
+
+
+def stock_infos(n=2000):
+    rng = np.random.default_rng(3)
+    data = pd.DataFrame({'symbol': ['%06d' % i for i in range(n)],
+                         'roe': rng.normal(10, 5, n).round(1),
+                         'basic_eps_yoy': rng.normal(20, 30, n),
+                         'pe_ttm': rng.uniform(5, 80, n)})
+    data.loc[::50, 'roe'] = np.nan
+    return data
+
+
+def specs(weights):
+    return [FactorSpec('roe', weight=weights[0], lower=30),
+            FactorSpec('basic_eps_yoy', weight=weights[1], lower=75),
+            FactorSpec('pe_ttm', weight=weights[2], upper=90, base=1)]
+
+
+def reference(data, weights):
+    """逐步 pandas 实现"""
+    data = data.dropna(subset=['roe', 'basic_eps_yoy', 'pe_ttm'])
+    data1 = data[data['roe'] >= np.percentile(data['roe'], 30)]
+    data2 = data1[data1['basic_eps_yoy'] >= np.percentile(data1['basic_eps_yoy'], 75)]
+    target = data2[data2['pe_ttm'] <= np.percentile(data1['pe_ttm'], 90)].copy()
+    for col, w in zip(['roe', 'basic_eps_yoy', 'pe_ttm'], weights):
+        rank = target[col].rank(method='max', ascending=False)
+        target[col + '_score'] = (rank - rank.min()) / (rank.max() - rank.min()) * w
+    target['sum_score'] = target[['roe_score', 'basic_eps_yoy_score', 'pe_ttm_score']].sum(axis=1)
+    return target
+
+
+def test_select_parity():
+    data = stock_infos()
+    weights = [34, 33, 33]
+    res = ScoreEngine(specs(weights)).select(data, top_num=0)
+    expected = reference(data, weights)
+    pd.testing.assert_frame_equal(res.sort_index(), expected.sort_index())
+    assert res['sum_score'].is_monotonic_decreasing
+    top = ScoreEngine(specs(weights)).select(data, top_num=5)
+    assert top['sum_score'].tolist() == res['sum_score'].head(5).tolist()
+
+
+def test_sweep():
+    data = stock_infos()
+    weights_list = [[34, 33, 33], [80, 10, 10], [0, 0, 100]]
+    engine = ScoreEngine(specs([0, 0, 0]))
+    positions = engine.sweep(data, weights_list, top_num=10)
+    for weights, pos in zip(weights_list, positions):
+        expected = ScoreEngine(specs(weights)).select(data, top_num=10)
+        assert sorted(data.index[pos]) == sorted(expected.index)
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from quotation.cache.shared_store import SharedFrameStore
+from quotation.cleaning.data_clean import BaseDataClean
+
+
+def stock_infos(n=500):
+    rng = np.random.default_rng(1)
+    return pd.DataFrame({'ts_code': ['%06d.SZ' % i for i in range(n)],
+                         'industry': rng.choice(['银行', '软件', '医药'], n),
+                         'list_date': pd.to_datetime('2010-01-01') + pd.to_timedelta(rng.integers(0, 3000, n), 'D'),
+                         'circ_mv': rng.uniform(1e4, 1e7, n),
+                         'float_share': rng.uniform(1e3, 1e6, n),
+                         'list_days': rng.integers(0, 3000, n)})
+
+
+def shared_store(monkeypatch, tmp_path):
+    store = SharedFrameStore()
+    monkeypatch.setattr(store, 'shared_path', str(tmp_path / 'iaos'))
+    return store
+
+
+def test_publish_attach(monkeypatch, tmp_path):
+    store = shared_store(monkeypatch, tmp_path)
+    data = stock_infos()
+    smb_industry_map = BaseDataClean.cal_smb_industry_map(data)
+    snapshot = {'base_stock_infos': data, 'stocks_pool': data[['ts_code']],
+                'smb_industry_map': smb_industry_map, 'industry_set': {'银行', '软件', '医药'}}
+    assert store.attach('1', list(snapshot.keys())) is None
+    assert store.publish('1', snapshot)
+
+    res = store.attach('1', list(snapshot.keys()))
+    pd.testing.assert_frame_equal(res['base_stock_infos'], data, check_categorical=False, check_dtype=False)
+    pd.testing.assert_frame_equal(res['stocks_pool'], data[['ts_code']])
+    assert res['industry_set'] == snapshot['industry_set']
+    for cap, industries in smb_industry_map.items():
+        for industry, df in industries.items():
+            pd.testing.assert_frame_equal(res['smb_industry_map'][cap][industry], df,
+                                          check_categorical=False, check_dtype=False)
+
+    # 数值列直接映射共享文件 不拷贝
+    values = res['base_stock_infos']['circ_mv'].to_numpy()
+    while values.base is not None and not isinstance(values, np.memmap):
+        values = values.base
+    assert isinstance(values, np.memmap)
+    assert not res['base_stock_infos']['circ_mv'].to_numpy().flags.writeable
+    assert len(res['base_stock_infos'].query("industry=='银行' and circ_mv > 1e6").index) == \
+        ((data['industry'] == '银行') & (data['circ_mv'] > 1e6)).sum()
+
+
+def test_publish_versions(monkeypatch, tmp_path):
+    store = shared_store(monkeypatch, tmp_path)
+    snapshot = {'stocks_pool': stock_infos(10)[['ts_code']]}
+    for version in ['1', '2', '3']:
+        assert store.publish(version, snapshot)
+    # 已发布版本跳过
+    assert store.publish('3', {'stocks_pool': stock_infos(20)[['ts_code']]})
+    assert len(store.attach('3', ['stocks_pool'])['stocks_pool'].index) == 10
+    # 只保留最新的 keep_versions 个版本
+    assert not store.exists('1') and store.exists('2') and store.exists('3')
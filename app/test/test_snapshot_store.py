@@ -0,0 +1,43 @@
+import pandas as pd
+
+from util.time_util import get_today_Ymd
+
+
+def fake_build(calls):
+    def build(trade_date):
+        calls.append(trade_date)
+        return pd.DataFrame({'ts_code': ['000001.SZ', '600000.SH'], 'name': ['平安银行', '浦发银行'],
+                             'roe': [10.5, 8.2], 'circ_mv': [2000.0, 2500.0]})
+
+    return build
+
+
+def test_build_once(snapshot_store):
+    store = snapshot_store
+    calls = []
+    first = store.get('base_stock_infos', '20230103', fake_build(calls))
+    second = store.get('base_stock_infos', '20230103', fake_build(calls))
+    assert calls == ['20230103'] and store.dates('base_stock_infos') == ['20230103']
+    pd.testing.assert_frame_equal(first, second)
+    assert store.get('base_stock_infos', '20230103', fake_build(calls), columns=['ts_code', 'roe']).columns.tolist() \
+           == ['ts_code', 'roe']
+
+
+def test_today_not_persisted(snapshot_store):
+    store = snapshot_store
+    calls = []
+    store.get('base_stock_infos', get_today_Ymd(), fake_build(calls))
+    store.get('base_stock_infos', get_today_Ymd(), fake_build(calls))
+    assert len(calls) == 2 and store.dates('base_stock_infos') == []
+
+
+def test_iter_range(snapshot_store):
+    store = snapshot_store
+    calls = []
+    store.get('base_stock_infos', '20230103', fake_build(calls))
+    # 只读已落地的快照
+    assert [d for d, _ in store.iter_range('base_stock_infos', ['20230103', '20230104'])] == ['20230103']
+    dates = [d for d, data in store.iter_range('base_stock_infos', ['20230103', '20230104'], fake_build(calls),
+                                               columns=['ts_code'])]
+    assert dates == ['20230103', '20230104'] and calls == ['20230103', '20230104']
+    assert store.range_dates('base_stock_infos', '20230104', '20230131') == ['20230104']
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from util.trade_calendar import TradeCalendar
+
+
+class FakeCapturer(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_trade_cal(self, exchange='SSE', start_date=None, end_date=None, is_open=None):
+        self.calls += 1
+        days = pd.date_range('2022-01-01', '2023-12-31')
+        # 周末及 2023-01-02 休市
+        is_open = (days.dayofweek < 5) & (days != pd.Timestamp('2023-01-02'))
+        return pd.DataFrame({'exchange': exchange, 'cal_date': days.strftime('%Y%m%d')[::-1],
+                             'is_open': is_open.astype(int)[::-1]})
+
+
+def new_calendar(store, monkeypatch, fresh_singleton, capturer):
+    # 离线构造 不访问网络
+    monkeypatch.setattr(store, 'offline', True)
+    fresh_singleton(TradeCalendar, 'dates')
+    cal = TradeCalendar()
+    monkeypatch.setattr(store, 'offline', False)
+    cal.tsdatacapture = capturer
+    cal.load()
+    return cal
+
+
+def test_calendar_lookups(market_store, monkeypatch, fresh_singleton):
+    capturer = FakeCapturer()
+    cal = new_calendar(market_store, monkeypatch, fresh_singleton, capturer)
+    assert cal.first_last('20230101', '20230131') == ('20230103', '20230131')
+    assert cal.first_last('20230107', '20230108') == (None, None)
+    assert cal.pre_trade_date('20230103') == '20221230' and cal.pre_trade_date('20230103', include=True) == '20230103'
+    assert cal.next_trade_date('20221230') == '20230103' and cal.next_trade_date('20230101', include=True) == '20230103'
+    assert cal.month_start('20230115') == '20230103' and cal.is_trade_date('20230104')
+    assert cal.month_starts('20221101', '20230228') == ['20221101', '20221201', '20230103', '20230201']
+    assert len(cal.trade_dates('20230102', '20230106')) == 4
+    assert capturer.calls == 1
+    # 本地落地后 新实例不再远程获取
+    cal = new_calendar(market_store, monkeypatch, fresh_singleton, capturer)
+    assert cal.first_last('20220101', '20220131') == ('20220103', '20220131') and capturer.calls == 1
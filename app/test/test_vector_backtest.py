@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from quantization.backtest.timing_backtest.vector_backtest import VectorBacktest, backtest, backtest_stats, \
+    ma_cross_target, price_panel
+from quantization.factors.technical.indicators import ma
+from quantization.strategy.batch_runner import feed_frames, run_cerebro
+from quantization.strategy.strategy_ma import MAStrategy
+
+
+def test_ma():
+    close = np.array([[1.0, np.nan], [2.0, 1.0], [3.0, 2.0], [4.0, 3.0]])
+    expected = pd.DataFrame(close).rolling(2).mean().to_numpy()
+    assert np.allclose(ma(close, 2), expected, equal_nan=True)
+
+
+def test_parity_with_backtrader(daily_prices):
+    prices = daily_prices()
+    frames = feed_frames(prices)
+    panel = price_panel(prices)
+    vb = VectorBacktest(cash=100000.0, commission=0.001, size=500)
+    results = vb.run_ma_cross(panel, maperiods=[10, 15, 40])
+    for ts_code, data in frames.items():
+        for row in run_cerebro(data, MAStrategy, {'maperiod': [10, 15, 40]}, commission=0.001):
+            vec = results[(results['ts_code'] == ts_code) & (results['maperiod'] == row['maperiod'])].iloc[0]
+            assert np.isclose(vec['final_value'], row['final_value'])
+            assert vec['trades'] == row['trades'] and vec['won'] == row['won'] and vec['lost'] == row['lost']
+            assert np.isclose(vec['max_drawdown'], row['max_drawdown'])
+
+
+def test_suspension_defers_fill():
+    open_ = np.array([[10.0], [np.nan], [11.0], [12.0]])
+    close = np.array([[10.0], [np.nan], [11.0], [12.0]])
+    target = np.array([[1.0], [np.nan], [np.nan], [0.0]])
+    res = backtest(open_, close, target, size=100, commission=0.0, cash=10000.0)
+    assert res['shares'][:, 0].tolist() == [0, 0, 100, 100]
+    stats = backtest_stats(res, cash=10000.0)
+    assert np.isclose(stats['final_value'][0], 10000.0 + 100) and stats['trades'][0] == 0
+
+
+def test_screen_many_periods():
+    rng = np.random.default_rng(0)
+    close = 10 * np.cumprod(1 + rng.normal(0, 0.02, (750, 1000)), axis=0)
+    vb = VectorBacktest()
+    for period in range(5, 25):
+        stats = vb.run(close, close, ma_cross_target(close, period))
+        assert len(stats['final_value']) == 1000 and np.isfinite(stats['final_value']).all()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import base64
+
+import numpy as np
+import orjson
+import pandas as pd
+from pandas import DataFrame
+
+'''
+接口 json 序列化
+-- dumps_json：orjson 编码，numpy 数组/标量直接序列化[OPT_SERIALIZE_NUMPY]，NaN 输出 null
+-- frame_split：DataFrame 列式 split 结构，数值列以 numpy 数组交给 orjson，不逐行转换
+   {"columns": [列名], "index": [行索引], "data": [[第1列值], [第2列值], ...],
+    "total": 总行数, "page": 页码, "page_size": 每页行数}
+   data 按列组织，第 i 行为各列数组的第 i 个元素
+-- frame_records：{symbol: {列: 值}} 原有按股票代码组织的结构，向量化构建
+-- frame_cursor：游标分页，游标为 (快照版本, 行偏移) 的编码，快照更新后旧游标失效
+   {"columns", "index", "data", "total", "limit", "next_cursor": 下一页游标[末页为 null]}
+-- iter_ndjson：逐块编码为 NDJSON[每行一个 json 对象]，用于流式响应，内存只与块大小有关
+'''
+
+OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    """orjson 不支持的类型"""
+    if isinstance(obj, pd.Timestamp):
+        return None if obj is pd.NaT else obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if obj is pd.NA or obj is pd.NaT:
+        return None
+    return str(obj)
+
+
+def dumps_json(obj) -> bytes:
+    return orjson.dumps(obj, default=_default, option=OPTIONS)
+
+
+def page_frame(data: DataFrame, page: int = None, page_size: int = None, fields: list = None) -> DataFrame:
+    """字段投影[不存在的字段忽略] 及分页[page 从1开始，小于1按1；page_size 须不小于1 否则抛出 ValueError]"""
+    if fields:
+        data = data[[c for c in fields if c in data.columns]]
+    if page_size is not None:
+        page = max(int(page or 1), 1)
+        page_size = check_positive('page_size', page_size)
+        data = data.iloc[(page - 1) * page_size:page * page_size]
+    return data
+
+
+def check_positive(name: str, value) -> int:
+    """分页参数须为不小于1的整数 否则抛出 ValueError"""
+    value = int(value)
+    if value < 1:
+        raise ValueError("%s must be >= 1: %s" % (name, value))
+    return value
+
+
+def column_values(col: pd.Series):
+    """单列值：数值列返回 numpy 数组，其余列返回 list[缺失值为 None]"""
+    if isinstance(col.dtype, np.dtype) and col.dtype.kind in 'fiub':
+        return np.ascontiguousarray(col.to_numpy())
+    if isinstance(col.dtype, np.dtype) and col.dtype.kind == 'M':
+        return col.dt.strftime('%Y-%m-%dT%H:%M:%S').where(col.notna(), None).tolist()
+    values = col.astype(object)
+    return values.where(values.notna(), None).tolist()
+
+
+def frame_split(data: DataFrame, page: int = None, page_size: int = None, fields: list = None) -> dict:
+    """DataFrame 转列式 split 结构 [支持分页、字段投影]"""
+    total = len(data.index)
+    data = page_frame(data, page, page_size, fields)
+    return {'columns': [str(c) for c in data.columns],
+            'index': column_values(data.index.to_series()),
+            'data': [column_values(data.iloc[:, i]) for i in range(len(data.columns))],
+            'total': total, 'page': int(page or 1) if page_size else 1,
+            'page_size': int(page_size) if page_size else total}
+
+
+def frame_records(data: DataFrame, key: str = 'symbol', fields: list = None) -> dict:
+    """DataFrame 转 {key列值: 行字典} [key 重复时保留最后一行；支持字段投影]"""
+    return dict(zip(data[key].tolist(), page_frame(data, fields=fields).to_dict('records')))
+
+
+def encode_cursor(version, offset: int) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps([version, offset])).decode()
+
+
+def decode_cursor(cursor: str, version) -> int:
+    """游标 -> 行偏移；游标非法或快照版本已更新 抛出 ValueError"""
+    try:
+        cursor_version, offset = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        offset = int(offset)
+    except Exception:
+        raise ValueError("invalid cursor: %s" % cursor)
+    if offset < 0:
+        raise ValueError("invalid cursor: %s" % cursor)
+    if cursor_version != version:
+        raise ValueError("cursor expired, data snapshot has been refreshed.")
+    return offset
+
+
+def frame_cursor(data: DataFrame, version, cursor: str = None, limit: int = 100, fields: list = None) -> dict:
+    """DataFrame 游标分页 列式 split 结构 [limit 须不小于1]"""
+    limit = check_positive('limit', limit)
+    offset = 0 if not cursor else decode_cursor(cursor, version)
+    total = len(data.index)
+    payload = frame_split(data.iloc[offset:offset + limit], fields=fields)
+    del payload['page'], payload['page_size']
+    payload['total'] = total
+    payload['limit'] = limit
+    payload['next_cursor'] = encode_cursor(version, offset + limit) if offset + limit < total else None
+    return payload
+
+
+def iter_ndjson(data: DataFrame, fields: list = None, chunk_size: int = 500):
+    """逐块编码 NDJSON，每次产出一块行的字节"""
+    data = page_frame(data, fields=fields)
+    for start in range(0, len(data.index), chunk_size):
+        yield b"".join(orjson.dumps(record, default=_default, option=OPTIONS | orjson.OPT_APPEND_NEWLINE)
+                       for record in data.iloc[start:start + chunk_size].to_dict('records'))
@@ -4,10 +4,11 @@ __author__ = 'carl'
 import time
 
 import pandas as pd
-from pandas import DataFrame
 
+from quotation.captures.batch_fetcher import BatchFetcher
 from quotation.captures.tsdata_capturer import TuShareDataCapturer
 from util.decorator_util import retry
+from util.trade_calendar import TradeCalendar
 
 
 def _get_price_(ts_code_list, trade_date, asset='E', adj='hfq'):
@@ -19,32 +20,18 @@ def _get_price_(ts_code_list, trade_date, asset='E', adj='hfq'):
     """
     start = time.time()
     tsdatacapture: TuShareDataCapturer = TuShareDataCapturer()
-    symbol = ","
-    close = DataFrame()
-    # 缓解压力 大于500个 分割
-    if len(ts_code_list) > 600:
-        f = lambda a: map(lambda b: a[b:b + 600], range(0, len(a), 600))
-        part_ports = f(ts_code_list)
-        for part_port in part_ports:
-            ts_codes = symbol.join(part_port)
-            # 当且仅当 start_date=end_date  ts_code可传多值
-            new_price = tsdatacapture.get_pro_bar(asset=asset, adj=adj, ts_code=ts_codes, start_date=trade_date,
-                                                  end_date=trade_date)
-            close = pd.concat([close, new_price], axis=0)
-    elif len(ts_code_list) == 1:
+    fetcher = BatchFetcher()
+    if len(ts_code_list) == 1:
         close = tsdatacapture.get_pro_bar(asset=asset, adj=adj, ts_code=ts_code_list[0], start_date=trade_date,
                                           end_date=trade_date)
     else:
-        ts_codes = symbol.join(ts_code_list)
-        # 当且仅当 start_date=end_date  ts_code可传多值
-        close = tsdatacapture.get_pro_bar(asset=asset, adj=adj, ts_code=ts_codes, start_date=trade_date,
-                                          end_date=trade_date)
+        # 缓解压力 600个一块 并发获取 当且仅当 start_date=end_date  ts_code可传多值
+        close = fetcher.fetch(tsdatacapture.get_pro_bar, ts_code_list, chunk_size=600, asset=asset, adj=adj,
+                              start_date=trade_date, end_date=trade_date)
     # 实在没办法了 一个一个取 防止多值获取失败
     if close is None or close.empty:
-        for ts_code in ts_code_list:
-            new_price = tsdatacapture.get_pro_bar(asset=asset, adj=adj, ts_code=ts_code, start_date=trade_date,
-                                                  end_date=trade_date)
-            close = pd.concat([close, new_price], axis=0)
+        close = fetcher.fetch(tsdatacapture.get_pro_bar, ts_code_list, chunk_size=1, asset=asset, adj=adj,
+                              start_date=trade_date, end_date=trade_date)
     close = close[['ts_code', 'close']].sort_values(by='ts_code')
     close.index = close['ts_code']
     end = time.time()
@@ -68,22 +55,11 @@ def get_price(ts_code_list, trade_date, asset='E', adj='hfq'):
             closes = tsdatacapture.get_pro_bar(asset=asset, adj=adj, ts_code=ts_code_list[0], start_date=trade_date,
                                                end_date=trade_date)
         else:
-            symbol = ","
-            df_adj_factors = DataFrame()
-            closes = DataFrame()
-            if len(ts_code_list) > 500:
-                f = lambda a: map(lambda b: a[b:b + 500], range(0, len(a), 500))
-                part_ports = f(ts_code_list)
-                for part_port in part_ports:
-                    ts_codes = symbol.join(part_port)
-                    new_df_adj_factors = tsdatacapture.get_adj_factor(ts_code=ts_codes, trade_date=trade_date)
-                    new_price = tsdatacapture.get_daily(ts_code=ts_codes, trade_date=trade_date)
-                    closes = pd.concat([closes, new_price], axis=0)
-                    df_adj_factors = pd.concat([df_adj_factors, new_df_adj_factors], axis=0)
-            else:
-                ts_codes = symbol.join(ts_code_list)
-                df_adj_factors = tsdatacapture.get_adj_factor(ts_code=ts_codes, trade_date=trade_date)
-                closes = tsdatacapture.get_daily(ts_code=ts_codes, trade_date=trade_date)
+            # 500个一块 并发获取
+            fetcher = BatchFetcher()
+            df_adj_factors = fetcher.fetch(tsdatacapture.get_adj_factor, ts_code_list, chunk_size=500,
+                                           trade_date=trade_date)
+            closes = fetcher.fetch(tsdatacapture.get_daily, ts_code_list, chunk_size=500, trade_date=trade_date)
             closes = pd.merge(left=closes, right=df_adj_factors, on='ts_code')
             closes.dropna(axis=0, how='any', subset=['ts_code', 'adj_factor'], inplace=True)
             closes['close'] = closes['close'] * closes['adj_factor']
@@ -96,18 +72,8 @@ def get_price(ts_code_list, trade_date, asset='E', adj='hfq'):
     return closes
 
 
-# noinspection DuplicatedCode
 def get_period_fl_trade_date(start_date, end_date):
     """
-    获取start_date——end_date 之间最初/最后一个交易日
+    获取start_date——end_date 之间最初/最后一个交易日 [本地交易日历 二分查找]
     """
-    tsdatacapture: TuShareDataCapturer = TuShareDataCapturer()
-    trade_cal = tsdatacapture.get_trade_cal(start_date=start_date, end_date=end_date).sort_values(
-        by='cal_date')
-    if trade_cal is None or trade_cal.empty:
-        return None,None
-    start_date_s = trade_cal.loc[0, "cal_date"]
-    end_date_s = trade_cal.loc[len(trade_cal.index) - 1, "cal_date"]
-    if int(start_date_s) - int(end_date_s) > 0:
-        end_date_s, start_date_s = start_date_s, end_date_s
-    return start_date_s, end_date_s
+    return TradeCalendar().first_last(start_date, end_date)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+__author__ = 'carl'
+
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from quotation.captures.tsdata_capturer import TuShareDataCapturer
+from quotation.store.market_store import LocalMarketDataStore
+from util.time_util import get_today_Ymd
+
+'''
+交易日历 当为单例
+-- 上交所全部交易日历只远程获取一次，落地在本地行情存储[trade_cal/SSE.parquet]，之后从本地加载
+-- 交易日保存为升序 numpy datetime64[D] 数组，区间首末交易日、前/后一个交易日、月初交易日均为二分查找
+-- 查询日期超出已有日历[次年日历发布后] 时重新远程获取，每日最多一次；离线模式只用本地日历
+-- 入参、返回值均为 YYYYMMDD 字符串
+
+usage:
+    cal = TradeCalendar()
+    cal.first_last('20230101', '20230131')     # ('20230103', '20230131')
+    cal.pre_trade_date('20230103')             # '20221230'
+    cal.month_starts('20230101', '20231231')   # 每月首个交易日
+'''
+log = logging.getLogger("app")
+log_err = logging.getLogger("log_err")
+
+ENDPOINT = 'trade_cal'
+
+
+def to_datetime64(date) -> np.datetime64:
+    date = str(date)
+    return np.datetime64('%s-%s-%s' % (date[0:4], date[4:6], date[6:8]), 'D')
+
+
+def to_Ymd(date: np.datetime64) -> str:
+    return str(date).replace('-', '')
+
+
+# noinspection PyMethodMayBeStatic
+class TradeCalendar(object):
+    instance = None
+    dates = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls.instance is None:
+            cls.instance = object.__new__(cls)
+        return cls.instance
+
+    def __init__(self, exchange: str = 'SSE'):
+        if self.dates is not None:
+            return
+        self.exchange = exchange
+        self.tsdatacapture: TuShareDataCapturer = TuShareDataCapturer()
+        self.lock = threading.RLock()
+        # 日历覆盖的最后一天[含休市日]
+        self.cal_end = None
+        self.fetched_day = None
+        self.dates = np.array([], dtype='datetime64[D]')
+        self.load()
+
+    def load(self):
+        """本地加载，本地没有时远程获取"""
+        store = LocalMarketDataStore()
+        cal = store.read(ENDPOINT, self.exchange)
+        if cal.empty and not store.offline:
+            cal = self.fetch()
+        self.set_calendar(cal)
+
+    def fetch(self) -> pd.DataFrame:
+        """远程获取全部日历[含休市日] 并落地"""
+        with self.lock:
+            self.fetched_day = get_today_Ymd()
+            cal = self.tsdatacapture.get_trade_cal(exchange=self.exchange, start_date='19901219',
+                                                   end_date='%s1231' % (int(self.fetched_day[0:4]) + 1), is_open='')
+            if cal is None or cal.empty:
+                log_err.error("TradeCalendar fetch %s trade_cal failed!" % self.exchange)
+                return pd.DataFrame()
+            cal = cal[['exchange', 'cal_date', 'is_open']]
+            LocalMarketDataStore().write(ENDPOINT, self.exchange, cal)
+            log.info("TradeCalendar fetched %s trade_cal to %s." % (self.exchange, cal['cal_date'].max()))
+            return cal
+
+    def set_calendar(self, cal: pd.DataFrame):
+        if cal is None or cal.empty:
+            return
+        cal = cal.drop_duplicates(subset=['cal_date'], keep='last')
+        is_open = pd.to_numeric(cal['is_open'], errors='coerce').to_numpy() == 1
+        dates = pd.to_datetime(cal['cal_date'].astype(str), format='%Y%m%d').to_numpy().astype('datetime64[D]')
+        with self.lock:
+            self.dates = np.sort(dates[is_open])
+            self.cal_end = dates.max()
+
+    def ensure(self, date):
+        """日期超出已有日历时重新获取 [每日最多一次；离线模式不获取]"""
+        if self.cal_end is not None and to_datetime64(date) <= self.cal_end:
+            return
+        if self.fetched_day == get_today_Ymd() or LocalMarketDataStore().offline:
+            return
+        self.set_calendar(self.fetch())
+
+    def trade_dates(self, start_date, end_date) -> list:
+        """start_date——end_date 内的全部交易日"""
+        self.ensure(end_date)
+        left = np.searchsorted(self.dates, to_datetime64(start_date), side='left')
+        right = np.searchsorted(self.dates, to_datetime64(end_date), side='right')
+        return [to_Ymd(d) for d in self.dates[left:right]]
+
+    def first_last(self, start_date, end_date) -> (str, str):
+        """start_date——end_date 之间最初/最后一个交易日，无交易日返回 (None, None)"""
+        self.ensure(end_date)
+        left = np.searchsorted(self.dates, to_datetime64(start_date), side='left')
+        right = np.searchsorted(self.dates, to_datetime64(end_date), side='right')
+        if left >= right:
+            return None, None
+        return to_Ymd(self.dates[left]), to_Ymd(self.dates[right - 1])
+
+    def is_trade_date(self, date) -> bool:
+        self.ensure(date)
+        date = to_datetime64(date)
+        pos = np.searchsorted(self.dates, date, side='left')
+        return pos < len(self.dates) and self.dates[pos] == date
+
+    def pre_trade_date(self, date, include: bool = False) -> str:
+        """date 之前的最后一个交易日；include=True 时 date 为交易日返回 date"""
+        self.ensure(date)
+        pos = np.searchsorted(self.dates, to_datetime64(date), side='right' if include else 'left')
+        return to_Ymd(self.dates[pos - 1]) if pos > 0 else None
+
+    def next_trade_date(self, date, include: bool = False) -> str:
+        """date 之后的第一个交易日；include=True 时 date 为交易日返回 date"""
+        self.ensure(date)
+        pos = np.searchsorted(self.dates, to_datetime64(date), side='left' if include else 'right')
+        return to_Ymd(self.dates[pos]) if pos < len(self.dates) else None
+
+    def month_start(self, date) -> str:
+        """date 所在月的首个交易日"""
+        month = to_datetime64(date).astype('datetime64[M]')
+        first, _ = self.first_last(to_Ymd(month.astype('datetime64[D]')),
+                                   to_Ymd((month + 1).astype('datetime64[D]') - 1))
+        return first
+
+    def month_starts(self, start_date, end_date) -> list:
+        """start_date——end_date 内各月的首个交易日"""
+        self.ensure(end_date)
+        left = np.searchsorted(self.dates, to_datetime64(start_date), side='left')
+        right = np.searchsorted(self.dates, to_datetime64(end_date), side='right')
+        dates = self.dates[left:right]
+        _, first = np.unique(dates.astype('datetime64[M]'), return_index=True)
+        return [to_Ymd(d) for d in dates[first]]
@@ -5,14 +5,17 @@ import functools
 import json
 import logging
 
-from flask import Blueprint, request
+from flask import Blueprint, Response, request, stream_with_context
 
 from entity.jsonresp import JsonResponse
 from web.service.data_service import get_industry, to_refresh_cache
 # contoller
-from web.service.quantization_service import get_stks_by_cons, get_growthstockpick01_stks
+from web.service.quantization_service import get_stks_by_cons, get_growthstockpick01_stks, stream_stks_by_cons, \
+    get_market_regime
 
 iaos_blue = Blueprint('iaos_blue', __name__)
+# 请求中的响应格式参数
+RESP_ARGS = ['orient', 'page', 'page_size', 'fields', 'cursor', 'limit']
 
 
 # --------- blueprint util --------- #
@@ -72,13 +75,21 @@ def sel_stks_by_cons():
     条件选股
     进行大小盘分类、行业分类，基于此根据股票财务和行情指标进行排序，通过设置参数和过滤值筛选股票。
     具体指标包括 动态市盈率、市净率、流通股本、总市值、每股公积金、每股收益、收入同比、利润同比、毛利率、净利润率等。
+    响应格式参数：orient='split' 列式结构；page、page_size 分页；fields 返回字段；
+                 limit、cursor 游标分页；stream=true 流式返回 NDJSON
     """
     if request.method == 'GET':
         return None
     else:
         condtions = request.get_data().decode()
         condtions_dict = json.loads(condtions)
-        return get_stks_by_cons(condtions_dict)
+        # 响应格式参数 不作为选股条件
+        stream = condtions_dict.pop('stream', False)
+        resp_args = {k: condtions_dict.pop(k) for k in RESP_ARGS if k in condtions_dict}
+        if stream:
+            return Response(stream_with_context(stream_stks_by_cons(condtions_dict, resp_args.get('fields'))),
+                            mimetype='application/x-ndjson')
+        return get_stks_by_cons(condtions_dict, **resp_args)
 
 
 @iaos_blue.route('/sel_stks_by_growthstockpick01.do', methods=['POST'])
@@ -91,7 +102,18 @@ def sel_stks_by_growthstockpick01():
         condtions_dict = json.loads(condtions)
         weights = condtions_dict["weights"]
         top_num = condtions_dict["top_num"]
-        return get_growthstockpick01_stks(top_num=top_num, weights=weights)
+        return get_growthstockpick01_stks(top_num=top_num, weights=weights, orient=condtions_dict.get("orient"),
+                                          fields=condtions_dict.get("fields"))
+
+
+@iaos_blue.route('/market_regime.do', methods=['POST', 'GET'])
+@blueprintlog(log)
+def market_regime():
+    """
+    大盘择时状态：各基准指数的趋势、AR/BR 情绪，及全市场涨跌宽度
+    ts_code: 指数代码，为空返回全部基准指数
+    """
+    return get_market_regime(request.values.get('ts_code'))
 
 
 @iaos_blue.errorhandler(Exception)
@@ -5,7 +5,6 @@ import logging
 import threading
 
 from db.myredis.redis_cli import RedisClient
-from util.obj_util import loads_data
 from quotation.cache.cache import RemoteBasicDataCache, LocalBasicDataCache
 
 # ----  log ------ #
@@ -34,15 +33,9 @@ def get_industry():
     """
     获取行业信息
     """
-    if LocalBasicDataCache.industry_set is not None:
-        return LocalBasicDataCache.industry_set
-    else:
-        rediscli = __getrediscli()
-        res = rediscli.get("industry_set")
-        if res is None:
-            LocalBasicDataCache.load_smb_industry_map()
-            res = rediscli.get("industry_set")
-        return loads_data(res)
+    if LocalBasicDataCache.industry_set is None:
+        LocalBasicDataCache.load_smb_industry_map()
+    return LocalBasicDataCache.industry_set
 
 
 def __getrediscli():
@@ -7,7 +7,10 @@ from db.myredis.redis_cli import RedisClient
 from quantization.securitypick.condition.conditionstockpick01 import ConditonStockPick01
 # ----  log ------ #
 from quantization.securitypick.growth.growthstockpick01 import GrowthStockPick01
+from quantization.timing.market_regime import MarketRegime
 from quotation.cache.cache import LocalBasicDataCache
+from quotation.cache.result_cache import ResultCache
+from util.json_util import frame_cursor, frame_records, frame_split, iter_ndjson, page_frame
 
 log = logging.getLogger("log_blueprint")
 log_err = logging.getLogger("log_err")
@@ -16,37 +19,74 @@ log_err = logging.getLogger("log_err")
 # ----  log ------ #
 
 
-def get_stks_by_cons(condtions_dict) -> dict:
+def get_stks_by_cons(condtions_dict, orient: str = None, page: int = None, page_size: int = None,
+                     fields: list = None, cursor: str = None, limit: int = None) -> dict:
     """
-    根据条件选股，返回符合条件的股票
+    根据条件选股，返回符合条件的股票 [按条件及快照版本缓存结果]
+    orient='split': 列式 split 结构，支持分页(page/page_size)及字段投影(fields)
+    limit: 游标分页 每页 limit 行，cursor 为上一页返回的 next_cursor
     """
+    params = {'condtions': condtions_dict, 'orient': orient, 'page': page, 'page_size': page_size, 'fields': fields,
+              'cursor': cursor, 'limit': limit}
+    version = LocalBasicDataCache.version
+    return ResultCache().cached("sel_stks_by_cons", version, params,
+                                lambda: select_stks_by_cons(condtions_dict, orient, page, page_size, fields,
+                                                            cursor, limit, version))
+
+
+def select_stks_by_cons(condtions_dict, orient: str = None, page: int = None, page_size: int = None,
+                        fields: list = None, cursor: str = None, limit: int = None, version=None) -> dict:
+    """根据条件选股"""
     csp01 = ConditonStockPick01()
     data = csp01.get_target_stock_pool(**condtions_dict)
+    if data is not None and limit is not None:
+        return frame_cursor(data, version, cursor, limit, fields)
+    if data is not None and orient == 'split':
+        return frame_split(data, page, page_size, fields)
     if data is None or len(data.index) == 0:
         return "There are no eligible stocks!"
-    target_data = {}
-    for index, row in data.iterrows():
-        symbol = row['symbol']
-        target_data[symbol] = row.to_dict()
-    return target_data
+    return frame_records(page_frame(data, page, page_size), fields=fields)
+
+
+def stream_stks_by_cons(condtions_dict, fields: list = None):
+    """根据条件选股 逐块产出 NDJSON [不缓存]"""
+    csp01 = ConditonStockPick01()
+    data = csp01.get_target_stock_pool(**condtions_dict)
+    if data is None:
+        return iter([])
+    return iter_ndjson(data, fields)
+
+
+def get_growthstockpick01_stks(top_num: int, weights: dict, orient: str = None, fields: list = None) -> dict:
+    """获取GrowthStockPick01模型的股票池 [按参数及快照版本缓存结果]"""
+    params = {'top_num': top_num, 'weights': weights, 'orient': orient, 'fields': fields}
+    return ResultCache().cached("sel_stks_by_growthstockpick01", LocalBasicDataCache.version, params,
+                                lambda: select_growthstockpick01_stks(top_num, weights, orient, fields))
 
 
-def get_growthstockpick01_stks(top_num: int, weights: dict) -> dict:
-    """获取GrowthStockPick01模型的股票池"""
+def select_growthstockpick01_stks(top_num: int, weights: dict, orient: str = None, fields: list = None) -> dict:
+    """计算GrowthStockPick01模型的股票池"""
     if LocalBasicDataCache.base_stock_infos is None:
-        rediscli = __getrediscli()
-        res = rediscli.get("base_stock_infos")
-        if res is None:
-            LocalBasicDataCache.load_base_stock_infos()
+        LocalBasicDataCache.load_base_stock_infos()
     # 默认：weights={'roe': 34, 'basic_eps_yoy': 33, 'pe_ttm': 33}
     #      top_num=5
     gsp01 = GrowthStockPick01()
     gsp01.init_data(stocksinfos=LocalBasicDataCache.base_stock_infos, weights=weights)
-    stock_pool = {}
-    for index, row in gsp01.get_target_stock_pool(top_num=top_num).iterrows():
-        symbol = row['symbol']
-        stock_pool[symbol] = row.to_dict()
-    return stock_pool
+    data = gsp01.get_target_stock_pool(top_num=top_num)
+    if orient == 'split':
+        return frame_split(data, fields=fields)
+    return frame_records(data, fields=fields)
+
+
+def get_market_regime(ts_code: str = None) -> dict:
+    """大盘择时状态 [内存中读取，尚未加载时先全量加载]"""
+    mr = MarketRegime()
+    if mr.trade_date is None:
+        # 并发的首次请求只加载一次
+        with mr.lock:
+            if mr.trade_date is None:
+                mr.refresh()
+    return {'market': mr.market(), 'indexes': mr.regime() if ts_code is None else mr.regime(ts_code)}
 
 
 def __getrediscli():
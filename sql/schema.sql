@@ -10,6 +10,7 @@ drop table if exists factor_type;
 drop table if exists candidate_factors;
 drop table if exists factor_validity_info;
 drop table if exists sample_stk_price;
+drop table if exists factor_monthly_return;
 -- 因子类型枚举表
 create table if not exists factor_type
 (
@@ -82,6 +83,22 @@ create table if not exists sample_stk_price
 ) engine = innodb
   default charset = utf8;
 
+-- 因子分组月收益表[增量更新因子有效性时 滚动使用]
+create table if not exists factor_monthly_return
+(
+    factor_id        varchar(30) not null comment '因子id',
+    benchmark        varchar(18) not null default '000001.SH' comment '对标基准',
+    trade_date       varchar(10) not null comment '分组交易日[月收益起始样本交易日]',
+    port_1           double comment '分组1月收益',
+    port_2           double comment '分组2月收益',
+    port_3           double comment '分组3月收益',
+    port_4           double comment '分组4月收益',
+    port_5           double comment '分组5月收益',
+    benchmark_return double comment '基准月收益',
+    PRIMARY KEY (factor_id, benchmark, trade_date)
+) engine = innodb
+  default charset = utf8;
+
 -- 初始化部分数据表的值
 -- 1、因子类型枚举表 factor_type
 insert into factor_type (factor_type_id, factor_type, memo)